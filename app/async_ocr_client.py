@@ -0,0 +1,377 @@
+import asyncio
+import json
+import os
+import random
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+try:
+    import httpx
+except ImportError:  # optional dependency: pip install "PaddleOCR-VL-BaiduAIStudio[async]"
+    httpx = None  # type: ignore[assignment]
+
+from .ocr_client import (
+    _OVERLOAD_STATUSES,
+    _REJECTED_STATUSES,
+    _TRANSIENT_STATUSES,
+    Base64JsonBody,
+    OcrHttpError,
+    OcrOptions,
+)
+from . import metrics
+from .retry import CircuitBreaker, CircuitOpen, RetryPolicy
+from .throttle import AdaptiveLimiter, TokenBucket
+
+
+T = TypeVar("T")
+
+_CHUNK_BYTES = 64 * 1024
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    if isinstance(exc, CircuitOpen):
+        return True
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, OcrHttpError) and exc.status_code in _TRANSIENT_STATUSES
+
+
+def _safe_to_resubmit(exc: BaseException) -> bool:
+    # Same rule as the threaded client: only when the job can't exist upstream.
+    if isinstance(exc, CircuitOpen):
+        return True
+    if httpx is not None and isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    return isinstance(exc, OcrHttpError) and exc.status_code in _REJECTED_STATUSES
+
+
+def _retry_after_s(resp: "httpx.Response") -> float:
+    try:
+        return min(60.0, max(0.0, float(resp.headers.get("Retry-After", ""))))
+    except ValueError:
+        return 0.0
+
+
+class AsyncBaiduPaddleOcrClient:
+    """asyncio counterpart of ``BaiduPaddleOcrClient`` built on httpx.
+
+    Same endpoints, rate limiting, AIMD concurrency, retries and circuit
+    breakers; must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        token: str,
+        api_url: str = "",
+        job_url: str = "",
+        model: str = "PaddleOCR-VL-1.5",
+        pool_maxsize: int = 8,
+        connect_timeout_s: float = 10.0,
+        read_timeout_s: float = 60.0,
+        rate_limiter: Optional[TokenBucket] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        retry: Optional[RetryPolicy] = None,
+        breaker_threshold: int = 5,
+        breaker_reset_s: float = 30.0,
+    ) -> None:
+        if httpx is None:
+            raise RuntimeError("ENGINE=asyncio requires the optional httpx package")
+        self._token = token
+        self._api_url = api_url
+        self._job_url = job_url
+        self._model = model
+        self._pool_maxsize = max(1, int(pool_maxsize))
+        self._timeout = httpx.Timeout(float(read_timeout_s), connect=float(connect_timeout_s))
+        self._limits = httpx.Limits(
+            max_connections=self._pool_maxsize,
+            max_keepalive_connections=self._pool_maxsize,
+        )
+        # Created lazily so it binds to the running loop.
+        self._http: Optional[httpx.AsyncClient] = None
+        self._requests = 0
+        self._rate_limiter = rate_limiter or TokenBucket()
+        self._limiter = limiter
+        self._slot_freed: Optional[asyncio.Condition] = None
+        self._retry = retry or RetryPolicy()
+        self._breakers = {
+            kind: CircuitBreaker(
+                kind, threshold=breaker_threshold, reset_s=breaker_reset_s
+            )
+            for kind in ("sync", "job")
+        }
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    def _client(self) -> "httpx.AsyncClient":
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def http_stats(self) -> dict[str, int]:
+        return {"requests": self._requests, "poolMaxsize": self._pool_maxsize}
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "rate": self._rate_limiter.stats(),
+            "concurrency": self._limiter.stats() if self._limiter else None,
+            "breakers": {k: b.stats() for k, b in self._breakers.items()},
+        }
+
+    def circuit_wait_s(self, endpoint: str) -> float:
+        return self._breakers[endpoint].wait_s()
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        *,
+        endpoint: str = "",
+        stream: bool = False,
+        **kwargs: Any,
+    ) -> "httpx.Response":
+        # With stream=True the body is not read; the caller must aclose().
+        breaker = self._breakers.get(endpoint)
+        trial = breaker.before_call() if breaker else False
+        label = endpoint or "result"
+        try:
+            wait_s = self._rate_limiter.reserve()
+            if wait_s > 0:
+                await asyncio.sleep(wait_s)
+            self._requests += 1
+            metrics.UPSTREAM_REQUESTS.inc(endpoint=label)
+            http = self._client()
+            request = http.build_request(method, url, **kwargs)
+            resp = await http.send(request, stream=stream)
+        except httpx.TransportError:
+            metrics.UPSTREAM_ERRORS.inc(endpoint=label, reason="transport")
+            if breaker:
+                breaker.record(ok=False)
+            raise
+        except BaseException:
+            # No answer either way (canceled, or a local error).
+            if trial and breaker:
+                breaker.release()
+            raise
+        if resp.status_code >= 400:
+            metrics.UPSTREAM_ERRORS.inc(endpoint=label, reason=str(resp.status_code))
+        if breaker:
+            breaker.record(ok=resp.status_code < 500)
+        if resp.status_code == 429:
+            self._rate_limiter.pause(_retry_after_s(resp) or 1.0)
+        return resp
+
+    @staticmethod
+    def _check(resp: "httpx.Response", what: str) -> None:
+        if resp.status_code != 200:
+            raise OcrHttpError(
+                f"{what} failed: HTTP {resp.status_code}: {resp.text[:1000]}",
+                status_code=resp.status_code,
+                retry_after_s=_retry_after_s(resp),
+            )
+
+    async def _with_retry(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        *,
+        retry_on: Callable[[BaseException], bool],
+    ) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:  # noqa: BLE001
+                attempt += 1
+                if attempt >= self._retry.attempts or not retry_on(e):
+                    raise
+                await asyncio.sleep(
+                    self._retry.delay_s(attempt, getattr(e, "retry_after_s", 0.0))
+                )
+
+    @asynccontextmanager
+    async def _in_flight(self) -> AsyncIterator[None]:
+        if not self._limiter:
+            yield
+            return
+        if self._slot_freed is None:
+            self._slot_freed = asyncio.Condition()
+        async with self._slot_freed:
+            while (token := self._limiter.try_acquire()) is None:
+                await self._slot_freed.wait()
+        ok, overloaded = False, False
+        try:
+            yield
+            ok = True
+        except OcrHttpError as e:
+            overloaded = e.status_code in _OVERLOAD_STATUSES
+            raise
+        except httpx.TransportError:
+            overloaded = True
+            raise
+        finally:
+            self._limiter.release(token, ok=ok, overloaded=overloaded)
+            async with self._slot_freed:
+                self._slot_freed.notify_all()
+
+    async def submit_sync_base64(
+        self, *, file_path: str, file_type: int, options: OcrOptions
+    ) -> dict[str, Any]:
+        if not self._api_url:
+            raise RuntimeError("Missing BAIDU_PADDLE_OCR_API_URL for sync mode")
+        body = await asyncio.to_thread(
+            Base64JsonBody,
+            file_path,
+            {"fileType": int(file_type), **options.to_payload()},
+        )
+        headers = {
+            "Authorization": f"token {self._token}",
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+        }
+
+        async def attempt() -> "httpx.Response":
+            async with self._in_flight():
+                metrics.BYTES.inc(len(body), direction="upload")
+                resp = await self._send(
+                    "POST",
+                    self._api_url,
+                    endpoint="sync",
+                    content=body.aiter_chunks(),
+                    headers=headers,
+                )
+                self._check(resp, "Sync OCR")
+            return resp
+
+        resp = await self._with_retry(attempt, retry_on=is_transient_error)
+        return resp.json()["result"]
+
+    async def submit_job(
+        self, *, file_path: str, options: OcrOptions, model: Optional[str] = None
+    ) -> str:
+        if not self._job_url:
+            raise RuntimeError("Missing BAIDU_PADDLE_OCR_JOB_URL for async mode")
+        headers = {"Authorization": f"bearer {self._token}"}
+        data = {
+            "model": model or self._model,
+            "optionalPayload": json.dumps(options.to_payload(), ensure_ascii=False),
+        }
+
+        async def attempt() -> "httpx.Response":
+            # httpx streams the open file in chunks instead of holding the
+            # whole upload in memory.
+            async with self._in_flight():
+                with open(file_path, "rb") as f:
+                    metrics.BYTES.inc(os.fstat(f.fileno()).st_size, direction="upload")
+                    resp = await self._send(
+                        "POST",
+                        self._job_url,
+                        endpoint="job",
+                        headers=headers,
+                        data=data,
+                        files={"file": (os.path.basename(file_path), f)},
+                    )
+                self._check(resp, "Job submit")
+            return resp
+
+        resp = await self._with_retry(attempt, retry_on=_safe_to_resubmit)
+        return resp.json()["data"]["jobId"]
+
+    async def get_job(
+        self,
+        *,
+        job_id: str,
+        retry: bool = True,
+        timeout_s: Optional[float] = None,
+    ) -> dict[str, Any]:
+        if not self._job_url:
+            raise RuntimeError("Missing BAIDU_PADDLE_OCR_JOB_URL for async mode")
+        headers = {"Authorization": f"bearer {self._token}"}
+        options: dict[str, Any] = {}
+        if timeout_s:
+            options["timeout"] = httpx.Timeout(
+                float(timeout_s), connect=self._timeout.connect
+            )
+
+        async def attempt() -> "httpx.Response":
+            resp = await self._send(
+                "GET",
+                f"{self._job_url}/{job_id}",
+                endpoint="job",
+                headers=headers,
+                **options,
+            )
+            self._check(resp, "Job poll")
+            return resp
+
+        if not retry:
+            return (await attempt()).json()["data"]
+        resp = await self._with_retry(attempt, retry_on=is_transient_error)
+        return resp.json()["data"]
+
+    async def stream_jsonl(self, *, jsonl_url: str) -> AsyncIterator[str]:
+        """Same contract as ``BaiduPaddleOcrClient.stream_jsonl``."""
+        yielded = 0
+        attempt = 0
+        while True:
+            try:
+                resp = await self._send("GET", jsonl_url, stream=True)
+                try:
+                    if resp.status_code != 200:
+                        await resp.aread()
+                    self._check(resp, "Result download")
+                    seen = 0
+                    async for line in resp.aiter_lines():
+                        metrics.BYTES.inc(len(line) + 1, direction="download")
+                        if not line.strip():
+                            continue
+                        seen += 1
+                        if seen <= yielded:
+                            continue
+                        yielded += 1
+                        yield line
+                finally:
+                    await resp.aclose()
+                return
+            except Exception as e:  # noqa: BLE001
+                attempt += 1
+                if attempt >= self._retry.attempts or not is_transient_error(e):
+                    raise
+                await asyncio.sleep(
+                    self._retry.delay_s(attempt, getattr(e, "retry_after_s", 0.0))
+                )
+
+    async def download_to_file(
+        self, url: str, dest: Path, *, retries: int = 3, backoff_s: float = 0.5
+    ) -> bool:
+        """Stream an asset to ``dest``; same contract as ``storage.download_to_file``."""
+        tmp = dest.with_name(dest.name + ".part")
+        attempt = 0
+        while True:
+            try:
+                self._requests += 1
+                async with self._client().stream("GET", url) as resp:
+                    if resp.status_code == 200:
+                        with open(tmp, "wb") as f:
+                            async for chunk in resp.aiter_bytes(_CHUNK_BYTES):
+                                f.write(chunk)
+                                metrics.BYTES.inc(len(chunk), direction="download")
+                        os.replace(tmp, dest)
+                        return True
+                    if resp.status_code not in _TRANSIENT_STATUSES:
+                        return False
+                    error = f"HTTP {resp.status_code}"
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+            attempt += 1
+            if attempt > retries:
+                tmp.unlink(missing_ok=True)
+                raise RuntimeError(f"Asset download failed: {url}: {error}")
+            await asyncio.sleep(backoff_s * (2 ** (attempt - 1)) * (0.5 + random.random()))
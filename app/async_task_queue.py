@@ -0,0 +1,560 @@
+import asyncio
+import logging
+import shutil
+import threading
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, Awaitable, Optional
+
+from .async_ocr_client import AsyncBaiduPaddleOcrClient, is_transient_error
+from .image_prep import prepare_image
+from .job_poller import JobPoller
+from .ocr_client import parse_jsonl_line
+from .pdf_shards import PdfShard, split_pdf
+from .pipeline import AsyncStage
+from .result_cache import ResultCache
+from .storage import MaterializedItem, materialize_result_to_dir_async
+from .task_queue import (
+    EnqueuedItem,
+    FetchedResult,
+    RemoteJobDone,
+    TaskCanceled,
+    TaskQueue,
+    _PageSink,
+)
+from .task_store import TaskStore
+from .utils import ensure_dir, guess_file_type, safe_path_segment
+from .work_queue import WorkQueue
+
+
+log = logging.getLogger(__name__)
+
+
+class AsyncTaskQueue(TaskQueue):
+    """asyncio engine (ENGINE=asyncio) with the same API as ``TaskQueue``.
+
+    Task/item bookkeeping, persistence and events are inherited; processing
+    runs as coroutines on the server's event loop instead of OS threads:
+    ``concurrency`` workers take items from the shared fair scheduler,
+    every submitted job gets a cheap polling coroutine, and the fetch and
+    materialize stages are ``AsyncStage``s with the same bounds as the
+    threaded pipeline. Call ``start()``
+    from the running loop (app lifespan); items enqueued or restored before
+    that wait in the scheduler until then.
+    """
+
+    def __init__(
+        self,
+        *,
+        client: AsyncBaiduPaddleOcrClient,
+        output_root: str,
+        concurrency: int = 2,
+        cache: Optional[ResultCache] = None,
+        asset_concurrency: int = 8,
+        store: Optional[TaskStore] = None,
+        shard_pages: int = 0,
+        shard_mode: str = "job",
+        shard_concurrency: int = 4,
+        poll_min_interval_s: float = 1.0,
+        poll_max_interval_s: float = 10.0,
+        poll_backoff: float = 1.5,
+        job_max_wait_s: float = 15 * 60.0,
+        poll_max_errors: int = 10,
+        poll_timeout_s: float = 10.0,
+        fetch_concurrency: int = 2,
+        materialize_concurrency: int = 2,
+        stage_capacity: int = 16,
+        image_prep_workers: int = 0,
+        image_max_side: int = 0,
+        image_jpeg_quality: int = 85,
+        work_queue: Optional[WorkQueue] = None,
+        role: str = "all",
+    ) -> None:
+        self._aclient = client
+        self._poll_min_interval_s = max(0.05, float(poll_min_interval_s))
+        self._poll_max_interval_s = max(
+            self._poll_min_interval_s, float(poll_max_interval_s)
+        )
+        self._poll_backoff = max(1.0, float(poll_backoff))
+        self._job_max_wait_s = float(job_max_wait_s)
+        self._poll_max_errors = max(1, int(poll_max_errors))
+        self._poll_timeout_s = float(poll_timeout_s)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # One release per item put in the scheduler; workers acquire to take one.
+        # _ready_lock makes start()'s count and a _dispatch() from a request
+        # thread atomic with respect to each other, so no item is missed.
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._ready_lock = threading.Lock()
+        # Remote jobs restored before start().
+        self._pending_follows: list[tuple[EnqueuedItem, list[str], float, str]] = []
+        self._bg: set[asyncio.Task[Any]] = set()
+        self._following = 0
+        self._concurrency = 0
+        super().__init__(
+            client=client,  # type: ignore[arg-type]
+            output_root=output_root,
+            concurrency=concurrency,
+            cache=cache,
+            asset_concurrency=asset_concurrency,
+            store=store,
+            shard_pages=shard_pages,
+            shard_mode=shard_mode,
+            shard_concurrency=shard_concurrency,
+            fetch_concurrency=fetch_concurrency,
+            materialize_concurrency=materialize_concurrency,
+            stage_capacity=stage_capacity,
+            image_prep_workers=image_prep_workers,
+            image_max_side=image_max_side,
+            image_jpeg_quality=image_jpeg_quality,
+            work_queue=work_queue,
+            role=role,
+        )
+
+    def _make_poller(self) -> Optional[JobPoller]:
+        return None
+
+    def _start_workers(self, count: int) -> None:
+        self._concurrency = count
+
+    def _make_stages(self, fetch: int, materialize: int, capacity: int) -> None:
+        self._fetch_stage = AsyncStage(
+            "fetch", workers=fetch, capacity=capacity, spawn=self._spawn
+        )
+        self._materialize_stage = AsyncStage(
+            "materialize", workers=materialize, capacity=capacity, spawn=self._spawn
+        )
+
+    async def start(self) -> None:
+        with self._ready_lock:
+            self._loop = asyncio.get_running_loop()
+            self._ready = asyncio.Semaphore(self._q.qsize())
+        for idx in range(self._concurrency):
+            self._spawn(self._worker_async(), name=f"worker-{idx}")
+        for follow in self._pending_follows:
+            self._spawn(self._follow_jobs(*follow))
+        self._pending_follows.clear()
+        if self._role == "worker":
+            super()._start_claiming()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        for t in list(self._bg):
+            t.cancel()
+        await asyncio.gather(*self._bg, return_exceptions=True)
+        if self._prep_pool:
+            self._prep_pool.shutdown(wait=False, cancel_futures=True)
+        await self._aclient.aclose()
+
+    def pending_jobs(self) -> int:
+        return self._following
+
+    def _start_claiming(self) -> None:
+        # Deferred to start(): claimed items are run on the event loop.
+        pass
+
+    def _adopt(self, rows: list[dict[str, Any]]) -> None:
+        # Called from the claim thread; wait so the next claim sees the
+        # items in the scheduler.
+        assert self._loop is not None
+        adopt = super()._adopt
+
+        async def run() -> None:
+            adopt(rows)
+
+        asyncio.run_coroutine_threadsafe(run(), self._loop).result()
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _spawn(self, coro: Any, *, name: Optional[str] = None) -> None:
+        t = asyncio.create_task(coro, name=name)
+        self._bg.add(t)
+        t.add_done_callback(self._bg.discard)
+
+    def _dispatch(self, work: EnqueuedItem | RemoteJobDone) -> None:
+        # Only new items come through here; finished jobs are followed by
+        # their own coroutine. May be called from request threads.
+        assert isinstance(work, EnqueuedItem)
+        with self._ready_lock:
+            super()._dispatch(work)
+            if self._loop is not None and self._ready is not None:
+                self._loop.call_soon_threadsafe(self._ready.release)
+
+    def _fan_out(
+        self,
+        leader: EnqueuedItem,
+        followers: list[EnqueuedItem],
+        status: str,
+        error: str,
+        result: Optional[MaterializedItem],
+    ) -> None:
+        # Linking the output trees is file I/O; keep it off the event loop.
+        fan_out = super()._fan_out
+        if self._loop is None or not self._on_loop():
+            # Before start(), or from a thread (worker reports in the web role).
+            fan_out(leader, followers, status, error, result)
+            return
+        self._spawn(
+            asyncio.to_thread(fan_out, leader, followers, status, error, result)
+        )
+
+    def _track_remote(
+        self,
+        job: EnqueuedItem,
+        job_ids: list[str],
+        submitted_at: float,
+        cache_key: str = "",
+    ) -> None:
+        self._record_remote(job, job_ids, submitted_at)
+        self._following += 1
+        follow = (job, job_ids, submitted_at, cache_key)
+        if self._loop is None:
+            # Resumed from the store before start().
+            self._pending_follows.append(follow)
+        else:
+            self._spawn(self._follow_jobs(*follow))
+
+    async def _worker_async(self) -> None:
+        assert self._ready is not None
+        while True:
+            await self._ready.acquire()
+            job = self._q.get_nowait()
+            if job is None:
+                continue
+            assert isinstance(job, EnqueuedItem)
+            self._active += 1
+            try:
+                await self._run_item_async(job)
+            except Exception:  # noqa: BLE001
+                # Keep the worker alive, but don't hide the bug.
+                log.exception(
+                    "worker failed on item %s of task %s", job.item_id, job.task_id
+                )
+            finally:
+                self._active -= 1
+
+    async def _run_item_async(self, job: EnqueuedItem) -> None:
+        task = self.get_task(job.task_id)
+        if not task or task.status == "canceled":
+            self._land_flight(job, "canceled")
+            return
+        endpoint = "job" if self._uses_async(job) else "sync"
+        while not self._is_canceled(job.task_id):
+            wait_s = self._aclient.circuit_wait_s(endpoint)
+            if wait_s <= 0:
+                break
+            await asyncio.sleep(min(wait_s, 1.0))
+        if self._is_canceled(job.task_id):
+            self._land_flight(job, "canceled")
+            return
+        self._mark_running(task, job)
+        await self._run_stage_async(job, self._process_one_async(job))
+
+    async def _run_stage_async(
+        self, job: EnqueuedItem, coro: Awaitable[Optional[MaterializedItem]]
+    ) -> None:
+        try:
+            m = await coro
+        except TaskCanceled:
+            self._settle_item(job, status="canceled")
+        except Exception as e:  # noqa: BLE001
+            self._settle_item(job, status="failed", error=str(e))
+        else:
+            if m is not None:
+                self._settle_item(job, status="done", result=m)
+
+    async def _process_one_async(self, job: EnqueuedItem) -> Optional[MaterializedItem]:
+        if self._is_canceled(job.task_id):
+            raise TaskCanceled()
+        src = Path(job.local_path)
+        if not src.exists():
+            raise RuntimeError(f"Input file missing: {src}")
+
+        file_type = guess_file_type(job.filename)
+        use_async = self._uses_async(job)
+        task_dir, item_dir, raw_path = self._item_paths(job)
+
+        cache_key = await asyncio.to_thread(
+            self._cache_key, job, "async" if use_async else "sync"
+        )
+        if self._cache:
+            hit = await asyncio.to_thread(
+                self._cache.get, cache_key, item_dir=item_dir, raw_path=raw_path
+            )
+            if hit:
+                return MaterializedItem(md_files=hit.md_files, assets=hit.assets)
+
+        if use_async and file_type == 0 and self._shard_pages > 0:
+            shard_dir = task_dir / ".shards" / safe_path_segment(job.item_id)
+            shards = await asyncio.to_thread(
+                split_pdf, src, shard_dir, self._shard_pages
+            )
+            if shards:
+                return await self._process_sharded_async(
+                    job, shards, shard_dir, cache_key
+                )
+
+        dest_path = await self._prepare_upload_async(job, src)
+        try:
+            if use_async:
+                with self._timed(job, "upload"):
+                    job_id = await self._aclient.submit_job(
+                        file_path=str(dest_path), options=job.options
+                    )
+                self._track_remote(job, [job_id], time.time(), cache_key)
+                return None
+
+            with self._timed(job, "remote"):
+                result = await self._aclient.submit_sync_base64(
+                    file_path=str(dest_path), file_type=file_type, options=job.options
+                )
+        finally:
+            if dest_path != src:
+                await asyncio.to_thread(shutil.rmtree, dest_path.parent, True)
+        await self._to_materialize(
+            FetchedResult(job=job, pages=(result,), cache_key=cache_key, flat=True)
+        )
+        return None
+
+    async def _prepare_upload_async(self, job: EnqueuedItem, src: Path) -> Path:
+        prep_dir = self._prep_dir(job)
+        out: Optional[str] = None
+        if prep_dir is not None:
+            assert self._prep_pool
+            with self._timed(job, "prep"):
+                try:
+                    out = await asyncio.wrap_future(
+                        self._prep_pool.submit(
+                            prepare_image, str(src), str(prep_dir), **self._prep_options
+                        )
+                    )
+                except Exception:  # noqa: BLE001
+                    log.warning(
+                        "image pre-processing failed, uploading %s as is",
+                        src,
+                        exc_info=True,
+                    )
+                    out = None
+        return await asyncio.to_thread(self._prepared, job, src, out)
+
+    async def _to_materialize(self, work: FetchedResult) -> None:
+        # Waits while the materialize stage is full.
+        await self._materialize_stage.submit(
+            lambda: self._run_stage_async(work.job, self._materialize_async(work))
+        )
+
+    async def _process_sharded_async(
+        self,
+        job: EnqueuedItem,
+        shards: list[PdfShard],
+        shard_dir: Path,
+        cache_key: str,
+    ) -> Optional[MaterializedItem]:
+        sem = asyncio.Semaphore(self._shard_concurrency)
+
+        async def submit(sh: PdfShard) -> Any:
+            async with sem:
+                if self._shard_mode == "sync":
+                    return await self._aclient.submit_sync_base64(
+                        file_path=str(sh.path), file_type=0, options=job.options
+                    )
+                return await self._aclient.submit_job(
+                    file_path=str(sh.path), options=job.options
+                )
+
+        stage = "remote" if self._shard_mode == "sync" else "upload"
+        try:
+            with self._timed(job, stage):
+                out = await asyncio.gather(*(submit(sh) for sh in shards))
+        finally:
+            await asyncio.to_thread(shutil.rmtree, shard_dir, True)
+            try:
+                shard_dir.parent.rmdir()
+            except OSError:
+                pass  # other items are still sharding
+
+        if self._shard_mode != "sync":
+            self._track_remote(job, list(out), time.time(), cache_key)
+            return None
+
+        await self._to_materialize(
+            FetchedResult(
+                job=job, pages=tuple(self._split_sync_pages(out)), cache_key=cache_key
+            )
+        )
+        return None
+
+    async def _follow_jobs(
+        self,
+        job: EnqueuedItem,
+        job_ids: list[str],
+        submitted_at: float,
+        cache_key: str,
+    ) -> None:
+        """Poll the job(s) of one item, then hand the results to the fetch stage."""
+        try:
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    polls = [
+                        tg.create_task(self._poll_until_done(job, jid, submitted_at))
+                        for jid in job_ids
+                    ]
+            except BaseExceptionGroup as eg:
+                # First failure wins, like the threaded poller group.
+                if isinstance(eg.exceptions[0], TaskCanceled):
+                    self._settle_item(job, status="canceled")
+                else:
+                    self._settle_item(
+                        job, status="failed", error=str(eg.exceptions[0])
+                    )
+                return
+        finally:
+            self._following -= 1
+        self._add_timings(job, remote=time.time() - submitted_at)
+
+        work = RemoteJobDone(
+            job=job, results=tuple(p.result() for p in polls), cache_key=cache_key
+        )
+        await self._fetch_stage.submit(
+            lambda: self._run_stage_async(job, self._fetch_remote_async(work))
+        )
+
+    async def _poll_until_done(
+        self, job: EnqueuedItem, job_id: str, submitted_at: float
+    ) -> dict[str, Any]:
+        # Same schedule as JobPoller: adaptive backoff, transient errors retried.
+        interval_s = self._poll_min_interval_s
+        delay_s = interval_s
+        errors = 0
+        last: dict[str, Any] = {}
+        while True:
+            await self._sleep_unless_canceled(job, delay_s)
+            try:
+                data = await self._aclient.get_job(
+                    job_id=job_id, retry=False, timeout_s=self._poll_timeout_s
+                )
+            except Exception as e:  # noqa: BLE001
+                errors += 1
+                if not is_transient_error(e) or errors >= self._poll_max_errors:
+                    raise
+                retry_after_s = getattr(e, "retry_after_s", 0.0)
+            else:
+                errors = 0
+                last = data
+                retry_after_s = 0.0
+                state = data.get("state")
+                if state == "done":
+                    return data
+                if state == "failed":
+                    raise RuntimeError(
+                        f"Job failed: {data.get('errorMsg', 'unknown error')}"
+                    )
+            if time.time() - submitted_at > self._job_max_wait_s:
+                raise RuntimeError(
+                    f"Job timeout after {self._job_max_wait_s}s; last={last}"
+                )
+            interval_s = min(self._poll_max_interval_s, interval_s * self._poll_backoff)
+            delay_s = max(interval_s, retry_after_s)
+
+    async def _sleep_unless_canceled(self, job: EnqueuedItem, delay_s: float) -> None:
+        deadline = time.monotonic() + delay_s
+        while True:
+            if self._is_canceled(job.task_id):
+                raise TaskCanceled()
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return
+            await asyncio.sleep(min(left, 0.5))
+
+    async def _fetch_remote_async(self, work: RemoteJobDone) -> MaterializedItem:
+        # Streams and materializes page by page, like TaskQueue._fetch_remote.
+        job = work.job
+        if self._is_canceled(job.task_id):
+            raise TaskCanceled()
+        _, item_dir, raw_path = self._item_paths(job)
+        ensure_dir(raw_path.parent)
+        t0 = time.monotonic()
+        pages = _PageSink()
+        with open(raw_path, "w", encoding="utf-8") as raw:
+            for job_data in work.results:
+                lines = self._aclient.stream_jsonl(jsonl_url=self._json_url(job_data))
+                async with aclosing(lines):
+                    while True:
+                        t = time.monotonic()
+                        line = await anext(lines, None)
+                        pages.fetch_s += time.monotonic() - t
+                        if line is None:
+                            break
+                        await asyncio.to_thread(raw.write, line + "\n")
+                        if self._is_canceled(job.task_id):
+                            raise TaskCanceled()
+                        pages.add(
+                            await materialize_result_to_dir_async(
+                                parse_jsonl_line(line),
+                                item_dir / f"page_{pages.count}",
+                                fetch=self._aclient.download_to_file,
+                                max_concurrency=self._asset_concurrency,
+                            )
+                        )
+                        self._publish_pages(job, pages)
+
+        m = await asyncio.to_thread(
+            self._finish_pages, job, item_dir, pages, time.monotonic() - t0
+        )
+        cache_key = work.cache_key or await asyncio.to_thread(
+            self._cache_key, job, "async"
+        )
+        await asyncio.to_thread(
+            self._cache_result, cache_key, item_dir, m, raw_path=raw_path
+        )
+        return m
+
+    async def _materialize_async(self, work: FetchedResult) -> MaterializedItem:
+        job = work.job
+        if self._is_canceled(job.task_id):
+            raise TaskCanceled()
+        _, item_dir, _ = self._item_paths(job)
+        if work.flat:
+            t0 = time.monotonic()
+            m = await materialize_result_to_dir_async(
+                work.pages[0],
+                item_dir,
+                fetch=self._aclient.download_to_file,
+                max_concurrency=self._asset_concurrency,
+            )
+            self._add_materialize_timings(job, m, time.monotonic() - t0)
+        else:
+            m = await self._materialize_pages_async(job, list(work.pages))
+        await asyncio.to_thread(
+            self._cache_result,
+            work.cache_key,
+            item_dir,
+            m,
+            result=work.pages[0] if work.flat else None,
+        )
+        return m
+
+    async def _materialize_pages_async(
+        self, job: EnqueuedItem, pages: list[dict[str, Any]]
+    ) -> MaterializedItem:
+        _, item_dir, _ = self._item_paths(job)
+        t0 = time.monotonic()
+        sink = _PageSink()
+        for page_result in pages:
+            if self._is_canceled(job.task_id):
+                raise TaskCanceled()
+            sink.add(
+                await materialize_result_to_dir_async(
+                    page_result,
+                    item_dir / f"page_{sink.count}",
+                    fetch=self._aclient.download_to_file,
+                    max_concurrency=self._asset_concurrency,
+                )
+            )
+        return await asyncio.to_thread(
+            self._finish_pages, job, item_dir, sink, time.monotonic() - t0
+        )
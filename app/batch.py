@@ -0,0 +1,389 @@
+"""Headless bulk OCR of a directory, without the web server.
+
+Walks ``SRC`` (or reads a manifest with one path per line), enqueues
+every image/PDF straight into the task queue and prints progress to
+stdout as JSON lines. Files whose content hash the checkpoint already
+records as done are skipped, so an interrupted run picks up where it
+stopped; a file counts as done only for the same OCR options (model,
+layout flags, mode, image pre-processing). Settings come from ``.env``
+like the server.
+
+    python -m app.batch ./scans --checkpoint scans.ckpt.jsonl
+    python -m app.batch --manifest files.txt --engine asyncio
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import queue as queue_mod
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+from .async_task_queue import AsyncTaskQueue
+from .config import settings
+from .engine import make_engine, make_result_cache
+from .ocr_client import OcrOptions
+from .task_queue import Task, TaskItem, TaskQueue
+from .utils import safe_path_segment, sha256_file
+
+
+_EXTS = (".pdf", ".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+_SETTLED = ("done", "failed", "canceled")
+
+
+def _emit(event: str, **data: Any) -> None:
+    sys.stdout.write(json.dumps({"event": event, **data}, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def _walk(src: Path) -> list[tuple[Path, str]]:
+    """(path, relpath) of every supported file below ``src``, sorted."""
+    if src.is_file():
+        return [(src, src.name)]
+    found = []
+    for dirpath, dirnames, filenames in os.walk(src):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.lower().endswith(_EXTS) and not name.startswith("."):
+                path = Path(dirpath) / name
+                found.append((path, path.relative_to(src).as_posix()))
+    return found
+
+
+def _read_manifest(manifest: Path) -> list[tuple[Path, str]]:
+    # Relative entries are resolved against the manifest's directory.
+    base = manifest.parent
+    found = []
+    for line in manifest.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        path = Path(line)
+        if not path.is_absolute():
+            path = base / path
+        found.append((path, line))
+    return found
+
+
+def _options_key(options: dict[str, Any]) -> str:
+    return json.dumps(options, sort_keys=True)
+
+
+def _load_checkpoint(path: Optional[Path]) -> dict[tuple[str, str], dict[str, Any]]:
+    """(sha256, options key) -> last checkpoint record of files already OCR'd.
+
+    Records without options (or with other ones) never match, so those
+    files are OCR'd again.
+    """
+    done: dict[tuple[str, str], dict[str, Any]] = {}
+    if not path or not path.exists():
+        return done
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if (
+                isinstance(rec, dict)
+                and rec.get("status") == "done"
+                and rec.get("sha256")
+                and isinstance(rec.get("options"), dict)
+            ):
+                done[(rec["sha256"], _options_key(rec["options"]))] = rec
+    return done
+
+
+class _Loop:
+    # Runs the asyncio engine's event loop on a background thread.
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="batch-loop", daemon=True
+        )
+        self._thread.start()
+
+    def run(self, coro: Any, timeout: Optional[float] = None) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class BatchRun:
+    """One CLI run: a single task holding every file that isn't skipped."""
+
+    def __init__(
+        self,
+        queue: TaskQueue,
+        *,
+        files: list[tuple[Path, str]],
+        checkpoint: Optional[Path],
+        force_async: bool,
+        options: OcrOptions,
+        model: str,
+        priority: int,
+        progress_s: float,
+    ) -> None:
+        self._queue = queue
+        self._files = files
+        self._checkpoint_path = checkpoint
+        self._force_async = force_async
+        self._options = options
+        self._model = model
+        self._priority = priority
+        self._progress_s = progress_s
+        # Settled items, pushed by the subscriber, drained by the main thread.
+        self._events: queue_mod.Queue[TaskItem] = queue_mod.Queue()
+        self._reported: set[str] = set()
+        # item_id -> (path, sha256, effective options, enqueued at)
+        self._pending: dict[str, tuple[Path, str, dict[str, Any], float]] = {}
+        self.counts = {"done": 0, "failed": 0, "canceled": 0, "skipped": 0}
+        self.failures: list[dict[str, str]] = []
+        self.bytes_done = 0
+        self.task: Optional[Task] = None
+        self.t0 = time.monotonic()
+
+    def _on_change(self, task: Task, item: Optional[TaskItem]) -> None:
+        # Runs under the task lock: only hand settled items over.
+        if item is not None and item.status in _SETTLED and item.item_id not in self._reported:
+            self._reported.add(item.item_id)
+            self._events.put(item)
+
+    def run(self) -> None:
+        skip = _load_checkpoint(self._checkpoint_path)
+        ckpt: Optional[TextIO] = None
+        if self._checkpoint_path:
+            self._checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+            ckpt = self._checkpoint_path.open("a", encoding="utf-8", buffering=1)
+        self.task = task = self._queue.create_task()
+        unsubscribe = self._queue.subscribe(task.task_id, self._on_change)
+        if self._priority:
+            self._queue.set_priority(task.task_id, self._priority)
+        self.t0 = time.monotonic()
+        _emit(
+            "start",
+            taskId=task.task_id,
+            outputDir=str(Path(settings.output_root) / task.task_id),
+            engine=settings.engine,
+            files=len(self._files),
+            checkpointDone=len(skip),
+        )
+        last_progress = time.monotonic()
+        try:
+            # Hash and enqueue one file at a time so OCR starts right away;
+            # settled items are reported in between.
+            for path, relpath in self._files:
+                self._enqueue(path, relpath, skip)
+                self._drain(ckpt, timeout=0)
+                if time.monotonic() - last_progress >= self._progress_s:
+                    self._progress()
+                    last_progress = time.monotonic()
+            while self._pending:
+                self._drain(ckpt, timeout=min(1.0, self._progress_s))
+                if time.monotonic() - last_progress >= self._progress_s:
+                    self._progress()
+                    last_progress = time.monotonic()
+        finally:
+            unsubscribe()
+            if ckpt:
+                ckpt.close()
+
+    def _enqueue(
+        self,
+        path: Path,
+        relpath: str,
+        skip: dict[tuple[str, str], dict[str, Any]],
+    ) -> None:
+        assert self.task is not None
+        try:
+            size = path.stat().st_size
+            digest = sha256_file(path)
+        except OSError as e:
+            self._fail(str(path), f"读取文件失败：{e}")
+            return
+        options = self._effective_options(path)
+        prev = skip.get((digest, _options_key(options)))
+        if prev is not None:
+            self.counts["skipped"] += 1
+            _emit("skip", path=str(path), sha256=digest, outputDir=prev.get("outputDir", ""))
+            return
+        item = self._queue.enqueue_file(
+            task_id=self.task.task_id,
+            # The source is read in place; nothing under it is written or removed.
+            local_path=str(path),
+            filename=safe_path_segment(path.name),
+            relpath=relpath,
+            size=size,
+            force_async=self._force_async,
+            options=self._options,
+            sha256=digest,
+        )
+        self._pending[item.item_id] = (path, digest, options, time.monotonic())
+
+    def _effective_options(self, path: Path) -> dict[str, Any]:
+        # Everything that changes the OCR output of a file.
+        return {
+            "model": self._model,
+            "forceAsync": self._force_async,
+            "prep": self._queue.prep_variant(path.name),
+            **self._options.to_payload(),
+        }
+
+    def _drain(self, ckpt: Optional[TextIO], timeout: float) -> None:
+        while True:
+            try:
+                item = self._events.get(timeout=timeout) if timeout else self._events.get_nowait()
+            except queue_mod.Empty:
+                return
+            timeout = 0
+            entry = self._pending.pop(item.item_id, None)
+            if entry is None:
+                continue
+            path, digest, options, t_enq = entry
+            status = item.status
+            self.counts[status] += 1
+            out_dir = str(Path(item.output_dir) / item.item_id)
+            rec = {
+                "path": str(path),
+                "sha256": digest,
+                "status": status,
+                "itemId": item.item_id,
+                "outputDir": out_dir,
+                "mdFiles": list(item.md_files),
+                "error": item.error,
+                "seconds": round(time.monotonic() - t_enq, 3),
+                "options": options,
+            }
+            if status == "done":
+                self.bytes_done += item.size
+            elif status == "failed":
+                self.failures.append({"path": str(path), "error": item.error})
+            _emit("item", **rec)
+            if ckpt and status == "done":
+                ckpt.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def _fail(self, path: str, error: str) -> None:
+        self.counts["failed"] += 1
+        self.failures.append({"path": path, "error": error})
+        _emit("item", path=path, status="failed", error=error)
+
+    def cancel(self) -> None:
+        if self.task:
+            self._queue.cancel_task(self.task.task_id)
+
+    def _elapsed(self) -> float:
+        return max(1e-6, time.monotonic() - self.t0)
+
+    def _progress(self) -> None:
+        elapsed = self._elapsed()
+        settled = self.counts["done"] + self.counts["failed"]
+        _emit(
+            "progress",
+            **self.counts,
+            pending=len(self._pending),
+            total=len(self._files),
+            elapsedSeconds=round(elapsed, 1),
+            filesPerMin=round(settled / elapsed * 60, 2),
+        )
+
+    def summary(self) -> dict[str, Any]:
+        elapsed = self._elapsed()
+        return {
+            "taskId": self.task.task_id if self.task else "",
+            "total": len(self._files),
+            **self.counts,
+            "wallSeconds": round(elapsed, 3),
+            "filesPerMin": round(self.counts["done"] / elapsed * 60, 2),
+            "mbPerMin": round(self.bytes_done / 1024 / 1024 / elapsed * 60, 3),
+            "failures": self.failures,
+        }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="python -m app.batch", description="批量 OCR 本地目录中的图片与 PDF"
+    )
+    ap.add_argument("src", nargs="?", help="要识别的目录或单个文件")
+    ap.add_argument("--manifest", help="文件清单：每行一个路径，# 开头为注释")
+    ap.add_argument(
+        "--checkpoint", help="断点文件（JSONL）：记录已完成文件的哈希与识别选项，重跑时跳过"
+    )
+    ap.add_argument("--output", help="输出目录，默认取 OUTPUT_ROOT")
+    ap.add_argument("--engine", choices=("threads", "asyncio"), help="默认取 ENGINE")
+    ap.add_argument("--force-async", action="store_true", help="全部走异步任务接口")
+    ap.add_argument("--priority", type=int, default=0)
+    ap.add_argument("--use-doc-orientation-classify", action="store_true")
+    ap.add_argument("--use-doc-unwarping", action="store_true")
+    ap.add_argument("--use-chart-recognition", action="store_true")
+    ap.add_argument(
+        "--progress-interval", type=float, default=5.0, help="进度输出间隔（秒）"
+    )
+    args = ap.parse_args(argv)
+
+    if bool(args.src) == bool(args.manifest):
+        ap.error("需要指定目录 SRC 或 --manifest 其中之一")
+    if args.manifest:
+        files = _read_manifest(Path(args.manifest))
+    else:
+        src = Path(args.src)
+        if not src.exists():
+            ap.error(f"路径不存在：{src}")
+        files = _walk(src)
+    if args.output:
+        settings.output_root = args.output
+    if args.engine:
+        settings.engine = args.engine
+    try:
+        settings.validate()
+    except RuntimeError as e:
+        # Fail before any file is hashed or queued, not once per file.
+        ap.error(str(e))
+
+    # No task store: the run is resumed from the checkpoint instead, and
+    # nothing may treat the source files as uploads it owns.
+    client, queue = make_engine(cache=make_result_cache(), store=None)
+    loop = _Loop() if isinstance(queue, AsyncTaskQueue) else None
+    if loop:
+        loop.run(queue.start())
+
+    run = BatchRun(
+        queue,
+        files=files,
+        checkpoint=Path(args.checkpoint) if args.checkpoint else None,
+        force_async=args.force_async,
+        options=OcrOptions(
+            use_doc_orientation_classify=args.use_doc_orientation_classify,
+            use_doc_unwarping=args.use_doc_unwarping,
+            use_chart_recognition=args.use_chart_recognition,
+        ),
+        model=client.model,
+        priority=args.priority,
+        progress_s=max(0.5, args.progress_interval),
+    )
+    interrupted = False
+    try:
+        run.run()
+    except KeyboardInterrupt:
+        interrupted = True
+        run.cancel()
+    finally:
+        if loop:
+            try:
+                loop.run(queue.stop(), timeout=30)
+            finally:
+                loop.close()
+    _emit("summary", interrupted=interrupted, **run.summary())
+    if interrupted:
+        return 130
+    return 1 if run.counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,13 @@ import dotenv
 dotenv.load_dotenv()
 
 
+def getenv_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().strip('"').lower() in ("1", "true", "yes", "on")
+
+
 def getenv_required(name: str) -> str:
     value = os.getenv(name)
     if not value:
@@ -22,11 +29,157 @@ class Settings:
             os.getenv("BAIDU_PADDLE_OCR_JOB_URL", "").strip().strip('"')
         )
         self.baidu_token = os.getenv("BAIDU_AI_STUDIO_API_KEY", "").strip().strip('"')
+        self.baidu_model = (
+            os.getenv("BAIDU_PADDLE_OCR_MODEL", "PaddleOCR-VL-1.5").strip().strip('"')
+        )
 
         self.output_root = os.getenv("OUTPUT_ROOT", "output").strip().strip('"')
         self.max_file_bytes = int(os.getenv("MAX_FILE_BYTES", str(25 * 1024 * 1024)))
         self.max_total_bytes = int(os.getenv("MAX_TOTAL_BYTES", str(250 * 1024 * 1024)))
         self.default_concurrency = int(os.getenv("DEFAULT_CONCURRENCY", "2"))
+        # "threads" (worker threads + requests) or "asyncio" (coroutines on the
+        # server's event loop + httpx, needs the optional httpx package).
+        self.engine = (
+            os.getenv("ENGINE", "threads").strip().strip('"').lower() or "threads"
+        )
+
+        # Client-side request rate limit for all OCR API calls (0 = unlimited),
+        # and AIMD control of in-flight OCR submits: starts at
+        # DEFAULT_CONCURRENCY, grows up to OCR_MAX_CONCURRENCY while upstream is
+        # healthy and halves on 429/5xx (or when a submit exceeds
+        # OCR_LATENCY_TARGET_S, 0 = ignore latency).
+        self.ocr_rate_limit_per_s = float(os.getenv("OCR_RATE_LIMIT_PER_S", "0"))
+        self.ocr_rate_burst = float(
+            os.getenv("OCR_RATE_BURST", "") or max(1.0, self.ocr_rate_limit_per_s)
+        )
+        self.ocr_max_concurrency = int(
+            os.getenv("OCR_MAX_CONCURRENCY", "") or self.default_concurrency
+        )
+        self.ocr_latency_target_s = float(os.getenv("OCR_LATENCY_TARGET_S", "0"))
+
+        # Transient upstream failures are retried with jittered exponential
+        # backoff (polls, downloads, sync OCR; job submits only when upstream
+        # surely didn't create the job). After OCR_BREAKER_THRESHOLD consecutive
+        # failures an endpoint is paused for OCR_BREAKER_RESET_S and queued
+        # items wait instead of failing.
+        self.ocr_retry_attempts = int(os.getenv("OCR_RETRY_ATTEMPTS", "4"))
+        self.ocr_retry_base_s = float(os.getenv("OCR_RETRY_BASE_S", "0.5"))
+        self.ocr_retry_max_s = float(os.getenv("OCR_RETRY_MAX_S", "30"))
+        self.ocr_breaker_threshold = int(os.getenv("OCR_BREAKER_THRESHOLD", "5"))
+        self.ocr_breaker_reset_s = float(os.getenv("OCR_BREAKER_RESET_S", "30"))
+
+        # Tasks, items and submitted job ids are persisted to SQLite so the
+        # queue survives restarts. Defaults to OUTPUT_ROOT/tasks.db.
+        self.task_store_enabled = getenv_bool("TASK_STORE_ENABLED", True)
+        self.task_store_path = (
+            os.getenv("TASK_STORE_PATH", "").strip().strip('"')
+            or os.path.join(self.output_root, "tasks.db")
+        )
+
+        # Multi-process mode: with WORKER_PROCESSES > 0 the web process only
+        # accepts uploads and serves status, and starts that many
+        # `python -m app.worker` processes that claim items from a SQLite work
+        # queue (WORK_QUEUE_PATH, default OUTPUT_ROOT/work.db) and do the OCR.
+        # EXTERNAL_WORKERS=1 does the same for workers started elsewhere, e.g.
+        # the compose worker service. Items of a worker that stops renewing
+        # its lease for WORKER_LEASE_S are taken over by another one.
+        self.worker_processes = int(os.getenv("WORKER_PROCESSES", "0"))
+        self.external_workers = getenv_bool("EXTERNAL_WORKERS", False)
+        self.work_queue_path = (
+            os.getenv("WORK_QUEUE_PATH", "").strip().strip('"')
+            or os.path.join(self.output_root, "work.db")
+        )
+        self.worker_lease_s = float(os.getenv("WORKER_LEASE_S", "60"))
+
+        # Split PDFs longer than PDF_SHARD_PAGES pages into page ranges and OCR
+        # them concurrently (0 disables; needs the optional pypdf package).
+        # PDF_SHARD_MODE selects the API used per shard: "job" or "sync".
+        self.pdf_shard_pages = int(os.getenv("PDF_SHARD_PAGES", "0"))
+        self.pdf_shard_mode = (
+            os.getenv("PDF_SHARD_MODE", "job").strip().strip('"').lower() or "job"
+        )
+        self.pdf_shard_concurrency = int(os.getenv("PDF_SHARD_CONCURRENCY", "4"))
+
+        # Optional image pre-processing before upload (needs Pillow): downscale
+        # so the longer side is at most IMAGE_MAX_SIDE px (0 keeps the size),
+        # re-encode photos as JPEG and the rest as PNG (TIFF/BMP/WebP always
+        # converted), strip metadata. Runs in IMAGE_PREP_WORKERS processes.
+        self.image_preprocess = getenv_bool("IMAGE_PREPROCESS", False)
+        self.image_max_side = int(os.getenv("IMAGE_MAX_SIDE", "2560"))
+        self.image_jpeg_quality = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+        self.image_prep_workers = int(
+            os.getenv("IMAGE_PREP_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))
+        )
+
+        # Async jobs are polled with adaptive backoff; each status request
+        # gets its own short read timeout so a hung one can't stall the rest.
+        self.job_poll_min_interval_s = float(os.getenv("JOB_POLL_MIN_INTERVAL_S", "1"))
+        self.job_poll_max_interval_s = float(
+            os.getenv("JOB_POLL_MAX_INTERVAL_S", "10")
+        )
+        self.job_max_wait_s = float(os.getenv("JOB_MAX_WAIT_S", str(15 * 60)))
+        # Consecutive failed status requests before a job is given up on.
+        self.job_poll_max_errors = int(os.getenv("JOB_POLL_MAX_ERRORS", "10"))
+        self.job_poll_timeout_s = float(os.getenv("JOB_POLL_TIMEOUT_S", "10"))
+
+        # Images referenced by each OCR page are fetched in parallel.
+        self.asset_download_concurrency = int(
+            os.getenv("ASSET_DOWNLOAD_CONCURRENCY", "8")
+        )
+
+        # Pipeline stages after submit: fetch streams job results and
+        # materializes them page by page; materialize writes sync results.
+        # Each has its own workers and a bounded queue; a full queue holds
+        # back the stage before it.
+        self.fetch_concurrency = int(
+            os.getenv("FETCH_CONCURRENCY", str(max(1, self.default_concurrency)))
+        )
+        self.materialize_concurrency = int(
+            os.getenv("MATERIALIZE_CONCURRENCY", str(max(1, self.default_concurrency)))
+        )
+        self.stage_queue_size = int(os.getenv("STAGE_QUEUE_SIZE", "16"))
+
+        # Keep-alive connection pool shared by the OCR client and asset downloads.
+        # Per-host pool size defaults to enough connections for every submit,
+        # fetch and materialize worker to download assets in parallel.
+        self.http_pool_maxsize = int(
+            os.getenv(
+                "HTTP_POOL_MAXSIZE",
+                str(
+                    max(
+                        1,
+                        self.default_concurrency
+                        + self.fetch_concurrency
+                        + self.materialize_concurrency,
+                    )
+                    * max(4, self.asset_download_concurrency)
+                ),
+            )
+        )
+        self.http_connect_timeout_s = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "10"))
+        self.http_read_timeout_s = float(os.getenv("HTTP_READ_TIMEOUT_S", "60"))
+
+        # Content-addressed OCR result cache under OUTPUT_ROOT/_cache; 0 disables.
+        self.result_cache_max_bytes = int(
+            os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024))
+        )
+        self.result_cache_ttl_s = float(
+            os.getenv("RESULT_CACHE_TTL_S", str(30 * 24 * 3600))
+        )
+
+        # Background janitor, every JANITOR_INTERVAL_S (0 disables it):
+        # finished tasks idle longer than OUTPUT_RETENTION_S, beyond
+        # OUTPUT_MAX_TASKS, or needed to bring task outputs and cached ZIPs
+        # under OUTPUT_MAX_BYTES are dropped from memory, the task store and
+        # disk, least recently used first. 0 disables each limit; _cache has
+        # its own bounds above.
+        self.janitor_interval_s = float(os.getenv("JANITOR_INTERVAL_S", "300"))
+        self.output_retention_s = float(os.getenv("OUTPUT_RETENTION_S", "0"))
+        self.output_max_tasks = int(os.getenv("OUTPUT_MAX_TASKS", "0"))
+        self.output_max_bytes = int(os.getenv("OUTPUT_MAX_BYTES", "0"))
+        # Delete uploaded originals (inputs/) of succeeded items once their
+        # task has finished.
+        self.compact_inputs = getenv_bool("COMPACT_INPUTS", False)
 
     def validate(self) -> None:
         if not self.baidu_token:
@@ -0,0 +1,132 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from .async_ocr_client import AsyncBaiduPaddleOcrClient
+from .async_task_queue import AsyncTaskQueue
+from .config import settings
+from .http_pool import HttpPool
+from .job_poller import JobPoller
+from .ocr_client import BaiduPaddleOcrClient
+from .result_cache import ResultCache
+from .retry import RetryPolicy
+from .task_queue import TaskQueue
+from .task_store import TaskStore
+from .throttle import AdaptiveLimiter, TokenBucket
+from .work_queue import WorkQueue
+
+
+# Client and task queue construction from settings, shared by the web
+# server and the batch CLI (app/batch.py).
+
+
+def make_result_cache() -> Optional[ResultCache]:
+    if settings.result_cache_max_bytes <= 0:
+        return None
+    return ResultCache(
+        root=Path(settings.output_root) / "_cache",
+        max_bytes=settings.result_cache_max_bytes,
+        ttl_s=settings.result_cache_ttl_s,
+    )
+
+
+def server_role() -> str:
+    """Role of the web process: "web" when OCR runs in worker processes."""
+    if settings.worker_processes > 0 or settings.external_workers:
+        return "web"
+    return "all"
+
+
+def make_engine(
+    *,
+    cache: Optional[ResultCache],
+    store: Optional[TaskStore],
+    role: str = "all",
+) -> tuple[BaiduPaddleOcrClient | AsyncBaiduPaddleOcrClient, TaskQueue]:
+    """Build the OCR client and task queue for ``settings.engine``.
+
+    ``role`` "web" or "worker" connects the queue to the shared work queue
+    (see ``TaskQueue``). An ``AsyncTaskQueue`` must still be started on the
+    event loop it should run on.
+    """
+    # Both engines share the same upstream protection settings.
+    client_options: dict[str, Any] = dict(
+        token=settings.baidu_token,
+        api_url=settings.baidu_api_url,
+        job_url=settings.baidu_job_url,
+        model=settings.baidu_model,
+        rate_limiter=TokenBucket(
+            rate_per_s=settings.ocr_rate_limit_per_s, burst=settings.ocr_rate_burst
+        ),
+        limiter=AdaptiveLimiter(
+            initial=settings.default_concurrency,
+            max_limit=max(settings.default_concurrency, settings.ocr_max_concurrency),
+            latency_target_s=settings.ocr_latency_target_s,
+        ),
+        retry=RetryPolicy(
+            attempts=settings.ocr_retry_attempts,
+            base_s=settings.ocr_retry_base_s,
+            max_s=settings.ocr_retry_max_s,
+        ),
+        breaker_threshold=settings.ocr_breaker_threshold,
+        breaker_reset_s=settings.ocr_breaker_reset_s,
+    )
+    queue_options: dict[str, Any] = dict(
+        output_root=settings.output_root,
+        # Enough workers for the limiter to grow into; it gates the actual OCR calls.
+        concurrency=max(settings.default_concurrency, settings.ocr_max_concurrency),
+        cache=cache,
+        asset_concurrency=settings.asset_download_concurrency,
+        store=store,
+        shard_pages=settings.pdf_shard_pages,
+        shard_mode=settings.pdf_shard_mode,
+        shard_concurrency=settings.pdf_shard_concurrency,
+        fetch_concurrency=settings.fetch_concurrency,
+        materialize_concurrency=settings.materialize_concurrency,
+        stage_capacity=settings.stage_queue_size,
+        image_prep_workers=settings.image_prep_workers if settings.image_preprocess else 0,
+        image_max_side=settings.image_max_side,
+        image_jpeg_quality=settings.image_jpeg_quality,
+    )
+    if role != "all":
+        queue_options.update(
+            work_queue=WorkQueue(
+                settings.work_queue_path, lease_s=settings.worker_lease_s
+            ),
+            role=role,
+        )
+
+    client: BaiduPaddleOcrClient | AsyncBaiduPaddleOcrClient
+    queue: TaskQueue
+    if settings.engine == "asyncio":
+        client = AsyncBaiduPaddleOcrClient(
+            **client_options,
+            pool_maxsize=settings.http_pool_maxsize,
+            connect_timeout_s=settings.http_connect_timeout_s,
+            read_timeout_s=settings.http_read_timeout_s,
+        )
+        queue = AsyncTaskQueue(
+            client=client,
+            **queue_options,
+            poll_min_interval_s=settings.job_poll_min_interval_s,
+            poll_max_interval_s=settings.job_poll_max_interval_s,
+            job_max_wait_s=settings.job_max_wait_s,
+            poll_max_errors=settings.job_poll_max_errors,
+            poll_timeout_s=settings.job_poll_timeout_s,
+        )
+    else:
+        http_pool = HttpPool(
+            pool_maxsize=settings.http_pool_maxsize,
+            connect_timeout_s=settings.http_connect_timeout_s,
+            read_timeout_s=settings.http_read_timeout_s,
+        )
+        client = BaiduPaddleOcrClient(**client_options, http=http_pool)
+        poller = JobPoller(
+            client=client,
+            min_interval_s=settings.job_poll_min_interval_s,
+            max_interval_s=settings.job_poll_max_interval_s,
+            max_wait_s=settings.job_max_wait_s,
+            max_errors=settings.job_poll_max_errors,
+            timeout_s=settings.job_poll_timeout_s,
+        )
+        queue = TaskQueue(client=client, poller=poller, **queue_options)
+    return client, queue
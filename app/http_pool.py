@@ -0,0 +1,113 @@
+import threading
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class _PoolStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            requests_ = self.requests
+            misses = self.new_connections
+        return {
+            "requests": requests_,
+            "hits": max(0, requests_ - misses),
+            "misses": misses,
+        }
+
+
+def _counting_pool_cls(base: type, stats: _PoolStats) -> type:
+    # urllib3 calls _new_conn() only when no idle keep-alive connection is
+    # available for the host, so every call is a pool miss.
+    class _CountingPool(base):  # type: ignore[misc, valid-type]
+        def _new_conn(self):  # type: ignore[no-untyped-def]
+            stats.record_new_connection()
+            return super()._new_conn()
+
+    _CountingPool.__name__ = f"Counting{base.__name__}"
+    return _CountingPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, *, stats: _PoolStats, **kwargs: Any) -> None:
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool_cls(HTTPConnectionPool, self._stats),
+            "https": _counting_pool_cls(HTTPSConnectionPool, self._stats),
+        }
+
+    def send(self, request, **kwargs):  # type: ignore[no-untyped-def]
+        self._stats.record_request()
+        return super().send(request, **kwargs)
+
+
+class HttpPool:
+    """Keep-alive HTTP connection pool shared by all worker threads.
+
+    Each thread gets its own ``requests.Session`` (sessions are not
+    thread-safe), but every session mounts the same adapter, so the
+    underlying urllib3 connection pools are shared.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_maxsize: int = 8,
+        connect_timeout_s: float = 10.0,
+        read_timeout_s: float = 60.0,
+    ) -> None:
+        self._stats = _PoolStats()
+        self._adapter = _CountingAdapter(
+            stats=self._stats,
+            pool_connections=16,
+            pool_maxsize=max(1, int(pool_maxsize)),
+        )
+        self._local = threading.local()
+        self.pool_maxsize = max(1, int(pool_maxsize))
+        self.timeout = (float(connect_timeout_s), float(read_timeout_s))
+
+    def _session(self) -> requests.Session:
+        s: Optional[requests.Session] = getattr(self._local, "session", None)
+        if s is None:
+            s = requests.Session()
+            s.mount("http://", self._adapter)
+            s.mount("https://", self._adapter)
+            self._local.session = s
+        return s
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self._session().request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict[str, int]:
+        data = self._stats.snapshot()
+        data["poolMaxsize"] = self.pool_maxsize
+        return data
+
+    def close(self) -> None:
+        self._adapter.close()
@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency: pip install "PaddleOCR-VL-BaiduAIStudio[image]"
+    Image = None  # type: ignore[assignment]
+    ImageOps = None  # type: ignore[assignment]
+
+
+# Formats the API takes as they are; anything else (TIFF, BMP, WebP) is
+# always converted.
+_NATIVE_FORMATS = ("JPEG", "PNG")
+# Modes PNG stores directly; others are converted to RGB(A) first.
+_PNG_MODES = ("1", "L", "LA", "P", "RGB", "RGBA", "I;16")
+# Bilevel, grayscale, palette and alpha images are usually scans, line art
+# or screenshots: kept lossless, where JPEG would blur the text.
+_LOSSLESS_MODES = ("1", "L", "LA", "P", "PA", "RGBA", "I", "I;16", "F")
+
+
+def preprocessing_available() -> bool:
+    return Image is not None
+
+
+def prepare_image(
+    src: str, out_dir: str, *, max_side: int, jpeg_quality: int
+) -> Optional[str]:
+    """Downscale, re-encode and strip metadata from the image at ``src``.
+
+    Runs in a worker process. Photos become JPEG at ``jpeg_quality``,
+    everything else PNG; the longer side is capped at ``max_side`` pixels
+    (0 keeps the size). Returns the path of the copy written to
+    ``out_dir``, or None to send the original as is: a JPEG/PNG that
+    didn't get smaller, or a multi-frame file this would truncate.
+    """
+    if Image is None:
+        return None
+    with Image.open(src) as im:
+        fmt = im.format or ""
+        if getattr(im, "n_frames", 1) > 1:
+            return None
+        resized = max_side > 0 and max(im.size) > max_side
+        # Apply the EXIF orientation before the metadata is dropped.
+        img = ImageOps.exif_transpose(im)
+        if resized:
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        alpha = "A" in img.mode or "transparency" in img.info
+        if fmt == "PNG" or img.mode in _LOSSLESS_MODES or alpha:
+            if img.mode not in _PNG_MODES:
+                img = img.convert("RGBA" if alpha else "RGB")
+            ext, params = ".png", {"format": "PNG", "optimize": True}
+        else:
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            ext, params = ".jpg", {
+                "format": "JPEG",
+                "quality": int(jpeg_quality),
+                "optimize": True,
+            }
+        os.makedirs(out_dir, exist_ok=True)
+        out = Path(out_dir) / (Path(src).stem + ext)
+        img.save(out, **params)
+
+    if fmt in _NATIVE_FORMATS and not resized:
+        if out.stat().st_size >= os.path.getsize(src):
+            out.unlink()
+            return None
+    return str(out)
@@ -0,0 +1,294 @@
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from . import metrics
+from .task_queue import TASK_ID_RE, Task, TaskQueue
+from .utils import dir_size
+
+
+# Tasks changed or read this recently are left alone.
+_MIN_IDLE_S = 60.0
+# Task directories the queue doesn't know about may belong to a batch run
+# or another process whose remote jobs are still running, so they are
+# only removed after a day without any file being written.
+_ORPHAN_MIN_IDLE_S = 24 * 3600.0
+# Partial ZIP exports left behind by a crash.
+_PART_MAX_AGE_S = 3600.0
+
+_SETTLED = ("done", "failed", "canceled")
+
+
+def _settled(task: Task) -> bool:
+    return task.status in _SETTLED and not (
+        task.queued or task.running or task.uploading
+    )
+
+
+def _prune_empty_dirs(path: Path, stop: Path) -> None:
+    # Remove now-empty parents of a deleted file, below stop.
+    while stop in path.parents:
+        try:
+            path.rmdir()
+        except OSError:
+            return
+        path = path.parent
+
+
+def _tree_mtime(path: Path) -> float:
+    # Newest mtime in the tree: writing a file deep inside doesn't touch
+    # the mtime of the task directory itself.
+    newest = path.stat().st_mtime
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            try:
+                newest = max(newest, os.stat(os.path.join(dirpath, name)).st_mtime)
+            except OSError:
+                pass
+    return newest
+
+
+class Janitor:
+    """Background cleanup of ``OUTPUT_ROOT``.
+
+    Every ``interval_s`` finished tasks are evicted from memory, the task
+    store and disk, least recently used first: those idle longer than
+    ``retention_s``, the oldest beyond ``max_tasks``, and as many as it
+    takes to bring task outputs plus cached ZIP exports under
+    ``max_bytes`` (cached ZIPs go first, they can be rebuilt). Task
+    directories the queue doesn't know about age out a day after the
+    newest mtime of their files. Tasks with an upload in progress are
+    never touched. With
+    ``compact_inputs`` the uploaded original of each succeeded item is
+    deleted once its task has finished. A limit of 0 disables it.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue: TaskQueue,
+        output_root: str | Path,
+        zip_dir: str | Path,
+        interval_s: float = 300.0,
+        retention_s: float = 0.0,
+        max_tasks: int = 0,
+        max_bytes: int = 0,
+        compact_inputs: bool = False,
+    ) -> None:
+        self._queue = queue
+        self._root = Path(output_root)
+        self._zip_dir = Path(zip_dir)
+        self._interval_s = max(1.0, float(interval_s))
+        self._retention_s = max(0.0, float(retention_s))
+        self._max_tasks = max(0, int(max_tasks))
+        self._max_bytes = max(0, int(max_bytes))
+        self._compact_inputs = compact_inputs
+        # task_id -> (task version, bytes on disk); finished tasks rarely change.
+        self._sizes: dict[str, tuple[float, int]] = {}
+        # task_id -> task version whose succeeded inputs were already removed.
+        self._compacted: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.sweeps = 0
+        self.evicted: dict[str, int] = {}
+        self.compacted_files = 0
+        self.output_bytes = 0
+        self.last_sweep_s = 0.0
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval_s):
+            try:
+                self.run_once()
+            except Exception:  # noqa: BLE001
+                # Never let a cleanup error kill the thread; retry next round.
+                pass
+
+    def run_once(self) -> None:
+        t0 = time.monotonic()
+        now = time.time()
+        tasks = self._queue.list_tasks()
+        known = {t.task_id: t for t in tasks}
+        if self._compact_inputs:
+            for task in tasks:
+                if _settled(task):
+                    self._compact(task)
+
+        # (last access, task_id) of everything that may go, oldest first.
+        candidates: list[tuple[float, str]] = []
+        for task in tasks:
+            if _settled(task) and now - task.accessed_at >= _MIN_IDLE_S:
+                candidates.append((task.accessed_at, task.task_id))
+        mtimes: dict[str, float] = {}
+        for path in self._task_dirs():
+            if path.name in known:
+                continue
+            try:
+                mtime = mtimes[path.name] = _tree_mtime(path)
+            except OSError:
+                continue
+            if now - mtime >= _ORPHAN_MIN_IDLE_S:
+                candidates.append((mtime, path.name))
+        candidates.sort()
+
+        if self._retention_s:
+            expired = [c for c in candidates if now - c[0] > self._retention_s]
+            for _, task_id in expired:
+                self._evict(task_id, "age", known)
+            candidates = candidates[len(expired):]
+        if self._max_tasks:
+            finished = [c for c in candidates if c[1] in known]
+            excess = finished[: max(0, len(finished) - self._max_tasks)]
+            for _, task_id in excess:
+                self._evict(task_id, "count", known)
+            candidates = [c for c in candidates if c not in excess]
+
+        self._drop_stale_zips(now, known)
+        usage = self._usage(known, mtimes)
+        if self._max_bytes and usage > self._max_bytes:
+            usage = self._shrink_zips(usage)
+        for _, task_id in candidates:
+            if not self._max_bytes or usage <= self._max_bytes:
+                break
+            freed = self._sizes.get(task_id, (0, 0))[1]
+            if self._evict(task_id, "quota", known):
+                usage -= freed
+
+        with self._lock:
+            self.sweeps += 1
+            self.output_bytes = usage
+            self.last_sweep_s = time.monotonic() - t0
+
+    def _task_dirs(self) -> list[Path]:
+        try:
+            return [
+                p
+                for p in self._root.iterdir()
+                # Anything else under OUTPUT_ROOT (_cache, _zips, tasks.db,
+                # ...) is never touched.
+                if TASK_ID_RE.match(p.name) and p.is_dir()
+            ]
+        except OSError:
+            return []
+
+    def _evict(self, task_id: str, reason: str, known: dict[str, Task]) -> bool:
+        # Forget the task first so the API stops serving it, then delete files.
+        if task_id in known and not self._queue.remove_task(task_id):
+            return False
+        shutil.rmtree(self._root / task_id, ignore_errors=True)
+        shutil.rmtree(self._zip_dir / task_id, ignore_errors=True)
+        self._sizes.pop(task_id, None)
+        self._compacted.pop(task_id, None)
+        metrics.EVICTED_TASKS.inc(reason=reason)
+        with self._lock:
+            self.evicted[reason] = self.evicted.get(reason, 0) + 1
+        return True
+
+    def _compact(self, task: Task) -> None:
+        if self._compacted.get(task.task_id) == task.version:
+            return
+        with task.lock:
+            version = task.version
+            paths = [
+                Path(it.local_path)
+                for it in task.items
+                if it.status == "done" and it.local_path
+            ]
+        inputs_dir = self._root / task.task_id / "inputs"
+        removed = 0
+        for path in paths:
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            removed += 1
+            _prune_empty_dirs(path.parent, inputs_dir)
+        if removed:
+            # A new version makes exports cached with the originals stale;
+            # drop them now rather than waiting for the quota to.
+            version = self._queue.files_changed(task.task_id) or version
+            shutil.rmtree(self._zip_dir / task.task_id, ignore_errors=True)
+            with self._lock:
+                self.compacted_files += removed
+        self._compacted[task.task_id] = version
+
+    def _usage(self, known: dict[str, Task], mtimes: dict[str, float]) -> int:
+        """Bytes used by task directories and the ZIP export cache."""
+        total = 0
+        seen = set()
+        for path in self._task_dirs():
+            task = known.get(path.name)
+            # Re-measure a task only when it changed since the last sweep.
+            try:
+                if task:
+                    stamp = float(task.version)
+                else:
+                    stamp = mtimes.get(path.name) or _tree_mtime(path)
+            except OSError:
+                continue
+            cached = self._sizes.get(path.name)
+            if cached is None or cached[0] != stamp or (task and not _settled(task)):
+                cached = (stamp, dir_size(path))
+                self._sizes[path.name] = cached
+            total += cached[1]
+            seen.add(path.name)
+        for task_id in set(self._sizes) - seen:
+            del self._sizes[task_id]
+        return total + dir_size(self._zip_dir)
+
+    def _drop_stale_zips(self, now: float, known: dict[str, Task]) -> None:
+        if not self._zip_dir.is_dir():
+            return
+        for task_zips in self._zip_dir.iterdir():
+            if task_zips.name not in known and not (self._root / task_zips.name).exists():
+                shutil.rmtree(task_zips, ignore_errors=True)
+                continue
+            for part in task_zips.glob(".*.part"):
+                try:
+                    if now - part.stat().st_mtime > _PART_MAX_AGE_S:
+                        part.unlink()
+                except OSError:
+                    pass
+
+    def _shrink_zips(self, usage: int) -> int:
+        # Cached exports are rebuilt on demand, so they go before any task.
+        zips = []
+        for p in self._zip_dir.glob("*/*.zip"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            zips.append((st.st_mtime, st.st_size, p))
+        for _, size, p in sorted(zips):
+            if usage <= self._max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            usage -= size
+        return usage
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "sweeps": self.sweeps,
+                "lastSweepSeconds": round(self.last_sweep_s, 3),
+                "outputBytes": self.output_bytes,
+                "maxBytes": self._max_bytes,
+                "retentionSeconds": self._retention_s,
+                "maxTasks": self._max_tasks,
+                "evicted": dict(self.evicted),
+                "compactedFiles": self.compacted_files,
+            }
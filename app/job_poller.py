@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from .ocr_client import BaiduPaddleOcrClient, is_transient_error
+
+
+@dataclass
+class _PendingJob:
+    job_id: str
+    on_done: Callable[[dict[str, Any]], None]
+    on_error: Callable[[Exception], None]
+    should_cancel: Optional[Callable[[], bool]]
+    submitted_at: float
+    interval_s: float
+    polls: int = 0
+    errors: int = 0  # consecutive transient poll failures
+    last: dict[str, Any] = field(default_factory=dict)
+
+
+class JobPoller:
+    """One thread that schedules polls for every outstanding async job.
+
+    Workers hand off job ids via ``track()`` and return immediately. Each
+    job is polled with adaptive backoff: ``min_interval_s`` at first,
+    growing by ``backoff`` per poll up to ``max_interval_s``. Due polls run
+    on a small pool of ``workers`` threads, each with a read timeout of
+    ``timeout_s``, so one hung status request can't hold up the others.
+    Exactly one of ``on_done(job_data)`` / ``on_error(exc)`` is called per
+    job, from a poller thread, so callbacks must be quick and thread-safe
+    (e.g. put work on a queue).
+    Cancellation is reported as ``RuntimeError("canceled")``, matching
+    ``BaiduPaddleOcrClient.poll_job``. Transient poll failures (timeouts,
+    5xx, open circuit) are retried on the same schedule; only
+    ``max_errors`` consecutive ones fail the job.
+    """
+
+    def __init__(
+        self,
+        *,
+        client: BaiduPaddleOcrClient,
+        min_interval_s: float = 1.0,
+        max_interval_s: float = 10.0,
+        backoff: float = 1.5,
+        max_wait_s: float = 15 * 60.0,
+        max_errors: int = 10,
+        timeout_s: float = 10.0,
+        workers: int = 4,
+    ) -> None:
+        self._client = client
+        self._timeout_s = float(timeout_s)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, int(workers)), thread_name_prefix="job-poll"
+        )
+        self._max_errors = max(1, int(max_errors))
+        self._min_interval_s = max(0.05, float(min_interval_s))
+        self._max_interval_s = max(self._min_interval_s, float(max_interval_s))
+        self._backoff = max(1.0, float(backoff))
+        self._max_wait_s = float(max_wait_s)
+        self._cond = threading.Condition()
+        self._heap: list[tuple[float, int, _PendingJob]] = []
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="job-poller", daemon=True
+        )
+        self._thread.start()
+
+    def track(
+        self,
+        job_id: str,
+        *,
+        on_done: Callable[[dict[str, Any]], None],
+        on_error: Callable[[Exception], None],
+        should_cancel: Optional[Callable[[], bool]] = None,
+        submitted_at: Optional[float] = None,
+    ) -> None:
+        now = time.time()
+        job = _PendingJob(
+            job_id=job_id,
+            on_done=on_done,
+            on_error=on_error,
+            should_cancel=should_cancel,
+            submitted_at=submitted_at or now,
+            interval_s=self._min_interval_s,
+        )
+        with self._cond:
+            heapq.heappush(self._heap, (now + job.interval_s, next(self._seq), job))
+            self._cond.notify()
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            due: list[_PendingJob] = []
+            canceled: list[_PendingJob] = []
+            with self._cond:
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+                if not due:
+                    # Wake periodically to notice cancellations promptly.
+                    wait_s = 0.5
+                    if self._heap:
+                        wait_s = min(wait_s, self._heap[0][0] - now)
+                    self._cond.wait(timeout=max(0.01, wait_s))
+                    canceled = self._sweep_canceled()
+            # Callbacks settle items and may call back in: never under the lock.
+            for job in canceled:
+                self._safe_call(job.on_error, RuntimeError("canceled"))
+            for job in due:
+                # A job is off the heap until its poll finishes, so it is
+                # never polled twice at once.
+                self._pool.submit(self._poll_one, job)
+
+    def _sweep_canceled(self) -> list[_PendingJob]:
+        # Caller holds self._cond; returns the jobs it dropped.
+        keep = []
+        canceled = []
+        for entry in self._heap:
+            job = entry[2]
+            if job.should_cancel and job.should_cancel():
+                canceled.append(job)
+            else:
+                keep.append(entry)
+        if canceled:
+            heapq.heapify(keep)
+            self._heap = keep
+        return canceled
+
+    def _poll_one(self, job: _PendingJob) -> None:
+        if job.should_cancel and job.should_cancel():
+            self._safe_call(job.on_error, RuntimeError("canceled"))
+            return
+        try:
+            data = self._client.get_job(
+                job_id=job.job_id, retry=False, timeout_s=self._timeout_s
+            )
+        except Exception as e:  # noqa: BLE001
+            job.errors += 1
+            if not is_transient_error(e) or job.errors >= self._max_errors:
+                self._safe_call(job.on_error, e)
+                return
+            # Don't block the poller thread; try again on the next slot.
+            self._reschedule(job, max(0.0, getattr(e, "retry_after_s", 0.0)))
+            return
+        job.polls += 1
+        job.errors = 0
+        job.last = data
+        state = data.get("state")
+        if state == "done":
+            self._safe_call(job.on_done, data)
+            return
+        if state == "failed":
+            self._safe_call(
+                job.on_error,
+                RuntimeError(f"Job failed: {data.get('errorMsg', 'unknown error')}"),
+            )
+            return
+        self._reschedule(job)
+
+    def _reschedule(self, job: _PendingJob, min_delay_s: float = 0.0) -> None:
+        now = time.time()
+        if now - job.submitted_at > self._max_wait_s:
+            self._safe_call(
+                job.on_error,
+                RuntimeError(
+                    f"Job timeout after {self._max_wait_s}s; last={job.last}"
+                ),
+            )
+            return
+        job.interval_s = min(self._max_interval_s, job.interval_s * self._backoff)
+        delay_s = max(job.interval_s, min_delay_s)
+        with self._cond:
+            heapq.heappush(self._heap, (now + delay_s, next(self._seq), job))
+            self._cond.notify()
+
+    @staticmethod
+    def _safe_call(fn: Callable[[Any], None], arg: Any) -> None:
+        try:
+            fn(arg)
+        except Exception:  # noqa: BLE001
+            pass
@@ -0,0 +1,223 @@
+import bisect
+import math
+import threading
+from typing import Iterable
+
+
+# Prometheus text exposition without the client library: counters,
+# gauges and histograms keyed by label values, rendered on /metrics.
+
+_SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Per-item stages, in pipeline order (see TaskItem.timings).
+STAGES = (
+    "queue_wait",  # enqueued -> picked up by a worker
+    "prep",  # optional image pre-processing (downscale / re-encode)
+    "upload",  # job submit request (file upload)
+    "remote",  # job submitted -> done upstream, or the whole sync OCR request
+    "result_download",  # JSONL result download
+    "asset_download",  # image downloads
+    "merge",  # markdown writing and merging
+)
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in values]
+
+
+class Gauge(_Metric):
+    # Point-in-time values; the /metrics handler refreshes them per scrape.
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        *,
+        buckets: Iterable[float] = _SECONDS_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self._buckets = tuple(sorted(float(b) for b in buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._values: dict[tuple[str, ...], tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self._buckets) + 1), 0.0)
+            counts[idx] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self._buckets, math.inf), counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, f'le="{_fmt(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "ocr_stage_seconds", "Time spent per item in each pipeline stage.", ("stage",)
+)
+ITEM_SECONDS = Histogram(
+    "ocr_item_seconds", "Item latency from enqueue to settled.", ("status",)
+)
+ITEMS = Counter("ocr_items_total", "Items settled, by final status.", ("status",))
+UPSTREAM_REQUESTS = Counter(
+    "ocr_upstream_requests_total", "Requests sent to the OCR API.", ("endpoint",)
+)
+UPSTREAM_ERRORS = Counter(
+    "ocr_upstream_errors_total",
+    "Failed OCR API requests, by HTTP status or 'transport'.",
+    ("endpoint", "reason"),
+)
+BYTES = Counter(
+    "ocr_bytes_total",
+    "Bytes sent to (upload) and received from (download) upstream.",
+    ("direction",),
+)
+MISSING_ASSETS = Counter(
+    "ocr_missing_assets_total",
+    "Markdown images skipped because upstream answered a non-retryable status.",
+)
+QUEUE_DEPTH = Gauge(
+    "ocr_queue_depth", "Work items waiting for a pipeline stage.", ("stage",)
+)
+ACTIVE_WORKERS = Gauge(
+    "ocr_active_workers", "Stage workers currently processing an item.", ("stage",)
+)
+PENDING_JOBS = Gauge("ocr_pending_jobs", "Remote async jobs being polled.")
+CONCURRENCY_LIMIT = Gauge(
+    "ocr_concurrency_limit", "Current adaptive limit on in-flight OCR requests."
+)
+BREAKER_OPEN = Gauge(
+    "ocr_circuit_open", "1 while the endpoint's circuit breaker is open.", ("endpoint",)
+)
+PREP_BYTES = Counter(
+    "ocr_image_prep_bytes_total",
+    "Image bytes before and after pre-processing.",
+    ("stage",),
+)
+COALESCED_ITEMS = Counter(
+    "ocr_coalesced_items_total",
+    "Items that shared an identical in-flight item's upstream job.",
+)
+EVICTED_TASKS = Counter(
+    "ocr_evicted_tasks_total",
+    "Finished tasks removed by the janitor, by reason (age, count, quota).",
+    ("reason",),
+)
+OUTPUT_BYTES = Gauge(
+    "ocr_output_bytes", "Disk used by task outputs and cached ZIP exports."
+)
+
+for _m in (
+    STAGE_SECONDS,
+    ITEM_SECONDS,
+    ITEMS,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_ERRORS,
+    BYTES,
+    MISSING_ASSETS,
+    QUEUE_DEPTH,
+    ACTIVE_WORKERS,
+    PENDING_JOBS,
+    CONCURRENCY_LIMIT,
+    BREAKER_OPEN,
+    PREP_BYTES,
+    COALESCED_ITEMS,
+    EVICTED_TASKS,
+    OUTPUT_BYTES,
+):
+    REGISTRY.register(_m)
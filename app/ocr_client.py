@@ -1,11 +1,68 @@
+import asyncio
 import base64
 import json
 import os
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any, Callable, Optional
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
 
 import requests
+from urllib3.exceptions import NewConnectionError
+
+from .http_pool import HttpPool
+from . import metrics
+from .retry import CircuitBreaker, CircuitOpen, RetryPolicy
+from .throttle import AdaptiveLimiter, TokenBucket
+
+
+T = TypeVar("T")
+
+_CHUNK_BYTES = 64 * 1024
+# Multiple of 3, so every chunk but the last base64-encodes without padding.
+_B64_READ_BYTES = 3 * 64 * 1024
+
+# Statuses that mean "slow down" rather than "this request is wrong".
+_OVERLOAD_STATUSES = {429, 502, 503, 504}
+# Worth retrying for idempotent calls (polls, downloads, sync OCR).
+_TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+# Upstream refused the job before accepting it, so resubmitting can't duplicate it.
+_REJECTED_STATUSES = {429, 503}
+
+
+class OcrHttpError(RuntimeError):
+    def __init__(
+        self, message: str, *, status_code: int, retry_after_s: float = 0.0
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after_s = retry_after_s
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    if isinstance(exc, (CircuitOpen, requests.RequestException)):
+        return True
+    return isinstance(exc, OcrHttpError) and exc.status_code in _TRANSIENT_STATUSES
+
+
+def _safe_to_resubmit(exc: BaseException) -> bool:
+    # Only when no connection was made: a read timeout, a dropped
+    # connection or a 5xx may come after the job was created upstream.
+    if isinstance(exc, (CircuitOpen, requests.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.ConnectionError) and exc.args:
+        # Connect failures arrive as MaxRetryError(reason=NewConnectionError).
+        cause = exc.args[0]
+        return isinstance(getattr(cause, "reason", cause), NewConnectionError)
+    return isinstance(exc, OcrHttpError) and exc.status_code in _REJECTED_STATUSES
+
+
+def _retry_after_s(resp: requests.Response) -> float:
+    # Only the delta-seconds form; HTTP-date values are ignored.
+    try:
+        return min(60.0, max(0.0, float(resp.headers.get("Retry-After", ""))))
+    except ValueError:
+        return 0.0
 
 
 @dataclass(frozen=True)
@@ -22,6 +79,45 @@ class OcrOptions:
         }
 
 
+class Base64JsonBody:
+    """Request body ``{"file": "<base64 of file_path>", **fields}``,
+    encoded from disk chunk by chunk.
+
+    The whole file, its base64 text and the serialized JSON are never held
+    at once; peak memory is about one chunk whatever the file size. Its
+    ``len()`` is known up front, so it goes out with a Content-Length.
+    Iterate it for ``requests`` or use ``aiter_chunks()`` for httpx; each
+    iteration re-reads the file, so a retry can reuse the same body.
+    """
+
+    def __init__(self, file_path: str, fields: dict[str, Any]) -> None:
+        self._path = file_path
+        self._size = os.path.getsize(file_path)
+        self._head = b'{"file": "'
+        rest = json.dumps(fields, ensure_ascii=False).encode("utf-8")
+        self._tail = b'", ' + rest[1:] if fields else b'"}'
+
+    def __len__(self) -> int:
+        return len(self._head) + 4 * ((self._size + 2) // 3) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        with open(self._path, "rb") as f:
+            while chunk := f.read(_B64_READ_BYTES):
+                yield base64.b64encode(chunk)
+        yield self._tail
+
+    async def aiter_chunks(self) -> AsyncIterator[bytes]:
+        yield self._head
+        f = await asyncio.to_thread(open, self._path, "rb")
+        try:
+            while chunk := await asyncio.to_thread(f.read, _B64_READ_BYTES):
+                yield base64.b64encode(chunk)
+        finally:
+            f.close()
+        yield self._tail
+
+
 class BaiduPaddleOcrClient:
     def __init__(
         self,
@@ -29,62 +125,217 @@ class BaiduPaddleOcrClient:
         token: str,
         api_url: str = "",
         job_url: str = "",
-        timeout_s: float = 60.0,
+        model: str = "PaddleOCR-VL-1.5",
+        http: Optional[HttpPool] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        retry: Optional[RetryPolicy] = None,
+        breaker_threshold: int = 5,
+        breaker_reset_s: float = 30.0,
     ) -> None:
         self._token = token
         self._api_url = api_url
         self._job_url = job_url
-        self._timeout_s = timeout_s
+        self._model = model
+        self._http = http or HttpPool()
+        # Shared by every API call (submits, polls, result downloads).
+        self._rate_limiter = rate_limiter or TokenBucket()
+        # Bounds in-flight OCR submits; grown/shrunk from their outcomes.
+        self._limiter = limiter
+        self._retry = retry or RetryPolicy()
+        # One breaker per API endpoint; result downloads go elsewhere and
+        # aren't guarded.
+        self._breakers = {
+            kind: CircuitBreaker(
+                kind, threshold=breaker_threshold, reset_s=breaker_reset_s
+            )
+            for kind in ("sync", "job")
+        }
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def http(self) -> HttpPool:
+        return self._http
+
+    def http_stats(self) -> dict[str, int]:
+        return self._http.stats()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "rate": self._rate_limiter.stats(),
+            "concurrency": self._limiter.stats() if self._limiter else None,
+            "breakers": {k: b.stats() for k, b in self._breakers.items()},
+        }
+
+    def circuit_wait_s(self, endpoint: str) -> float:
+        """Seconds until ``endpoint`` ("sync" or "job") should be tried again."""
+        return self._breakers[endpoint].wait_s()
+
+    def _send(
+        self, method: str, url: str, *, endpoint: str = "", **kwargs: Any
+    ) -> requests.Response:
+        breaker = self._breakers.get(endpoint)
+        trial = breaker.before_call() if breaker else False
+        label = endpoint or "result"
+        try:
+            self._rate_limiter.acquire()
+            metrics.UPSTREAM_REQUESTS.inc(endpoint=label)
+            resp = self._http.request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.UPSTREAM_ERRORS.inc(endpoint=label, reason="transport")
+            if breaker:
+                breaker.record(ok=False)
+            raise
+        except BaseException:
+            # No answer either way (e.g. the upload file failed to read).
+            if trial and breaker:
+                breaker.release()
+            raise
+        if resp.status_code >= 400:
+            metrics.UPSTREAM_ERRORS.inc(endpoint=label, reason=str(resp.status_code))
+        if breaker:
+            breaker.record(ok=resp.status_code < 500)
+        if resp.status_code == 429:
+            self._rate_limiter.pause(_retry_after_s(resp) or 1.0)
+        return resp
+
+    def _with_retry(
+        self, fn: Callable[[], T], *, retry_on: Callable[[BaseException], bool]
+    ) -> T:
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:  # noqa: BLE001
+                attempt += 1
+                if attempt >= self._retry.attempts or not retry_on(e):
+                    raise
+                time.sleep(
+                    self._retry.delay_s(attempt, getattr(e, "retry_after_s", 0.0))
+                )
+
+    @staticmethod
+    def _check(resp: requests.Response, what: str) -> None:
+        if resp.status_code != 200:
+            raise OcrHttpError(
+                f"{what} failed: HTTP {resp.status_code}: {resp.text[:1000]}",
+                status_code=resp.status_code,
+                retry_after_s=_retry_after_s(resp),
+            )
+
+    @contextmanager
+    def _in_flight(self) -> Iterator[None]:
+        if not self._limiter:
+            yield
+            return
+        token = self._limiter.acquire()
+        try:
+            yield
+        except OcrHttpError as e:
+            self._limiter.release(
+                token, ok=False, overloaded=e.status_code in _OVERLOAD_STATUSES
+            )
+            raise
+        except requests.RequestException:
+            self._limiter.release(token, ok=False, overloaded=True)
+            raise
+        except BaseException:
+            self._limiter.release(token, ok=False)
+            raise
+        else:
+            self._limiter.release(token)
 
     def submit_sync_base64(
-        self, *, file_bytes: bytes, file_type: int, options: OcrOptions
+        self, *, file_path: str, file_type: int, options: OcrOptions
     ) -> dict[str, Any]:
         if not self._api_url:
             raise RuntimeError("Missing BAIDU_PADDLE_OCR_API_URL for sync mode")
-        file_data = base64.b64encode(file_bytes).decode("ascii")
+        body = Base64JsonBody(
+            file_path, {"fileType": int(file_type), **options.to_payload()}
+        )
         headers = {
             "Authorization": f"token {self._token}",
             "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
         }
-        payload = {
-            "file": file_data,
-            "fileType": int(file_type),
-            **options.to_payload(),
-        }
-        resp = requests.post(
-            self._api_url, json=payload, headers=headers, timeout=self._timeout_s
-        )
-        if resp.status_code != 200:
-            raise RuntimeError(
-                f"Sync OCR failed: HTTP {resp.status_code}: {resp.text[:1000]}"
-            )
-        data = resp.json()
+
+        def attempt() -> requests.Response:
+            with self._in_flight():
+                metrics.BYTES.inc(len(body), direction="upload")
+                resp = self._send(
+                    "POST", self._api_url, endpoint="sync", data=body, headers=headers
+                )
+                self._check(resp, "Sync OCR")
+            return resp
+
+        # Sync OCR keeps no upstream state, so any transient failure is retried.
+        data = self._with_retry(attempt, retry_on=is_transient_error).json()
         return data["result"]
 
     def submit_job(
-        self, *, file_path: str, options: OcrOptions, model: str = "PaddleOCR-VL-1.5"
+        self, *, file_path: str, options: OcrOptions, model: Optional[str] = None
     ) -> str:
         if not self._job_url:
             raise RuntimeError("Missing BAIDU_PADDLE_OCR_JOB_URL for async mode")
         headers = {"Authorization": f"bearer {self._token}"}
         data = {
-            "model": model,
+            "model": model or self._model,
             "optionalPayload": json.dumps(options.to_payload(), ensure_ascii=False),
         }
-        with open(file_path, "rb") as f:
-            files = {"file": f}
-            resp = requests.post(
-                self._job_url,
+
+        def attempt() -> requests.Response:
+            with self._in_flight(), open(file_path, "rb") as f:
+                metrics.BYTES.inc(os.fstat(f.fileno()).st_size, direction="upload")
+                files = {"file": f}
+                resp = self._send(
+                    "POST",
+                    self._job_url,
+                    endpoint="job",
+                    headers=headers,
+                    data=data,
+                    files=files,
+                )
+                self._check(resp, "Job submit")
+            return resp
+
+        resp = self._with_retry(attempt, retry_on=_safe_to_resubmit)
+        return resp.json()["data"]["jobId"]
+
+    def get_job(
+        self,
+        *,
+        job_id: str,
+        retry: bool = True,
+        timeout_s: Optional[float] = None,
+    ) -> dict[str, Any]:
+        # Single status request; JobPoller drives this for all in-flight jobs
+        # and reschedules transient failures itself (retry=False). A status
+        # reply is tiny, so the poller passes a read timeout well below the
+        # pool's default.
+        if not self._job_url:
+            raise RuntimeError("Missing BAIDU_PADDLE_OCR_JOB_URL for async mode")
+        headers = {"Authorization": f"bearer {self._token}"}
+        options: dict[str, Any] = {}
+        if timeout_s:
+            options["timeout"] = (self._http.timeout[0], float(timeout_s))
+
+        def attempt() -> requests.Response:
+            resp = self._send(
+                "GET",
+                f"{self._job_url}/{job_id}",
+                endpoint="job",
                 headers=headers,
-                data=data,
-                files=files,
-                timeout=self._timeout_s,
+                **options,
             )
-        if resp.status_code != 200:
-            raise RuntimeError(
-                f"Job submit failed: HTTP {resp.status_code}: {resp.text[:1000]}"
-            )
-        return resp.json()["data"]["jobId"]
+            self._check(resp, "Job poll")
+            return resp
+
+        if not retry:
+            return attempt().json()["data"]
+        return self._with_retry(attempt, retry_on=is_transient_error).json()["data"]
 
     def poll_job(
         self,
@@ -94,22 +345,12 @@ class BaiduPaddleOcrClient:
         max_wait_s: float = 15 * 60.0,
         should_cancel: Optional[Callable[[], bool]] = None,
     ) -> dict[str, Any]:
-        if not self._job_url:
-            raise RuntimeError("Missing BAIDU_PADDLE_OCR_JOB_URL for async mode")
-        headers = {"Authorization": f"bearer {self._token}"}
         deadline = time.time() + max_wait_s
         last = None
         while time.time() < deadline:
             if should_cancel and should_cancel():
                 raise RuntimeError("canceled")
-            resp = requests.get(
-                f"{self._job_url}/{job_id}", headers=headers, timeout=self._timeout_s
-            )
-            if resp.status_code != 200:
-                raise RuntimeError(
-                    f"Job poll failed: HTTP {resp.status_code}: {resp.text[:1000]}"
-                )
-            last = resp.json()["data"]
+            last = self.get_job(job_id=job_id)
             state = last.get("state")
             if state == "done":
                 return last
@@ -122,18 +363,41 @@ class BaiduPaddleOcrClient:
             time.sleep(poll_interval_s)
         raise RuntimeError(f"Job timeout after {max_wait_s}s; last={last}")
 
-    def download_jsonl(self, *, jsonl_url: str) -> str:
-        resp = requests.get(jsonl_url, timeout=self._timeout_s)
-        resp.raise_for_status()
-        return resp.text
+    def stream_jsonl(self, *, jsonl_url: str) -> Iterator[str]:
+        """Yield the non-empty lines of a JSONL result as they arrive.
+
+        A transient failure, even mid-stream, re-requests the result and
+        skips the lines already yielded.
+        """
+        yielded = 0
+        attempt = 0
+        while True:
+            try:
+                with self._send("GET", jsonl_url, stream=True) as resp:
+                    self._check(resp, "Result download")
+                    seen = 0
+                    for raw in resp.iter_lines(chunk_size=_CHUNK_BYTES):
+                        metrics.BYTES.inc(len(raw) + 1, direction="download")
+                        if not raw.strip():
+                            continue
+                        seen += 1
+                        if seen <= yielded:
+                            continue
+                        yielded += 1
+                        yield raw.decode("utf-8")
+                return
+            except Exception as e:  # noqa: BLE001
+                attempt += 1
+                if attempt >= self._retry.attempts or not is_transient_error(e):
+                    raise
+                time.sleep(
+                    self._retry.delay_s(attempt, getattr(e, "retry_after_s", 0.0))
+                )
+
+
+def parse_jsonl_line(line: str) -> dict[str, Any]:
+    return json.loads(line)["result"]
 
 
 def parse_jsonl_results(jsonl_text: str) -> list[dict[str, Any]]:
-    pages: list[dict[str, Any]] = []
-    for line in jsonl_text.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        obj = json.loads(line)
-        pages.append(obj["result"])
-    return pages
+    return [parse_jsonl_line(line) for line in jsonl_text.splitlines() if line.strip()]
@@ -0,0 +1,60 @@
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+from .utils import ensure_dir
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.errors import PyPdfError
+except ImportError:  # optional dependency: pip install "PaddleOCR-VL-BaiduAIStudio[pdf]"
+    PdfReader = None  # type: ignore[assignment, misc]
+    PdfWriter = None  # type: ignore[assignment, misc]
+    PyPdfError = OSError  # type: ignore[assignment, misc]
+
+
+@dataclass(frozen=True)
+class PdfShard:
+    path: Path
+    first_page: int
+    page_count: int
+
+
+def sharding_available() -> bool:
+    return PdfReader is not None
+
+
+def split_pdf(src: Path, out_dir: Path, pages_per_shard: int) -> list[PdfShard]:
+    """Split ``src`` into consecutive page ranges of ``pages_per_shard``.
+
+    Returns an empty list when pypdf is missing, the document is short
+    enough to be sent as a single request, or pypdf can't split it
+    (malformed, truncated, encrypted): upstream may still read the file.
+    """
+    if PdfReader is None or pages_per_shard <= 0:
+        return []
+    try:
+        return _split(src, out_dir, pages_per_shard)
+    except (PyPdfError, OSError, ValueError):
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return []
+
+
+def _split(src: Path, out_dir: Path, pages_per_shard: int) -> list[PdfShard]:
+    reader = PdfReader(str(src))
+    total = len(reader.pages)
+    if total <= pages_per_shard:
+        return []
+
+    ensure_dir(out_dir)
+    shards: list[PdfShard] = []
+    for k, first in enumerate(range(0, total, pages_per_shard)):
+        writer = PdfWriter()
+        last = min(total, first + pages_per_shard)
+        for idx in range(first, last):
+            writer.add_page(reader.pages[idx])
+        path = out_dir / f"part_{k}.pdf"
+        with open(path, "wb") as f:
+            writer.write(f)
+        shards.append(PdfShard(path=path, first_page=first, page_count=last - first))
+    return shards
@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import queue
+import threading
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+class Stage(Generic[T]):
+    """One pipeline stage: a bounded queue drained by its own threads.
+
+    ``put()`` blocks while ``capacity`` items are already waiting, which
+    pushes back on the stage feeding it; callers that must never block
+    (the job poller thread) pass ``block=False`` and the item waits in an
+    unbounded overflow instead. ``handler`` must not raise; the task queue
+    wraps it so failures settle the item.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[T], None],
+        *,
+        workers: int,
+        capacity: int,
+    ) -> None:
+        self.name = name
+        self._handler = handler
+        self._workers = max(1, int(workers))
+        self._capacity = max(1, int(capacity))
+        self._q: queue.Queue[T] = queue.Queue(maxsize=self._capacity)
+        # Items put with block=False while the queue was full; drained first.
+        self._overflow: collections.deque[T] = collections.deque()
+        self._active = 0
+        self._processed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{idx}", daemon=True)
+            for idx in range(self._workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def put(self, item: T, *, block: bool = True) -> None:
+        if block:
+            self._q.put(item)
+            return
+        with self._lock:
+            if not self._overflow:
+                try:
+                    self._q.put_nowait(item)
+                    return
+                except queue.Full:
+                    pass
+            self._overflow.append(item)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                item = self._overflow.popleft() if self._overflow else None
+            if item is None:
+                try:
+                    item = self._q.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+            with self._lock:
+                self._active += 1
+            try:
+                self._handler(item)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._processed += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "queued": self._q.qsize() + len(self._overflow),
+                "active": self._active,
+                "workers": self._workers,
+                "capacity": self._capacity,
+                "processed": self._processed,
+            }
+
+
+class AsyncStage:
+    """asyncio counterpart of ``Stage``: at most ``workers`` coroutines run
+    at once and ``capacity`` more may wait; ``submit()`` waits beyond that."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        workers: int,
+        capacity: int,
+        spawn: Callable[[Awaitable[Any]], None],
+    ) -> None:
+        self.name = name
+        self._workers = max(1, int(workers))
+        self._capacity = max(1, int(capacity))
+        self._spawn = spawn
+        self._run_slots = asyncio.Semaphore(self._workers)
+        self._room = asyncio.Semaphore(self._workers + self._capacity)
+        self._queued = 0
+        self._active = 0
+        self._processed = 0
+
+    async def submit(self, fn: Callable[[], Awaitable[None]]) -> None:
+        await self._room.acquire()
+        self._queued += 1
+        self._spawn(self._run(fn))
+
+    async def _run(self, fn: Callable[[], Awaitable[None]]) -> None:
+        try:
+            async with self._run_slots:
+                self._queued -= 1
+                self._active += 1
+                try:
+                    await fn()
+                finally:
+                    self._active -= 1
+                    self._processed += 1
+        finally:
+            self._room.release()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": self._queued,
+            "active": self._active,
+            "workers": self._workers,
+            "capacity": self._capacity,
+            "processed": self._processed,
+        }
@@ -0,0 +1,206 @@
+import json
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from .ocr_client import OcrOptions
+from .utils import dir_size, ensure_dir, link_or_copy, link_or_copy_tree, sha256_hex
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    md_files: list[str]
+    assets: list[str]
+
+
+@dataclass
+class _Entry:
+    size: int
+    created_at: float
+    last_access: float
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of finished OCR outputs.
+
+    Layout: ``{root}/{key[:2]}/{key}/`` holding ``meta.json``, the
+    materialized item tree under ``item/`` and the raw upstream response,
+    ``raw.jsonl`` (async mode) or ``result.json`` (sync mode). Entries are
+    evicted least-recently-used once the total size exceeds ``max_bytes``,
+    and dropped after ``ttl_s``.
+    """
+
+    def __init__(self, *, root: str | Path, max_bytes: int, ttl_s: float) -> None:
+        self._root = ensure_dir(root)
+        self._max_bytes = int(max_bytes)
+        self._ttl_s = float(ttl_s)
+        self._lock = threading.Lock()
+        self._entries: dict[str, _Entry] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    @staticmethod
+    def make_key(
+        *,
+        file_sha256: str,
+        options: OcrOptions,
+        model: str,
+        mode: str,
+        variant: str = "",
+    ) -> str:
+        # mode (sync/async) is part of the key because the two APIs produce
+        # different output layouts (flat vs page_{idx}). variant names any
+        # local pre-processing of the upload.
+        fields = {
+            "file": file_sha256,
+            "options": options.to_payload(),
+            "model": model,
+            "mode": mode,
+        }
+        if variant:
+            fields["variant"] = variant
+        payload = json.dumps(fields, sort_keys=True)
+        return sha256_hex(payload.encode("utf-8"))
+
+    def _entry_dir(self, key: str) -> Path:
+        return self._root / key[:2] / key
+
+    def _load_index(self) -> None:
+        for meta_path in self._root.glob("*/*/meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                st = meta_path.stat()
+            except (OSError, ValueError):
+                continue
+            key = meta_path.parent.name
+            size = int(meta.get("size", 0))
+            self._entries[key] = _Entry(
+                size=size,
+                created_at=float(meta.get("created_at", st.st_mtime)),
+                last_access=st.st_mtime,
+            )
+            self._total_bytes += size
+
+    def get(
+        self, key: str, *, item_dir: Path, raw_path: Path
+    ) -> Optional[CachedResult]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._ttl_s > 0 and now - entry.created_at > self._ttl_s:
+                self._drop_locked(key)
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            entry.last_access = now
+
+        entry_dir = self._entry_dir(key)
+        try:
+            meta = json.loads((entry_dir / "meta.json").read_text(encoding="utf-8"))
+            link_or_copy_tree(entry_dir / "item", item_dir)
+            if meta.get("has_raw"):
+                link_or_copy(entry_dir / "raw.jsonl", raw_path)
+            (entry_dir / "meta.json").touch()
+        except (OSError, ValueError):
+            with self._lock:
+                self._drop_locked(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return CachedResult(
+            md_files=[str(item_dir / p) for p in meta.get("md_files", [])],
+            assets=[str(item_dir / p) for p in meta.get("assets", [])],
+        )
+
+    def put(
+        self,
+        key: str,
+        *,
+        item_dir: Path,
+        md_files: list[str],
+        assets: list[str],
+        raw_path: Optional[Path] = None,
+        result: Optional[dict[str, Any]] = None,
+    ) -> None:
+        if self._max_bytes <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+
+        tmp_dir = self._root / f".tmp-{uuid.uuid4().hex}"
+        try:
+            link_or_copy_tree(item_dir, tmp_dir / "item")
+            has_raw = bool(raw_path and raw_path.exists())
+            if has_raw:
+                link_or_copy(raw_path, tmp_dir / "raw.jsonl")  # type: ignore[arg-type]
+            if result is not None:
+                (tmp_dir / "result.json").write_text(
+                    json.dumps(result, ensure_ascii=False), encoding="utf-8"
+                )
+            size = dir_size(tmp_dir)
+            meta: dict[str, Any] = {
+                "created_at": time.time(),
+                "size": size,
+                "has_raw": has_raw,
+                "md_files": [str(Path(p).relative_to(item_dir)) for p in md_files],
+                "assets": [str(Path(p).relative_to(item_dir)) for p in assets],
+            }
+            (tmp_dir / "meta.json").write_text(
+                json.dumps(meta, ensure_ascii=False), encoding="utf-8"
+            )
+            entry_dir = self._entry_dir(key)
+            ensure_dir(entry_dir.parent)
+            tmp_dir.rename(entry_dir)
+        except (OSError, ValueError):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        with self._lock:
+            self._entries[key] = _Entry(
+                size=size, created_at=meta["created_at"], last_access=time.time()
+            )
+            self._total_bytes += size
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        now = time.time()
+        if self._ttl_s > 0:
+            for key in [
+                k for k, e in self._entries.items() if now - e.created_at > self._ttl_s
+            ]:
+                self._drop_locked(key)
+        if self._total_bytes <= self._max_bytes:
+            return
+        for key, _ in sorted(self._entries.items(), key=lambda kv: kv[1].last_access):
+            if self._total_bytes <= self._max_bytes:
+                break
+            self._drop_locked(key)
+
+    def _drop_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total_bytes -= entry.size
+            self.evictions += 1
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "maxBytes": self._max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,99 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 4
+    base_s: float = 0.5
+    max_s: float = 30.0
+
+    def delay_s(self, attempt: int, retry_after_s: float = 0.0) -> float:
+        # Exponential backoff with "equal jitter": half fixed, half random.
+        cap = min(self.max_s, self.base_s * (2 ** max(0, attempt - 1)))
+        return max(retry_after_s, cap / 2 + random.uniform(0, cap / 2))
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, endpoint: str, retry_after_s: float) -> None:
+        super().__init__(f"Upstream unavailable (circuit open): {endpoint}")
+        self.endpoint = endpoint
+        self.retry_after_s = retry_after_s
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint after ``threshold`` consecutive failures.
+
+    Open for ``reset_s``, then half-open: a single trial request decides
+    whether to close again or re-open.
+    """
+
+    def __init__(self, endpoint: str, *, threshold: int = 5, reset_s: float = 30.0) -> None:
+        self.endpoint = endpoint
+        self._threshold = max(1, int(threshold))
+        self._reset_s = max(0.0, float(reset_s))
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial = False
+        self._opened = 0
+
+    def _state(self, now: float) -> str:
+        # Caller holds self._lock.
+        if self._failures < self._threshold:
+            return "closed"
+        return "open" if now < self._open_until else "half_open"
+
+    def before_call(self) -> bool:
+        """Raise ``CircuitOpen`` unless a call may go ahead; returns True if
+        it is the half-open trial, which must end in ``record()`` or
+        ``release()``."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            raise CircuitOpen(self.endpoint, max(0.0, self._open_until - now))
+
+    def release(self) -> None:
+        """End a trial call that got no answer (canceled, local error)
+        without counting it, so the next call can try instead."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial = False
+            if ok:
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._failures >= self._threshold:
+                if self._open_until <= time.monotonic():
+                    self._opened += 1
+                self._open_until = time.monotonic() + self._reset_s
+
+    def wait_s(self) -> float:
+        """How long callers should hold off before dispatching new work."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == "open":
+                return self._open_until - now
+            if state == "half_open" and self._trial:
+                return 0.5
+            return 0.0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state(time.monotonic()),
+                "failures": self._failures,
+                "opened": self._opened,
+            }
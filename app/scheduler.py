@@ -0,0 +1,127 @@
+import heapq
+import itertools
+import queue
+import threading
+from collections import deque
+from typing import Any, Generic, Optional, TypeVar
+
+
+W = TypeVar("W")
+
+
+class FairScheduler(Generic[W]):
+    """Work queue that is fair across tasks instead of FIFO.
+
+    Higher ``priority`` is served first. Tasks of equal priority take
+    turns (round robin), so a small upload isn't stuck behind a 5,000-file
+    folder; within a task the lowest ``cost`` goes first (shortest job
+    first). Thread-safe; ``get()`` blocks like ``queue.Queue.get``.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # group -> heap of (cost, seq, work)
+        self._heaps: dict[str, list[tuple[Any, int, W]]] = {}
+        self._group_priority: dict[str, int] = {}
+        # priority -> groups with queued work, in turn order
+        self._turns: dict[int, deque[str]] = {}
+        self._size = 0
+
+    def put(self, work: W, *, group: str, priority: int = 0, cost: Any = 0) -> None:
+        with self._cond:
+            self._push(group, priority, cost, work)
+            self._size += 1
+            self._cond.notify()
+
+    def _push(self, group: str, priority: int, cost: Any, work: W) -> None:
+        # Caller holds self._cond.
+        heap = self._heaps.get(group)
+        if heap is None:
+            heap = self._heaps[group] = []
+            self._group_priority[group] = priority
+            self._turns.setdefault(priority, deque()).append(group)
+        heapq.heappush(heap, (cost, next(self._seq), work))
+
+    def promote(self, work: W, *, from_group: str, group: str, priority: int) -> None:
+        """Move ``work``, still queued in ``from_group``, to ``group`` if it
+        would be served sooner there: a higher priority, or as many turns
+        but fewer cheaper items ahead of it. A no-op once it was taken."""
+        with self._cond:
+            heap = self._heaps.get(from_group)
+            idx = next((i for i, e in enumerate(heap or ()) if e[2] is work), -1)
+            if heap is None or idx < 0 or group == from_group:
+                return
+            cost = heap[idx][0]
+            target = self._heaps.get(group, [])
+            src_priority = self._group_priority[from_group]
+            dst_priority = self._group_priority.get(group, priority)
+            if dst_priority < src_priority:
+                return
+            if dst_priority == src_priority and sum(
+                e[0] < cost for e in target
+            ) >= sum(e[0] < cost for e in heap):
+                return
+            heap[idx] = heap[-1]
+            heap.pop()
+            heapq.heapify(heap)
+            if not heap:
+                del self._heaps[from_group]
+                del self._group_priority[from_group]
+                self._turns[src_priority].remove(from_group)
+                if not self._turns[src_priority]:
+                    del self._turns[src_priority]
+            self._push(group, dst_priority, cost, work)
+
+    def get(self, timeout: Optional[float] = None) -> W:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size > 0, timeout=timeout):
+                raise queue.Empty
+            return self._pop()
+
+    def get_nowait(self) -> Optional[W]:
+        with self._cond:
+            return self._pop() if self._size else None
+
+    def _pop(self) -> W:
+        # Caller holds self._cond and has checked self._size.
+        priority = max(p for p, groups in self._turns.items() if groups)
+        turns = self._turns[priority]
+        group = turns.popleft()
+        heap = self._heaps[group]
+        _, _, work = heapq.heappop(heap)
+        self._size -= 1
+        if heap:
+            turns.append(group)
+        else:
+            del self._heaps[group]
+            del self._group_priority[group]
+            if not turns:
+                del self._turns[priority]
+        return work
+
+    def reprioritize(self, group: str, priority: int) -> None:
+        with self._cond:
+            old = self._group_priority.get(group)
+            if old is None or old == priority:
+                return
+            self._turns[old].remove(group)
+            if not self._turns[old]:
+                del self._turns[old]
+            self._group_priority[group] = priority
+            self._turns.setdefault(priority, deque()).append(group)
+
+    def qsize(self) -> int:
+        with self._cond:
+            return self._size
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": self._size,
+                "groups": len(self._heaps),
+                "byPriority": {
+                    str(p): sum(len(self._heaps[g]) for g in groups)
+                    for p, groups in sorted(self._turns.items(), reverse=True)
+                },
+            }
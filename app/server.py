@@ -1,20 +1,55 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import os
+import shutil
+from contextlib import aclosing, asynccontextmanager
 from pathlib import Path
-from typing import Any, Optional
-
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 
+from . import metrics
+from .async_task_queue import AsyncTaskQueue
 from .config import settings
-from .ocr_client import BaiduPaddleOcrClient, OcrOptions
-from .task_queue import TaskQueue
+from .engine import make_engine, make_result_cache, server_role
+from .janitor import Janitor
+from .ocr_client import OcrOptions
+from .task_queue import TASK_ID_RE, Task, TaskItem
+from .task_store import TaskStore
+from .uploads import FormField, SpooledFile, UploadRejected, iter_multipart
+from .zip_export import ZIP_KINDS, cache_path_for, drop_stale, iter_zip, select_files
 from .utils import ensure_dir, safe_path_segment, split_relpath
+from .worker import spawn_workers, stop_workers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # The asyncio engine runs on uvicorn's event loop.
+    if isinstance(queue, AsyncTaskQueue):
+        await queue.start()
+    if janitor:
+        janitor.start()
+    workers = spawn_workers(settings.worker_processes)
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(stop_workers, workers)
+        if janitor:
+            janitor.stop()
+        if isinstance(queue, AsyncTaskQueue):
+            await queue.stop()
 
 
-app = FastAPI(title="PaddleOCR-VL Local Web UI")
+app = FastAPI(title="PaddleOCR-VL Local Web UI", lifespan=lifespan)
 
 
 def _options_from_form(
@@ -29,19 +64,64 @@ def _options_from_form(
     )
 
 
-client = BaiduPaddleOcrClient(
-    token=settings.baidu_token,
-    api_url=settings.baidu_api_url,
-    job_url=settings.baidu_job_url,
-)
-queue = TaskQueue(
-    client=client,
-    output_root=settings.output_root,
-    concurrency=settings.default_concurrency,
-)
+result_cache = make_result_cache()
+task_store = TaskStore(settings.task_store_path) if settings.task_store_enabled else None
+# With worker processes this process only accepts uploads and serves status.
+client, queue = make_engine(cache=result_cache, store=task_store, role=server_role())
+
+
+def _task_json(task: Task) -> dict[str, Any]:
+    return {
+        "taskId": task.task_id,
+        "status": task.status,
+        "priority": task.priority,
+        "total": task.total,
+        "queued": task.queued,
+        "running": task.running,
+        "done": task.done,
+        "failed": task.failed,
+        "canceled": task.canceled,
+        "message": task.message,
+    }
+
+
+def _item_summary(it: TaskItem) -> dict[str, Any]:
+    # Status-only view of an item; path lists are fetched separately.
+    return {
+        "itemId": it.item_id,
+        "filename": it.filename,
+        "relpath": it.relpath,
+        "size": it.size,
+        "uploadBytes": it.upload_bytes,
+        "status": it.status,
+        "error": it.error,
+        "mdCount": len(it.md_files),
+        "assetCount": len(it.assets),
+        "version": it.version,
+        "timings": {k: round(v, 3) for k, v in it.timings.items()},
+    }
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 STATIC_DIR = Path(__file__).resolve().parent / "static"
+ZIP_CACHE_DIR = Path(settings.output_root) / "_zips"
+janitor = (
+    Janitor(
+        queue=queue,
+        output_root=settings.output_root,
+        zip_dir=ZIP_CACHE_DIR,
+        interval_s=settings.janitor_interval_s,
+        retention_s=settings.output_retention_s,
+        max_tasks=settings.output_max_tasks,
+        max_bytes=settings.output_max_bytes,
+        compact_inputs=settings.compact_inputs,
+    )
+    if settings.janitor_interval_s > 0
+    else None
+)
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 
@@ -51,109 +131,200 @@ def index() -> str:
     return index_file.read_text(encoding="utf-8")
 
 
+@app.get("/api/stats")
+def get_stats() -> dict[str, Any]:
+    return {
+        "engine": settings.engine,
+        "http": client.http_stats(),
+        "cache": result_cache.stats() if result_cache else None,
+        "jobs": {"pending": queue.pending_jobs()},
+        "queue": queue.queue_stats(),
+        "ocr": client.stats(),
+        "janitor": janitor.stats() if janitor else None,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> str:
+    """Prometheus text format: stage/item latency histograms, upstream
+    request, error and byte counters, plus queue and limiter gauges."""
+    q = queue.queue_stats()
+    metrics.QUEUE_DEPTH.set(q["depth"], stage="submit")
+    metrics.ACTIVE_WORKERS.set(q["active"], stage="submit")
+    for name, st in q["stages"].items():
+        metrics.QUEUE_DEPTH.set(st["queued"], stage=name)
+        metrics.ACTIVE_WORKERS.set(st["active"], stage=name)
+    metrics.PENDING_JOBS.set(q["pendingJobs"])
+    ocr = client.stats()
+    if ocr["concurrency"]:
+        metrics.CONCURRENCY_LIMIT.set(ocr["concurrency"]["limit"])
+    for endpoint, b in ocr["breakers"].items():
+        metrics.BREAKER_OPEN.set(int(b["state"] == "open"), endpoint=endpoint)
+    if janitor:
+        metrics.OUTPUT_BYTES.set(janitor.stats()["outputBytes"])
+    return metrics.REGISTRY.render()
+
+
+_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+# Multipart boundaries/headers on top of the file bytes themselves.
+_MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+def _check_upload(name_raw: str, content_type: str) -> Optional[str]:
+    # Server-side format validation (frontend also filters).
+    name_lower = name_raw.lower()
+    ct = (content_type or "").lower()
+    is_pdf = ct == "application/pdf" or name_lower.endswith(".pdf")
+    is_img = ct.startswith("image/") or name_lower.endswith(_IMAGE_EXTS)
+    if not (is_pdf or is_img):
+        return f"不支持的文件格式：{name_raw}（仅支持图片与 PDF）"
+    return None
+
+
+# Form fields of an upload; files are only enqueued while the body is
+# still streaming when all of them precede the first file.
+_UPLOAD_FIELDS = (
+    "relpaths",
+    "force_async",
+    "priority",
+    "use_doc_orientation_classify",
+    "use_doc_unwarping",
+    "use_chart_recognition",
+)
+
+
+def _form_bool(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "on", "yes")
+
+
+_PRIORITY_MIN, _PRIORITY_MAX = -10, 10
+
+
+def _form_priority(value: Optional[str]) -> int:
+    try:
+        priority = int((value or "0").strip() or "0")
+    except ValueError:
+        raise UploadRejected(400, "priority 必须是整数")
+    if not _PRIORITY_MIN <= priority <= _PRIORITY_MAX:
+        raise UploadRejected(
+            400, f"priority 取值范围为 {_PRIORITY_MIN} 到 {_PRIORITY_MAX}"
+        )
+    return priority
+
+
+def _unique_dest(
+    inputs_dir: Path, display_parts: list[str], original_name: str
+) -> tuple[Path, str]:
+    filename = safe_path_segment(original_name)
+    display_relpath = "/".join(display_parts) if display_parts else original_name
+
+    # Write uploaded file directly into task inputs/{relpath} (sanitized for filesystem).
+    rel_safe_parts = [safe_path_segment(p) for p in display_parts]
+    if not rel_safe_parts:
+        rel_safe_parts = [filename]
+    dest_path = inputs_dir.joinpath(*rel_safe_parts)
+    ensure_dir(dest_path.parent)
+    if dest_path.exists():
+        stem = dest_path.stem
+        suffix = dest_path.suffix
+        k = 1
+        while True:
+            cand = dest_path.with_name(f"{stem}_{k}{suffix}")
+            if not cand.exists():
+                dest_path = cand
+                # Keep UI display name aligned with the stored file.
+                last = display_parts[-1] if display_parts else original_name
+                if "." in last:
+                    base, ext = last.rsplit(".", 1)
+                    last2 = f"{base}_{k}.{ext}"
+                else:
+                    last2 = f"{last}_{k}"
+                if display_parts:
+                    display_parts[-1] = last2
+                    display_relpath = "/".join(display_parts)
+                else:
+                    display_relpath = last2
+                break
+            k += 1
+    return dest_path, display_relpath
+
+
 @app.post("/api/tasks")
-async def create_task(
-    files: list[UploadFile] = File(...),
-    relpaths: Optional[str] = Form(None),
-    force_async: bool = Form(False),
-    use_doc_orientation_classify: bool = Form(False),
-    use_doc_unwarping: bool = Form(False),
-    use_chart_recognition: bool = Form(False),
-) -> dict[str, Any]:
+async def create_task(request: Request) -> dict[str, Any]:
+    """Create a task from a multipart upload (``files`` plus form options).
+
+    The body is parsed as it streams in and each file is spooled to disk.
+    When every form field (``relpaths``, ``force_async``, ``priority``, OCR
+    options) comes before the files, as the web UI sends them, each file is
+    enqueued as soon as it has been received, overlapping OCR with the rest
+    of the upload. Otherwise the files wait on disk and are enqueued once
+    the body is complete, with whatever fields arrived in any order.
+    """
     try:
         settings.validate()
     except Exception as e:  # noqa: BLE001
         raise HTTPException(status_code=500, detail=str(e))
 
-    # relpaths is a JSON array of strings matching `files` order.
-    rel_list: list[str] = []
-    if relpaths:
-        import json
+    content_length = request.headers.get("content-length", "")
+    if (
+        content_length.isdigit()
+        and int(content_length) > settings.max_total_bytes + _MULTIPART_OVERHEAD_BYTES
+    ):
+        raise HTTPException(status_code=413, detail="上传总大小超限")
 
-        try:
-            rel_list = json.loads(relpaths)
-        except Exception:
-            raise HTTPException(status_code=400, detail="relpaths 必须是 JSON 数组")
-    if rel_list and len(rel_list) != len(files):
-        raise HTTPException(status_code=400, detail="relpaths 数量必须与 files 一致")
-
-    opt = _options_from_form(
-        use_doc_orientation_classify, use_doc_unwarping, use_chart_recognition
-    )
-    task = queue.create_task()
+    task = queue.create_task(uploading=True)
     task_dir = ensure_dir(Path(settings.output_root) / task.task_id)
     inputs_dir = ensure_dir(task_dir / "inputs")
+    spool_dir = task_dir / ".upload"
 
-    total_bytes = 0
-    created_items = []
-    for idx, f in enumerate(files):
-        # Server-side format validation (frontend also filters).
-        name_raw = f.filename or "file"
-        name_lower = name_raw.lower()
-        ct = (f.content_type or "").lower()
-        is_pdf = ct == "application/pdf" or name_lower.endswith(".pdf")
-        is_img = ct.startswith("image/") or name_lower.endswith(
-            (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+    fields: dict[str, str] = {}
+    # relpaths is a JSON array of strings matching `files` order.
+    rel_list: Optional[list[str]] = None
+    force_async = False
+    opt = _options_from_form(False, False, False)
+    pending: list[SpooledFile] = []
+    created_items: list[dict[str, Any]] = []
+    n_files = 0
+
+    def apply_fields() -> None:
+        nonlocal rel_list, force_async, opt
+        rel_list = []
+        if fields.get("relpaths"):
+            try:
+                rel_list = json.loads(fields["relpaths"])
+            except Exception:
+                raise UploadRejected(400, "relpaths 必须是 JSON 数组")
+            if not isinstance(rel_list, list):
+                raise UploadRejected(400, "relpaths 必须是 JSON 数组")
+        force_async = _form_bool(fields.get("force_async"))
+        priority = _form_priority(fields.get("priority"))
+        if priority:
+            queue.set_priority(task.task_id, priority)
+        opt = _options_from_form(
+            _form_bool(fields.get("use_doc_orientation_classify")),
+            _form_bool(fields.get("use_doc_unwarping")),
+            _form_bool(fields.get("use_chart_recognition")),
         )
-        if not (is_pdf or is_img):
-            raise HTTPException(
-                status_code=400,
-                detail=f"不支持的文件格式：{name_raw}（仅支持图片与 PDF）",
-            )
-
-        data = await f.read()
-        size = len(data)
-        total_bytes += size
-        if size > settings.max_file_bytes:
-            raise HTTPException(status_code=413, detail=f"单个文件过大：{f.filename}")
-        if total_bytes > settings.max_total_bytes:
-            raise HTTPException(status_code=413, detail="上传总大小超限")
-
-        original_name = f.filename or "file"
-        filename = safe_path_segment(original_name)
 
+    def enqueue(idx: int, sf: SpooledFile) -> None:
+        assert rel_list is not None
+        if rel_list and idx >= len(rel_list):
+            raise UploadRejected(400, "relpaths 数量必须与 files 一致")
+        original_name = sf.filename or "file"
         rp = rel_list[idx] if idx < len(rel_list) else original_name
-        display_parts = split_relpath(rp)
-        display_relpath = "/".join(display_parts) if display_parts else original_name
-
-        # Write uploaded file directly into task inputs/{relpath} (sanitized for filesystem).
-        rel_safe_parts = [safe_path_segment(p) for p in display_parts]
-        if not rel_safe_parts:
-            rel_safe_parts = [filename]
-        dest_path = inputs_dir.joinpath(*rel_safe_parts)
-        ensure_dir(dest_path.parent)
-        if dest_path.exists():
-            stem = dest_path.stem
-            suffix = dest_path.suffix
-            k = 1
-            while True:
-                cand = dest_path.with_name(f"{stem}_{k}{suffix}")
-                if not cand.exists():
-                    dest_path = cand
-                    # Keep UI display name aligned with the stored file.
-                    last = display_parts[-1] if display_parts else original_name
-                    if "." in last:
-                        base, ext = last.rsplit(".", 1)
-                        last2 = f"{base}_{k}.{ext}"
-                    else:
-                        last2 = f"{last}_{k}"
-                    if display_parts:
-                        display_parts[-1] = last2
-                        display_relpath = "/".join(display_parts)
-                    else:
-                        display_relpath = last2
-                    break
-                k += 1
-        dest_path.write_bytes(data)
-
+        dest_path, display_relpath = _unique_dest(
+            inputs_dir, split_relpath(str(rp)), original_name
+        )
+        os.replace(sf.path, dest_path)
         item = queue.enqueue_file(
             task_id=task.task_id,
             local_path=str(dest_path),
-            filename=filename,
+            filename=safe_path_segment(original_name),
             relpath=display_relpath,
-            size=size,
+            size=sf.size,
             force_async=force_async,
             options=opt,
+            sha256=sf.sha256,
         )
         created_items.append(
             {
@@ -164,6 +335,53 @@ async def create_task(
             }
         )
 
+    parts = iter_multipart(
+        request,
+        spool_dir=spool_dir,
+        max_file_bytes=settings.max_file_bytes,
+        max_total_bytes=settings.max_total_bytes,
+        check_file=_check_upload,
+    )
+    try:
+        async with aclosing(parts):
+            async for part in parts:
+                if isinstance(part, FormField):
+                    # Once streaming, every known field has been applied
+                    # already; a repeat or unknown field changes nothing.
+                    if rel_list is None:
+                        fields[part.name] = part.value
+                    continue
+                if part.name != "files":
+                    part.path.unlink(missing_ok=True)
+                    continue
+                if n_files == 0 and all(f in fields for f in _UPLOAD_FIELDS):
+                    # All options arrived first: enqueue each file as it lands.
+                    await asyncio.to_thread(apply_fields)
+                if rel_list is not None:
+                    await asyncio.to_thread(enqueue, n_files, part)
+                else:
+                    pending.append(part)
+                n_files += 1
+
+        if n_files == 0:
+            raise UploadRejected(400, "未上传文件")
+        if rel_list is None:
+
+            def enqueue_pending() -> None:
+                apply_fields()
+                for idx, sf in enumerate(pending):
+                    enqueue(idx, sf)
+
+            await asyncio.to_thread(enqueue_pending)
+        if rel_list and len(rel_list) != n_files:
+            raise UploadRejected(400, "relpaths 数量必须与 files 一致")
+    except UploadRejected as e:
+        queue.cancel_task(task.task_id)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        queue.finish_upload(task.task_id)
+
     return {"taskId": task.task_id, "items": created_items}
 
 
@@ -172,15 +390,87 @@ def get_task(task_id: str) -> dict[str, Any]:
     task = queue.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
-    return {
-        "taskId": task.task_id,
-        "status": task.status,
-        "total": task.total,
-        "done": task.done,
-        "failed": task.failed,
-        "canceled": getattr(task, "canceled", 0),
-        "message": task.message,
-    }
+    return _task_json(task)
+
+
+_SSE_MAX_PENDING = 1000
+
+
+@app.get("/api/tasks/{task_id}/events")
+async def task_events(task_id: str, request: Request) -> StreamingResponse:
+    """Server-Sent Events: one ``snapshot``, then ``item``/``task`` deltas."""
+    task = queue.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    loop = asyncio.get_running_loop()
+    # Latest summary per changed item, drained by stream(). A client that
+    # falls more than _SSE_MAX_PENDING items behind gets a fresh snapshot
+    # instead, so memory per connection stays bounded.
+    pending: dict[str, dict[str, Any]] = {}
+    latest: dict[str, Any] = {"task": None, "version": 0, "resync": False}
+    wake = asyncio.Event()
+
+    def push(version: int, t: dict[str, Any], it: Optional[dict[str, Any]]) -> None:
+        if version > latest["version"]:
+            latest["task"], latest["version"] = t, version
+        if it and not latest["resync"]:
+            pending[it["itemId"]] = it
+            if len(pending) > _SSE_MAX_PENDING:
+                pending.clear()
+                latest["resync"] = True
+        wake.set()
+
+    def on_change(t: Task, it: Optional[TaskItem]) -> None:
+        # Serialize on the worker thread (under the task lock) for a
+        # consistent view; hand the dicts to the event loop.
+        payload = (t.version, _task_json(t), _item_summary(it) if it else None)
+        loop.call_soon_threadsafe(push, *payload)
+
+    def snapshot() -> tuple[int, dict[str, Any]]:
+        with task.lock:
+            return task.version, {
+                "task": _task_json(task),
+                "items": [_item_summary(it) for it in task.items],
+            }
+
+    # Subscribe before taking the snapshot so no change falls in between.
+    unsubscribe = queue.subscribe(task_id, on_change)
+
+    async def stream() -> AsyncIterator[str]:
+        try:
+            since = -1
+            while not await request.is_disconnected():
+                if since < 0 or latest["resync"]:
+                    latest["resync"] = False
+                    pending.clear()
+                    since, snap = await asyncio.to_thread(snapshot)
+                    yield _sse("snapshot", snap)
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                wake.clear()
+                if latest["resync"]:
+                    continue
+                # Changes already covered by the last snapshot are skipped.
+                items = [it for it in pending.values() if it["version"] > since]
+                pending.clear()
+                for it in items:
+                    yield _sse("item", it)
+                if latest["version"] > since:
+                    yield _sse("task", latest["task"])
+                    since = latest["version"]
+        finally:
+            unsubscribe()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/api/tasks/{task_id}/cancel")
@@ -197,35 +487,57 @@ def cancel_task(task_id: str) -> dict[str, Any]:
     }
 
 
+_ITEMS_PAGE_MAX = 5000
+
+
 @app.get("/api/tasks/{task_id}/items")
-def list_items(task_id: str) -> dict[str, Any]:
+def list_items(task_id: str, since: int = 0, limit: int = 500) -> dict[str, Any]:
+    """Item summaries changed after version ``since``, oldest change first.
+
+    Poll with ``since=nextSince`` to receive only what changed; while
+    ``hasMore`` is true the next page is ready immediately. Path lists are
+    served per item by ``/items/{item_id}``.
+    """
     task = queue.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
+    limit = max(1, min(limit, _ITEMS_PAGE_MAX))
+    with task.lock:
+        changed, has_more = task.changed_since(since, limit)
+        items = [_item_summary(it) for it in changed]
+        version = task.version
     return {
         "taskId": task.task_id,
-        "items": [
-            {
-                "itemId": it.item_id,
-                "filename": it.filename,
-                "relpath": it.relpath,
-                "size": it.size,
-                "status": it.status,
-                "error": it.error,
-                "mdFiles": it.md_files,
-                "assets": it.assets,
-            }
-            for it in task.items
-        ],
+        "version": version,
+        "items": items,
+        "nextSince": items[-1]["version"] if has_more else max(since, version),
+        "hasMore": has_more,
     }
 
 
+@app.get("/api/tasks/{task_id}/items/{item_id}")
+def get_item(task_id: str, item_id: str) -> dict[str, Any]:
+    task = queue.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    item = task.find_item(item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    with task.lock:
+        return {
+            **_item_summary(item),
+            "mdFiles": list(item.md_files),
+            "assets": list(item.assets),
+            "downloadSeconds": round(item.download_s, 3),
+        }
+
+
 @app.get("/api/tasks/{task_id}/items/{item_id}/md")
 def get_item_md(task_id: str, item_id: str) -> dict[str, Any]:
     task = queue.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
-    item = next((x for x in task.items if x.item_id == item_id), None)
+    item = task.find_item(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="文件不存在")
     if not item.md_files:
@@ -237,27 +549,42 @@ def get_item_md(task_id: str, item_id: str) -> dict[str, Any]:
     return {"itemId": item.item_id, "md": md_path.read_text(encoding="utf-8")}
 
 
-@app.get("/api/tasks/{task_id}/download.zip")
-def download_zip(task_id: str) -> FileResponse:
+@app.get("/api/tasks/{task_id}/download.zip", response_model=None)
+def download_zip(
+    task_id: str, items: Optional[str] = None, kind: str = "all"
+) -> FileResponse | StreamingResponse:
+    """Stream the task output as ZIP.
+
+    ``items`` is a comma-separated list of item ids; ``kind`` selects
+    ``all`` files, ``markdown`` only or ``raw`` JSONL only. Archives of
+    finished tasks are cached under ``OUTPUT_ROOT/_zips`` until the task
+    changes again.
+    """
+    # Only task directories: OUTPUT_ROOT also holds the shared result
+    # cache, cached exports and the databases.
     task_dir = Path(settings.output_root) / task_id
-    if not task_dir.exists():
+    if not TASK_ID_RE.match(task_id) or not task_dir.is_dir():
         raise HTTPException(status_code=404, detail="任务目录不存在")
+    if kind not in ZIP_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind 必须是 {'/'.join(ZIP_KINDS)}")
+    item_ids = [x for x in (items or "").split(",") if x.strip()] or None
+
+    task = queue.get_task(task_id)
+    filename = f"{task_id}.zip" if kind == "all" else f"{task_id}_{kind}.zip"
+    cache_path = None
+    if task and task.status in ("done", "failed", "canceled"):
+        cache_path = cache_path_for(
+            ZIP_CACHE_DIR, task_id, version=task.version, item_ids=item_ids, kind=kind
+        )
+        if cache_path.exists():
+            return FileResponse(
+                path=str(cache_path), filename=filename, media_type="application/zip"
+            )
+        drop_stale(cache_path)
 
-    import zipfile
-    import tempfile
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f"_{task_id}.zip")
-    tmp.close()
-    zip_path = Path(tmp.name)
-    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for p in task_dir.rglob("*"):
-            if p.is_dir():
-                continue
-            rel = p.relative_to(task_dir)
-            zf.write(p, arcname=str(rel))
-
-    return FileResponse(
-        path=str(zip_path),
-        filename=f"{task_id}.zip",
+    files = select_files(task_dir, task, item_ids=item_ids, kind=kind)
+    return StreamingResponse(
+        iter_zip(files, cache_path=cache_path),
         media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
@@ -1,6 +1,10 @@
 let selected = [];
 let taskId = null;
 let pollTimer = null;
+let events = null;
+let itemsById = new Map();
+let itemsSince = 0;
+let renderPending = false;
 let activeItemId = null;
 let lastTaskStatus = null;
 let lastTaskTotal = 0;
@@ -81,9 +85,48 @@ function isSupportedFile(file) {
   );
 }
 
-async function refreshTask() {
-  if (!taskId) return;
-  const t = await fetch(`/api/tasks/${taskId}`).then((r) => r.json());
+function isFinished(status) {
+  return status === "done" || status === "failed" || status === "canceled";
+}
+
+function mdCount(item) {
+  if (typeof item.mdCount === "number") return item.mdCount;
+  return item.mdFiles ? item.mdFiles.length : 0;
+}
+
+function currentItems() {
+  return Array.from(itemsById.values());
+}
+
+function scheduleRender() {
+  // Coalesce bursts of item events into one repaint per frame.
+  if (renderPending) return;
+  renderPending = true;
+  requestAnimationFrame(() => {
+    renderPending = false;
+    if (taskId) renderQueue(currentItems());
+  });
+}
+
+async function autoSelect() {
+  // If nothing selected, auto-select the first done item with md.
+  if (activeItemId) return;
+  const first = currentItems().find((x) => x.status === "done" && mdCount(x));
+  if (first) await selectItem(first);
+}
+
+function stopUpdates() {
+  if (events) {
+    events.close();
+    events = null;
+  }
+  if (pollTimer) {
+    clearInterval(pollTimer);
+    pollTimer = null;
+  }
+}
+
+function applyTask(t) {
   lastTaskStatus = t.status;
   lastTaskTotal = t.total || 0;
   lastTaskDone = t.done || 0;
@@ -95,22 +138,51 @@ async function refreshTask() {
   el("btnDownload").disabled = !(t.status === "done" || t.status === "failed" || t.status === "canceled");
   el("btnStop").disabled = !(t.status === "running" || t.status === "queued");
   // After a task finishes, allow clearing the UI even if no local selection exists.
-  if (t.status === "done" || t.status === "failed" || t.status === "canceled") {
+  if (isFinished(t.status)) {
     el("btnClear").disabled = false;
+    stopUpdates();
   }
-  const items = await fetch(`/api/tasks/${taskId}/items`).then((r) => r.json());
-  renderQueue(items.items);
-  // If nothing selected, auto-select the first done item with md.
-  if (!activeItemId) {
-    const first = items.items.find((x) => x.status === "done" && x.mdFiles && x.mdFiles.length);
-    if (first) await selectItem(first);
-  }
-  if (t.status === "done" || t.status === "failed" || t.status === "canceled") {
-    if (pollTimer) {
-      clearInterval(pollTimer);
-      pollTimer = null;
-    }
+}
+
+function subscribeTask() {
+  stopUpdates();
+  if (!window.EventSource) {
+    pollTimer = setInterval(refreshTask, 1200);
+    return;
   }
+  // Server pushes a snapshot, then only item/task deltas.
+  events = new EventSource(`/api/tasks/${taskId}/events`);
+  events.addEventListener("snapshot", (e) => {
+    const data = JSON.parse(e.data);
+    itemsById = new Map(data.items.map((x) => [x.itemId, x]));
+    renderQueue(currentItems());
+    applyTask(data.task);
+    autoSelect();
+  });
+  events.addEventListener("item", (e) => {
+    const it = JSON.parse(e.data);
+    itemsById.set(it.itemId, it);
+    scheduleRender();
+  });
+  events.addEventListener("task", (e) => {
+    applyTask(JSON.parse(e.data));
+    autoSelect();
+  });
+}
+
+async function refreshTask() {
+  if (!taskId) return;
+  const t = await fetch(`/api/tasks/${taskId}`).then((r) => r.json());
+  // Only items changed since the last poll; page through bursts.
+  let page;
+  do {
+    page = await fetch(`/api/tasks/${taskId}/items?since=${itemsSince}`).then((r) => r.json());
+    for (const it of page.items) itemsById.set(it.itemId, it);
+    itemsSince = page.nextSince;
+  } while (page.hasMore);
+  renderQueue(currentItems());
+  applyTask(t);
+  await autoSelect();
 }
 
 async function selectItem(item) {
@@ -119,13 +191,16 @@ async function selectItem(item) {
   el("btnCopy").disabled = true;
   el("mdPreview").textContent = "正在加载 Markdown…";
   el("tips").style.display = "none";
-  renderQueue(await fetch(`/api/tasks/${taskId}/items`).then((r) => r.json()).then((x) => x.items));
+  renderQueue(currentItems());
 
-  if (item.status !== "done") {
+  // Long PDFs expose their first pages while the rest is still downloading.
+  const partial = item.status === "running" && mdCount(item) > 0;
+  if (item.status !== "done" && !partial) {
     el("mdPreview").textContent = item.status === "failed" ? (item.error || "识别失败") : "尚未完成";
     return;
   }
-  if (!item.mdFiles || !item.mdFiles.length) {
+  if (partial) el("previewMeta").textContent += "（识别中，仅显示第一页）";
+  if (!mdCount(item)) {
     el("mdPreview").textContent = "该文件暂无 Markdown 输出（可能只有图片输出或仍在生成中）";
     return;
   }
@@ -149,17 +224,19 @@ async function start() {
     return;
   }
 
+  // Options go before the files so the server can start OCR on each file
+  // as soon as it has been uploaded.
   const fd = new FormData();
-  const relpaths = [];
-  for (const f of selected) {
-    fd.append("files", f.file, f.file.name);
-    relpaths.push(f.relpath || f.file.name);
-  }
+  const relpaths = selected.map((f) => f.relpath || f.file.name);
   fd.append("relpaths", JSON.stringify(relpaths));
   fd.append("force_async", el("optForceAsync").checked ? "true" : "false");
+  fd.append("priority", el("optPriority").checked ? "1" : "0");
   fd.append("use_doc_orientation_classify", el("optOrientation").checked ? "true" : "false");
   fd.append("use_doc_unwarping", el("optUnwarp").checked ? "true" : "false");
   fd.append("use_chart_recognition", el("optChart").checked ? "true" : "false");
+  for (const f of selected) {
+    fd.append("files", f.file, f.file.name);
+  }
 
   setStatus("正在提交任务…");
   const resp = await fetch("/api/tasks", { method: "POST", body: fd });
@@ -180,8 +257,10 @@ async function start() {
   el("btnStart").disabled = true;
   el("btnClear").disabled = true;
 
-  await refreshTask();
-  pollTimer = setInterval(refreshTask, 1200);
+  itemsById = new Map(data.items.map((x) => [x.itemId, x]));
+  itemsSince = 0;
+  renderQueue(currentItems());
+  subscribeTask();
 }
 
 async function stop() {
@@ -212,10 +291,9 @@ function resetUI() {
   lastTaskDone = 0;
   lastTaskFailed = 0;
   lastTaskCanceled = 0;
-  if (pollTimer) {
-    clearInterval(pollTimer);
-    pollTimer = null;
-  }
+  itemsById = new Map();
+  itemsSince = 0;
+  stopUpdates();
   const list = el("queueList");
   list.classList.add("empty");
   list.innerHTML = `
@@ -1,25 +1,112 @@
+import asyncio
+import logging
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 import requests
 
+from . import metrics
+from .http_pool import HttpPool
 from .utils import ensure_dir, safe_path_segment
 
 
+log = logging.getLogger(__name__)
+
+_CHUNK_BYTES = 64 * 1024
+_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
 @dataclass(frozen=True)
 class MaterializedItem:
     md_files: list[str]
     assets: list[str]
+    # Wall time spent downloading images for this result.
+    download_s: float = 0.0
 
 
-def materialize_result_to_dir(
-    result: dict[str, Any], output_dir: Path
-) -> MaterializedItem:
+@dataclass(frozen=True)
+class _Download:
+    url: str
+    dest: Path
+    # Markdown-referenced image (vs. a best-effort page visualisation).
+    required: bool
+
+
+def _skipped(d: _Download) -> bool:
+    # A markdown image the server no longer serves (e.g. 404): keep the
+    # OCR markdown with a dangling link rather than failing the item.
+    if d.required:
+        metrics.MISSING_ASSETS.inc()
+        log.warning("markdown image not downloadable, skipped: %s", d.url)
+    return False
+
+
+def download_to_file(
+    http: HttpPool,
+    url: str,
+    dest: Path,
+    *,
+    retries: int = 3,
+    backoff_s: float = 0.5,
+) -> bool:
+    """Stream ``url`` into ``dest``; retry transient failures.
+
+    Returns False for a non-retryable HTTP status; raises once retries are
+    exhausted on connection errors or retryable statuses.
+    """
+    tmp = dest.with_name(dest.name + ".part")
+    attempt = 0
+    while True:
+        try:
+            with http.get(url, stream=True) as resp:
+                if resp.status_code == 200:
+                    with open(tmp, "wb") as f:
+                        for chunk in resp.iter_content(chunk_size=_CHUNK_BYTES):
+                            f.write(chunk)
+                            metrics.BYTES.inc(len(chunk), direction="download")
+                    os.replace(tmp, dest)
+                    return True
+                if resp.status_code not in _RETRY_STATUS:
+                    return False
+                error = f"HTTP {resp.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+        attempt += 1
+        if attempt > retries:
+            tmp.unlink(missing_ok=True)
+            raise RuntimeError(f"Asset download failed: {url}: {error}")
+        time.sleep(backoff_s * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+
+def _download_all(
+    http: HttpPool, downloads: list[_Download], max_workers: int
+) -> list[bool]:
+    if not downloads:
+        return []
+
+    def run(d: _Download) -> bool:
+        ensure_dir(d.dest.parent)
+        return download_to_file(http, d.url, d.dest) or _skipped(d)
+
+    workers = max(1, min(int(max_workers), len(downloads)))
+    if workers == 1:
+        return [run(d) for d in downloads]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset") as ex:
+        # map() preserves order and re-raises the first failure.
+        return list(ex.map(run, downloads))
+
+
+def _plan(result: dict[str, Any], output_dir: Path) -> tuple[list[str], list[_Download]]:
+    # Writes the markdown files and lists the images they (and the page
+    # visualisations) need.
     ensure_dir(output_dir)
     md_files: list[str] = []
-    assets: list[str] = []
+    downloads: list[_Download] = []
 
     layout_results = result.get("layoutParsingResults") or []
     for i, res in enumerate(layout_results):
@@ -37,19 +124,57 @@ def materialize_result_to_dir(
                     if p
                 ]
             )
-            full_img_path = output_dir / img_rel
-            ensure_dir(full_img_path.parent)
-            img_bytes = requests.get(img_url, timeout=60).content
-            full_img_path.write_bytes(img_bytes)
-            assets.append(str(full_img_path))
+            downloads.append(
+                _Download(url=img_url, dest=output_dir / img_rel, required=True)
+            )
 
         output_images = res.get("outputImages") or {}
         for img_name, img_url in output_images.items():
             name = safe_path_segment(str(img_name))
-            filename = output_dir / f"{name}_{i}.jpg"
-            img_resp = requests.get(img_url, timeout=60)
-            if img_resp.status_code == 200:
-                filename.write_bytes(img_resp.content)
-                assets.append(str(filename))
+            downloads.append(
+                _Download(
+                    url=img_url, dest=output_dir / f"{name}_{i}.jpg", required=False
+                )
+            )
+
+    return md_files, downloads
+
+
+def materialize_result_to_dir(
+    result: dict[str, Any],
+    output_dir: Path,
+    *,
+    http: HttpPool,
+    max_workers: int = 8,
+) -> MaterializedItem:
+    md_files, downloads = _plan(result, output_dir)
+    t0 = time.monotonic()
+    ok = _download_all(http, downloads, max_workers)
+    download_s = time.monotonic() - t0
+    assets = [str(d.dest) for d, fetched in zip(downloads, ok) if fetched]
+
+    return MaterializedItem(md_files=md_files, assets=assets, download_s=download_s)
+
+
+async def materialize_result_to_dir_async(
+    result: dict[str, Any],
+    output_dir: Path,
+    *,
+    fetch: Callable[[str, Path], Awaitable[bool]],
+    max_concurrency: int = 8,
+) -> MaterializedItem:
+    """asyncio variant: ``fetch(url, dest)`` behaves like ``download_to_file``."""
+    md_files, downloads = await asyncio.to_thread(_plan, result, output_dir)
+    sem = asyncio.Semaphore(max(1, int(max_concurrency)))
+
+    async def run(d: _Download) -> bool:
+        async with sem:
+            ensure_dir(d.dest.parent)
+            return await fetch(d.url, d.dest) or _skipped(d)
+
+    t0 = time.monotonic()
+    ok = await asyncio.gather(*(run(d) for d in downloads))
+    download_s = time.monotonic() - t0
+    assets = [str(d.dest) for d, fetched in zip(downloads, ok) if fetched]
 
-    return MaterializedItem(md_files=md_files, assets=assets)
+    return MaterializedItem(md_files=md_files, assets=assets, download_s=download_s)
@@ -1,17 +1,53 @@
+import dataclasses
+import itertools
+import logging
+import multiprocessing
+import os
 import queue
+import re
+import shutil
+import socket
+import sqlite3
 import threading
 import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing, contextmanager
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Iterator, Optional
 
-from .ocr_client import BaiduPaddleOcrClient, OcrOptions, parse_jsonl_results
-from .storage import materialize_result_to_dir
-from .utils import ensure_dir, guess_file_type, safe_path_segment
+from . import metrics
+from .image_prep import prepare_image, preprocessing_available
+from .job_poller import JobPoller
+from .ocr_client import BaiduPaddleOcrClient, OcrOptions, parse_jsonl_line
+from .pdf_shards import PdfShard, split_pdf
+from .pipeline import Stage
+from .result_cache import ResultCache
+from .scheduler import FairScheduler
+from .storage import MaterializedItem, materialize_result_to_dir
+from .task_store import TaskStore
+from .utils import (
+    ensure_dir,
+    guess_file_type,
+    link_or_copy,
+    link_or_copy_tree,
+    safe_path_segment,
+    sha256_file,
+)
+from .work_queue import WorkQueue
 
 
-@dataclass
+log = logging.getLogger(__name__)
+
+# Task ids as made by TaskQueue.create_task(), which are also the names of
+# the task directories under OUTPUT_ROOT.
+TASK_ID_RE = re.compile(r"^\d{8}_\d{6}_[0-9a-f]{8}$")
+
+
+# Compact per-item record: folder uploads can hold 10k+ items per task.
+@dataclass(slots=True)
 class TaskItem:
     item_id: str
     filename: str
@@ -20,8 +56,22 @@ class TaskItem:
     status: str = "queued"  # queued|running|done|failed|canceled
     error: str = ""
     output_dir: str = ""
+    local_path: str = ""
     md_files: list[str] = field(default_factory=list)
     assets: list[str] = field(default_factory=list)
+    download_s: float = 0.0
+    # Remote async job, persisted so polling can resume after a restart.
+    job_id: str = ""
+    job_submitted_at: float = 0.0
+    # TaskQueue change counter value of this item's last change.
+    version: int = 0
+    # Seconds spent in each pipeline stage (metrics.STAGES).
+    timings: dict[str, float] = field(default_factory=dict)
+    # Bytes actually sent upstream; below size when the image was pre-processed.
+    upload_bytes: int = 0
+
+
+_ITEM_STATUSES = ("queued", "running", "done", "failed", "canceled")
 
 
 @dataclass
@@ -29,12 +79,69 @@ class Task:
     task_id: str
     created_at: float
     status: str = "queued"  # queued|running|done|failed|canceled
+    # Higher runs first; equal priorities share workers round robin.
+    priority: int = 0
     total: int = 0
+    # Item counts per status, kept in step by add_item()/set_item_status().
+    queued: int = 0
+    running: int = 0
     done: int = 0
     failed: int = 0
     canceled: int = 0
     message: str = ""
     items: list[TaskItem] = field(default_factory=list)
+    # TaskQueue change counter value of the last task or item change.
+    version: int = 0
+    # Time of the last change or read; the janitor evicts least recently used.
+    accessed_at: float = 0.0
+    # An upload is still adding items; the task must not be evicted.
+    uploading: bool = False
+    # Items by id, ordered by last change so changed_since() only walks
+    # the items that actually changed.
+    item_index: OrderedDict[str, TaskItem] = field(
+        default_factory=OrderedDict, repr=False
+    )
+    # Guards this task and its items; TaskQueue._lock only guards the task map.
+    lock: Any = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_item(self, item: TaskItem) -> int:
+        """Append ``item``; returns its position."""
+        self.items.append(item)
+        self.item_index[item.item_id] = item
+        self.total += 1
+        self._count(item.status, 1)
+        return len(self.items) - 1
+
+    def find_item(self, item_id: str) -> Optional[TaskItem]:
+        return self.item_index.get(item_id)
+
+    def changed_since(self, since: int, limit: int) -> tuple[list[TaskItem], bool]:
+        """Items changed after version ``since``, oldest change first.
+
+        Returns at most ``limit`` items and whether more are pending.
+        """
+        newer: list[TaskItem] = []
+        for it in reversed(self.item_index.values()):
+            if it.version <= since:
+                break
+            newer.append(it)
+        newer.reverse()
+        return newer[:limit], len(newer) > limit
+
+    def touch(self, item: TaskItem, version: int) -> None:
+        item.version = version
+        self.item_index.move_to_end(item.item_id)
+
+    def set_item_status(self, item: TaskItem, status: str) -> None:
+        if item.status == status:
+            return
+        self._count(item.status, -1)
+        self._count(status, 1)
+        item.status = status
+
+    def _count(self, status: str, delta: int) -> None:
+        if status in _ITEM_STATUSES:
+            setattr(self, status, getattr(self, status) + delta)
 
 
 @dataclass(frozen=True)
@@ -46,50 +153,505 @@ class EnqueuedItem:
     relpath: str
     force_async: bool
     options: OcrOptions
+    sha256: str = ""
+    enqueued_at: float = 0.0
+    size: int = 0
+
+
+@dataclass(frozen=True)
+class RemoteJobDone:
+    # Async job(s) finished upstream; queued for the fetch stage.
+    # One job_data per PDF shard, in page order (a single entry when unsharded).
+    job: EnqueuedItem
+    results: tuple[dict[str, Any], ...]
+    cache_key: str = ""
+
+
+@dataclass(frozen=True)
+class FetchedResult:
+    # OCR output ready for the materialize stage. A sync result is written
+    # flat into the item dir; async and sharded results page by page.
+    job: EnqueuedItem
+    pages: tuple[dict[str, Any], ...]
+    cache_key: str = ""
+    flat: bool = False
+
+
+@dataclass
+class _PageSink:
+    # Pages of one item materialized so far, in order.
+    md_files: list[str] = field(default_factory=list)
+    assets: list[str] = field(default_factory=list)
+    count: int = 0
+    fetch_s: float = 0.0
+    download_s: float = 0.0
+
+    def add(self, m: MaterializedItem) -> None:
+        self.md_files.extend(m.md_files)
+        self.assets.extend(m.assets)
+        self.download_s += m.download_s
+        self.count += 1
+
+
+class _WorkQueueScheduler:
+    # Stands in for FairScheduler in the web process when workers run in
+    # other processes: dispatched items go to the shared work queue.
+
+    def __init__(self, work_queue: WorkQueue) -> None:
+        self._wq = work_queue
+
+    def put(
+        self,
+        work: EnqueuedItem,
+        *,
+        group: str,
+        priority: int = 0,
+        cost: Any = 0,
+        job_id: str = "",
+        job_submitted_at: float = 0.0,
+    ) -> None:
+        self._wq.put(
+            item_id=work.item_id,
+            task_id=group,
+            payload=_job_payload(work),
+            priority=priority,
+            job_id=job_id,
+            job_submitted_at=job_submitted_at,
+        )
+
+    def get_nowait(self) -> Optional[EnqueuedItem]:
+        return None
+
+    def promote(
+        self, work: EnqueuedItem, *, from_group: str, group: str, priority: int
+    ) -> None:
+        self._wq.promote(work.item_id, task_id=group, priority=priority)
+
+    def reprioritize(self, group: str, priority: int) -> None:
+        self._wq.reprioritize(group, priority)
+
+    def qsize(self) -> int:
+        try:
+            return self._wq.depth()
+        except sqlite3.Error:
+            return 0
+
+
+def _job_payload(job: EnqueuedItem) -> dict[str, Any]:
+    return dataclasses.asdict(job)
+
+
+def _job_from_payload(payload: dict[str, Any]) -> EnqueuedItem:
+    return EnqueuedItem(**{**payload, "options": OcrOptions(**payload["options"])})
+
+
+_SETTLED = ("done", "failed", "canceled")
+# How often the web process applies item reports from workers, and how
+# long an idle worker waits before asking the work queue again.
+_REPORT_POLL_S = 0.2
+_CLAIM_IDLE_S = 0.25
 
 
 class TaskQueue:
+    """Runs OCR items as a pipeline of stages with bounded hand-offs.
+
+    submit (``concurrency`` workers fed by the fair scheduler) -> remote
+    wait (job poller) -> fetch (streams the JSONL result and materializes
+    each page as it arrives). Sync results go from submit to the
+    materialize stage (assets and markdown) instead. A full stage queue
+    blocks the stage feeding it, so uploads for later items overlap with
+    materialization of earlier ones without piling up unbounded results.
+
+    With a ``work_queue`` the work is split across processes: in the
+    "web" ``role`` items are only dispatched to the shared queue and
+    their progress is applied from worker reports; in the "worker" role
+    items are claimed from it, run as above and reported back.
+    """
+
     def __init__(
-        self, *, client: BaiduPaddleOcrClient, output_root: str, concurrency: int = 2
+        self,
+        *,
+        client: BaiduPaddleOcrClient,
+        output_root: str,
+        concurrency: int = 2,
+        cache: Optional[ResultCache] = None,
+        asset_concurrency: int = 8,
+        poller: Optional[JobPoller] = None,
+        store: Optional[TaskStore] = None,
+        shard_pages: int = 0,
+        shard_mode: str = "job",
+        shard_concurrency: int = 4,
+        fetch_concurrency: int = 2,
+        materialize_concurrency: int = 2,
+        stage_capacity: int = 16,
+        image_prep_workers: int = 0,
+        image_max_side: int = 0,
+        image_jpeg_quality: int = 85,
+        work_queue: Optional[WorkQueue] = None,
+        role: str = "all",
     ) -> None:
         self._client = client
+        self._poller = poller or self._make_poller()
+        self._cache = cache
+        self._store = store
+        # PDFs longer than shard_pages are split and OCR'd in parallel (0 = off).
+        self._shard_pages = max(0, int(shard_pages))
+        self._shard_mode = shard_mode
+        self._shard_concurrency = max(1, int(shard_concurrency))
+        self._asset_concurrency = max(1, int(asset_concurrency))
+        # Images are downscaled/re-encoded before upload in worker processes
+        # (0 workers or no Pillow = sent as received). Spawned, not forked,
+        # since this process is full of threads.
+        self._prep_pool: Optional[ProcessPoolExecutor] = None
+        if image_prep_workers > 0 and preprocessing_available():
+            self._prep_pool = ProcessPoolExecutor(
+                max_workers=int(image_prep_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self._prep_options = {
+            "max_side": max(0, int(image_max_side)),
+            "jpeg_quality": min(95, max(1, int(image_jpeg_quality))),
+        }
         self._output_root = Path(output_root)
         ensure_dir(self._output_root)
-        self._q: queue.Queue[EnqueuedItem] = queue.Queue()
+        self._work_queue = work_queue
+        self._role = role if work_queue else "all"
+        self._q: Any = (
+            _WorkQueueScheduler(work_queue)
+            if work_queue and self._role == "web"
+            else FairScheduler()
+        )
         self._tasks: dict[str, Task] = {}
+        # Global change counter: every task/item change takes the next value,
+        # so clients can poll "what changed since version N". Persisted with
+        # the rows and resumed after a restart.
+        self._versions = itertools.count(1)
+        self._subscribers: dict[
+            str, list[Callable[[Task, Optional[TaskItem]], None]]
+        ] = {}
+        # Guards the task map and subscriber lists; task state has its own lock.
         self._lock = threading.Lock()
         self._workers: list[threading.Thread] = []
+        self._active = 0
+        self._active_lock = threading.Lock()
         self._stop = threading.Event()
+        # Single flight: identical uploads (same bytes, options and mode)
+        # queued or running together share one upstream job. Flight key ->
+        # items waiting on it; leader item id -> its flight key; flight key ->
+        # leader.
+        self._flights: dict[str, list[EnqueuedItem]] = {}
+        self._flight_leaders: dict[str, str] = {}
+        self._leader_jobs: dict[str, EnqueuedItem] = {}
+        self._flight_lock = threading.Lock()
+        # Worker role: payloads of claimed items not yet finished, and how
+        # many of them each task has (its local Task is dropped at zero).
+        self._worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._worker_count = max(1, int(concurrency))
+        self._claims: dict[str, dict[str, Any]] = {}
+        self._held: dict[str, int] = {}
+        self._claiming_stopped = threading.Event()
+        self._make_stages(
+            max(1, int(fetch_concurrency)),
+            max(1, int(materialize_concurrency)),
+            max(1, int(stage_capacity)),
+        )
+
+        if self._store:
+            self._restore()
+
+        if self._role == "web":
+            threading.Thread(
+                target=self._follow_reports, name="work-reports", daemon=True
+            ).start()
+            return
+        self._start_workers(self._worker_count)
+        if self._role == "worker":
+            self._start_claiming()
+
+    # Engine hooks; AsyncTaskQueue overrides these to run on an event loop.
+
+    def _make_poller(self) -> Optional[JobPoller]:
+        return JobPoller(client=self._client)
 
-        for idx in range(max(1, int(concurrency))):
+    def _start_workers(self, count: int) -> None:
+        for idx in range(count):
             t = threading.Thread(target=self._worker, name=f"worker-{idx}", daemon=True)
             t.start()
             self._workers.append(t)
 
-    def create_task(self) -> Task:
+    def _make_stages(self, fetch: int, materialize: int, capacity: int) -> None:
+        self._fetch_stage: Any = Stage(
+            "fetch",
+            lambda w: self._run_stage(w.job, lambda: self._fetch_remote(w)),
+            workers=fetch,
+            capacity=capacity,
+        )
+        self._materialize_stage: Any = Stage(
+            "materialize",
+            lambda w: self._run_stage(w.job, lambda: self._materialize(w)),
+            workers=materialize,
+            capacity=capacity,
+        )
+
+    def _dispatch(self, job: EnqueuedItem) -> None:
+        if self._role == "web" and self._serve_cached(job):
+            return
+        if self._join_flight(job):
+            return
+        task = self.get_task(job.task_id)
+        self._q.put(
+            job,
+            group=job.task_id,
+            priority=task.priority if task else 0,
+            cost=self._cost(job),
+        )
+
+    def _flight_key(self, job: EnqueuedItem) -> str:
+        if not job.sha256:
+            return ""
+        return ResultCache.make_key(
+            file_sha256=job.sha256,
+            options=job.options,
+            model=self._client.model,
+            mode="async" if self._uses_async(job) else "sync",
+            variant=self._prep_variant(job),
+        )
+
+    def _join_flight(self, job: EnqueuedItem) -> bool:
+        """Attach ``job`` to an identical item already in flight; returns
+        False (and makes ``job`` the leader) if there is none."""
+        key = self._flight_key(job)
+        if not key:
+            return False
+        with self._flight_lock:
+            followers = self._flights.get(key)
+            if followers is None:
+                self._flights[key] = []
+                self._flight_leaders[job.item_id] = key
+                self._leader_jobs[key] = job
+                return False
+            followers.append(job)
+            leader = self._leader_jobs[key]
+        metrics.COALESCED_ITEMS.inc()
+        # Don't let the follower wait behind a leader that is still queued at
+        # a lower priority or further back in line: move the leader up.
+        task = self.get_task(job.task_id)
+        self._q.promote(
+            leader,
+            from_group=leader.task_id,
+            group=job.task_id,
+            priority=task.priority if task else 0,
+        )
+        return True
+
+    def _lead_flight(self, job: EnqueuedItem) -> None:
+        # A restored item whose upstream job is still running leads its
+        # flight again, so identical queued items wait instead of resubmitting.
+        key = self._flight_key(job)
+        if not key:
+            return
+        with self._flight_lock:
+            if key not in self._flights:
+                self._flights[key] = []
+                self._flight_leaders[job.item_id] = key
+                self._leader_jobs[key] = job
+
+    def _land_flight(
+        self,
+        job: EnqueuedItem,
+        status: str,
+        error: str = "",
+        result: Optional[MaterializedItem] = None,
+    ) -> None:
+        # Called once the leader ``job`` is settled (or dropped unprocessed).
+        if self._role == "worker":
+            self._release_claim(job, status, error)
+        with self._flight_lock:
+            key = self._flight_leaders.pop(job.item_id, None)
+            followers = self._flights.pop(key, []) if key else []
+            if key:
+                self._leader_jobs.pop(key, None)
+        if followers:
+            self._fan_out(job, followers, status, error, result)
+
+    def _fan_out(
+        self,
+        leader: EnqueuedItem,
+        followers: list[EnqueuedItem],
+        status: str,
+        error: str,
+        result: Optional[MaterializedItem],
+    ) -> None:
+        if status == "canceled":
+            # The leader's task was stopped, not theirs: the next one leads.
+            for f in followers:
+                self._dispatch(f)
+            return
+        for f in followers:
+            if self._is_canceled(f.task_id):
+                self._land_flight(f, "canceled")
+                continue
+            if status != "done" or result is None:
+                self._settle_item(f, status=status, error=error)
+                continue
+            try:
+                shared = self._share_result(leader, f, result)
+            except OSError as e:
+                self._settle_item(f, status="failed", error=str(e))
+            else:
+                self._settle_item(f, status="done", result=shared)
+
+    def _share_result(
+        self, src: EnqueuedItem, dst: EnqueuedItem, m: MaterializedItem
+    ) -> MaterializedItem:
+        """Hardlink (or copy) ``src``'s finished output into ``dst``'s item dir."""
+        _, src_dir, src_raw = self._item_paths(src)
+        _, dst_dir, dst_raw = self._item_paths(dst)
+        link_or_copy_tree(src_dir, dst_dir)
+        if src_raw.exists():
+            link_or_copy(src_raw, dst_raw)
+
+        def moved(paths: list[str]) -> list[str]:
+            return [str(dst_dir / Path(p).relative_to(src_dir)) for p in paths]
+
+        return MaterializedItem(md_files=moved(m.md_files), assets=moved(m.assets))
+
+    def flight_stats(self) -> dict[str, int]:
+        with self._flight_lock:
+            return {
+                "flights": len(self._flights),
+                "waiting": sum(len(f) for f in self._flights.values()),
+            }
+
+    @staticmethod
+    def _cost(job: EnqueuedItem) -> tuple[int, int]:
+        # Shortest job first within a task: sync images are one quick
+        # request, async jobs (PDFs) take longest; smaller files first.
+        return (1 if TaskQueue._uses_async(job) else 0, job.size)
+
+    def pending_jobs(self) -> int:
+        """Remote async jobs currently being polled."""
+        return self._poller.pending_count() if self._poller else 0
+
+    def _queue_depth(self) -> int:
+        return self._q.qsize()
+
+    def queue_stats(self) -> dict[str, Any]:
+        stats = {
+            "depth": self._queue_depth(),
+            "active": self._active,
+            "pendingJobs": self.pending_jobs(),
+            "shared": self.flight_stats(),
+            "stages": {
+                "fetch": self._fetch_stage.stats(),
+                "materialize": self._materialize_stage.stats(),
+            },
+        }
+        if self._work_queue:
+            try:
+                stats["workQueue"] = {"role": self._role, **self._work_queue.stats()}
+            except sqlite3.Error:
+                pass
+        return stats
+
+    def create_task(self, *, uploading: bool = False) -> Task:
+        """New empty task; with ``uploading`` it is kept until
+        ``finish_upload()`` however it looks in between."""
         task_id = time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:8]
-        task = Task(task_id=task_id, created_at=time.time())
+        task = Task(task_id=task_id, created_at=time.time(), uploading=uploading)
         with self._lock:
             self._tasks[task_id] = task
+        with task.lock:
+            self._changed(task)
         return task
 
     def get_task(self, task_id: str) -> Optional[Task]:
         with self._lock:
-            return self._tasks.get(task_id)
+            task = self._tasks.get(task_id)
+        if task:
+            task.accessed_at = time.time()
+        return task
 
-    def cancel_task(self, task_id: str) -> None:
+    def list_tasks(self) -> list[Task]:
+        with self._lock:
+            return list(self._tasks.values())
+
+    def remove_task(self, task_id: str) -> bool:
+        """Forget a finished task (memory and store); its files are left
+        to the caller. Returns False if it is unknown or still has work."""
         with self._lock:
             task = self._tasks.get(task_id)
-            if not task:
-                return
+        if not task:
+            return False
+        with task.lock:
+            if task.uploading or task.queued or task.running or task.status not in (
+                "done",
+                "failed",
+                "canceled",
+            ):
+                return False
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._subscribers.pop(task_id, None)
+        if self._store:
+            self._store.delete_task(task_id)
+        if self._work_queue and self._role == "web":
+            self._work_queue.forget_task(task_id)
+        return True
+
+    def finish_upload(self, task_id: str) -> None:
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task:
+            with task.lock:
+                task.uploading = False
+
+    def set_priority(self, task_id: str, priority: int) -> None:
+        task = self.get_task(task_id)
+        if not task:
+            return
+        with task.lock:
+            task.priority = int(priority)
+            self._changed(task)
+        self._q.reprioritize(task_id, task.priority)
+
+    def files_changed(self, task_id: str) -> int:
+        """Give the task a new version after its files changed on disk
+        (the janitor deleting inputs), so exports cached under the old
+        version are no longer served. Doesn't count as a use of the task.
+        Returns the new version, 0 if the task is gone."""
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if not task:
+            return 0
+        with task.lock:
+            accessed_at = task.accessed_at
+            self._changed(task)
+            task.accessed_at = accessed_at
+            self._persist(task)
+            return task.version
+
+    def cancel_task(self, task_id: str) -> None:
+        task = self.get_task(task_id)
+        if not task:
+            return
+        with task.lock:
             if task.status in ("done", "failed", "canceled"):
                 return
-            task.status = "canceled"
-            task.message = "已停止识别"
+            self._mark_canceled(task)
+        if self._work_queue and self._role == "web":
+            self._work_queue.cancel_task(task_id)
+
+    def _mark_canceled(self, task: Task) -> None:
+        # Caller holds task.lock.
+        task.status = "canceled"
+        task.message = "已停止识别"
+        if task.queued:
             for it in task.items:
                 if it.status == "queued":
-                    it.status = "canceled"
-                    task.canceled += 1
+                    task.set_item_status(it, "canceled")
+                    self._changed(task, it)
+        self._changed(task)
 
     def enqueue_file(
         self,
@@ -101,6 +663,7 @@ class TaskQueue:
         size: int,
         force_async: bool,
         options: OcrOptions,
+        sha256: str = "",
     ) -> TaskItem:
         item_id = uuid.uuid4().hex[:10]
         item = TaskItem(
@@ -109,145 +672,971 @@ class TaskQueue:
             relpath=relpath,
             size=size,
             output_dir=str(self._output_root / task_id),
+            local_path=local_path,
         )
-        with self._lock:
-            task = self._tasks[task_id]
-            task.items.append(item)
-            task.total += 1
-            task.status = "queued" if task.done + task.failed == 0 else task.status
-        self._q.put(
-            EnqueuedItem(
-                task_id=task_id,
-                item_id=item_id,
-                local_path=local_path,
-                filename=filename,
-                relpath=relpath,
-                force_async=force_async,
-                options=options,
-            )
+        job = EnqueuedItem(
+            task_id=task_id,
+            item_id=item_id,
+            local_path=local_path,
+            filename=filename,
+            relpath=relpath,
+            force_async=force_async,
+            options=options,
+            sha256=sha256,
+            enqueued_at=time.time(),
+            size=size,
         )
+        task = self._tasks[task_id]
+        with task.lock:
+            seq = task.add_item(item)
+            task.status = "queued" if task.done + task.failed == 0 else task.status
+            self._changed(task, item, job=job, seq=seq)
+        self._dispatch(job)
         return item
 
-    def _worker(self) -> None:
+    def subscribe(
+        self, task_id: str, callback: Callable[[Task, Optional[TaskItem]], None]
+    ) -> Callable[[], None]:
+        """Call ``callback(task, item)`` on every change to ``task_id``.
+
+        Runs on the thread making the change while holding the task lock,
+        so it must be quick and must not call back into the queue. Returns
+        an unsubscribe function.
+        """
+        # Lists are replaced, never mutated, so _changed() can iterate
+        # them without taking self._lock.
+        with self._lock:
+            self._subscribers[task_id] = [*self._subscribers.get(task_id, ()), callback]
+
+        def unsubscribe() -> None:
+            with self._lock:
+                subs = [
+                    cb for cb in self._subscribers.get(task_id, ()) if cb is not callback
+                ]
+                if subs:
+                    self._subscribers[task_id] = subs
+                else:
+                    self._subscribers.pop(task_id, None)
+
+        return unsubscribe
+
+    def _changed(
+        self,
+        task: Task,
+        item: Optional[TaskItem] = None,
+        *,
+        job: Optional[EnqueuedItem] = None,
+        seq: int = 0,
+    ) -> None:
+        # Caller holds task.lock. next() on itertools.count is atomic, so
+        # tasks changing in parallel still get distinct, increasing versions.
+        task.version = next(self._versions)
+        task.accessed_at = time.time()
+        if item is not None:
+            task.touch(item, task.version)
+            self._persist(task, item, job=job, seq=seq)
+            if self._role == "worker":
+                self._report(task, item)
+        self._persist(task)
+        for cb in self._subscribers.get(task.task_id, ()):
+            try:
+                cb(task, item)
+            except Exception:  # noqa: BLE001
+                pass
+
+    def _persist(
+        self,
+        task: Task,
+        item: Optional[TaskItem] = None,
+        *,
+        job: Optional[EnqueuedItem] = None,
+        seq: int = 0,
+    ) -> None:
+        # Caller holds task.lock so the staged row is a consistent snapshot.
+        if not self._store:
+            return
+        if item is None:
+            self._store.save_task(
+                {
+                    "task_id": task.task_id,
+                    "created_at": task.created_at,
+                    "status": task.status,
+                    "message": task.message,
+                    "priority": task.priority,
+                    "version": task.version,
+                    "accessed_at": task.accessed_at,
+                }
+            )
+            return
+        row: dict[str, Any] = {
+            "item_id": item.item_id,
+            "status": item.status,
+            "error": item.error,
+            "md_files": item.md_files,
+            "assets": item.assets,
+            "download_s": item.download_s,
+            "job_id": item.job_id,
+            "job_submitted_at": item.job_submitted_at,
+            "version": item.version,
+            "timings": item.timings,
+            "upload_bytes": item.upload_bytes,
+        }
+        if job:
+            row.update(
+                task_id=task.task_id,
+                seq=seq,
+                filename=item.filename,
+                relpath=item.relpath,
+                size=item.size,
+                output_dir=item.output_dir,
+                local_path=job.local_path,
+                force_async=int(job.force_async),
+                options=dataclasses.asdict(job.options),
+                sha256=job.sha256,
+            )
+        self._store.save_item(row)
+
+    def _restore(self) -> None:
+        """Reload persisted tasks; re-enqueue queued items, resume remote jobs."""
+        assert self._store
+        resume: list[tuple[EnqueuedItem, TaskItem]] = []
+        last_version = 0
+        for trow, irows in self._store.load():
+            task = Task(
+                task_id=trow["task_id"],
+                created_at=trow["created_at"],
+                status=trow["status"],
+                message=trow["message"],
+                priority=trow["priority"],
+                version=trow["version"],
+                accessed_at=trow["accessed_at"] or trow["created_at"],
+            )
+            for r in irows:
+                item = TaskItem(
+                    item_id=r["item_id"],
+                    filename=r["filename"],
+                    relpath=r["relpath"],
+                    size=r["size"],
+                    status=r["status"],
+                    error=r["error"],
+                    output_dir=r["output_dir"],
+                    local_path=r["local_path"],
+                    md_files=r["md_files"],
+                    assets=r["assets"],
+                    download_s=r["download_s"],
+                    job_id=r["job_id"],
+                    job_submitted_at=r["job_submitted_at"],
+                    version=r["version"],
+                    timings=r["timings"],
+                    upload_bytes=r["upload_bytes"],
+                )
+                task.add_item(item)
+                if item.status in ("done", "failed", "canceled"):
+                    continue
+                if task.status != "canceled":
+                    job = EnqueuedItem(
+                        task_id=task.task_id,
+                        item_id=item.item_id,
+                        local_path=r["local_path"],
+                        filename=item.filename,
+                        relpath=item.relpath,
+                        force_async=r["force_async"],
+                        options=OcrOptions(**r["options"]),
+                        sha256=r["sha256"],
+                        enqueued_at=time.time(),
+                        size=item.size,
+                    )
+                    resume.append((job, item))
+            for it in sorted(task.items, key=lambda x: x.version):
+                task.item_index.move_to_end(it.item_id)
+            last_version = max(last_version, task.version)
+            self._tasks[task.task_id] = task
+        self._versions = itertools.count(last_version + 1)
+
+        # Items with a remote job go first and lead their flights again.
+        resume.sort(key=lambda r: not r[1].job_id)
+        for job, item in resume:
+            task = self._tasks[job.task_id]
+            with task.lock:
+                if item.job_id:
+                    task.set_item_status(item, "running")
+                    task.status = "running"
+                else:
+                    task.set_item_status(item, "queued")
+                    if task.status != "running":
+                        task.status = "queued"
+                self._changed(task, item)
+            if item.job_id:
+                self._lead_flight(job)
+            if item.job_id and self._role == "web":
+                # Submitted before the restart: a worker resumes polling.
+                self._q.put(
+                    job,
+                    group=job.task_id,
+                    priority=task.priority,
+                    job_id=item.job_id,
+                    job_submitted_at=item.job_submitted_at,
+                )
+            elif item.job_id:
+                # Submitted before the restart: keep polling, don't resubmit.
+                self._track_remote(job, item.job_id.split(","), item.job_submitted_at)
+            else:
+                self._dispatch(job)
+
+    # Multi-process mode: the web role applies worker reports, the worker
+    # role claims items from the work queue and reports on them.
+
+    def _follow_reports(self) -> None:
+        assert self._work_queue
+        after = 0
         while not self._stop.is_set():
             try:
-                job = self._q.get(timeout=0.2)
-            except queue.Empty:
-                continue
+                reports = self._work_queue.read_reports(after)
+            except sqlite3.Error:
+                reports = []
+            for seq, task_id, item_id, row in reports:
+                try:
+                    self._apply_report(task_id, item_id, row)
+                except Exception:  # noqa: BLE001
+                    # One bad report must not hold up the rest.
+                    log.exception(
+                        "dropped worker report for item %s of task %s", item_id, task_id
+                    )
+                after = seq
+            if reports:
+                self._work_queue.ack_reports(after)
+            else:
+                self._stop.wait(_REPORT_POLL_S)
+
+    def _apply_report(self, task_id: str, item_id: str, row: dict[str, Any]) -> None:
+        task = self.get_task(task_id)
+        if not task:
+            return
+        # Set on a worker's last report, once the item is settled or dropped.
+        landed = row.get("landed", "")
+        with task.lock:
+            item = task.find_item(item_id)
+            if item is None:
+                return
+            settled = item.status in _SETTLED
+            if not settled:
+                item.md_files = row["md_files"]
+                item.assets = row["assets"]
+                item.download_s = row["download_s"]
+                item.job_id = row["job_id"]
+                item.job_submitted_at = row["job_submitted_at"]
+                item.timings = row["timings"]
+                item.upload_bytes = row["upload_bytes"]
+                if not landed:
+                    if row["status"] == "running":
+                        if task.status != "canceled":
+                            task.status = "running"
+                        task.set_item_status(item, "running")
+                    self._changed(task, item)
+        if not landed:
+            return
+        job = _job_from_payload(row["job"])
+        result = None
+        if landed == "done":
+            result = MaterializedItem(
+                md_files=row["md_files"],
+                assets=row["assets"],
+                download_s=row["download_s"],
+            )
+            _, item_dir, raw_path = self._item_paths(job)
+            self._cache_result(
+                self._cache_key(job, "async" if self._uses_async(job) else "sync"),
+                item_dir,
+                result,
+                raw_path=raw_path,
+            )
+        if settled:
+            # Already settled here (its task was stopped): only release the
+            # identical items waiting on it.
+            self._land_flight(job, landed, row["error"], result)
+        else:
+            self._settle_item(job, status=landed, error=row["error"], result=result)
+
+    def _serve_cached(self, job: EnqueuedItem) -> bool:
+        # Web role: workers run without a result cache (each would index the
+        # shared directory on its own), so hits are served here, before the
+        # item reaches the work queue.
+        if not self._cache:
+            return False
+        _, item_dir, raw_path = self._item_paths(job)
+        key = self._cache_key(job, "async" if self._uses_async(job) else "sync")
+        hit = self._cache.get(key, item_dir=item_dir, raw_path=raw_path)
+        if not hit:
+            return False
+        self._settle_item(
+            job,
+            status="done",
+            result=MaterializedItem(md_files=hit.md_files, assets=hit.assets),
+        )
+        return True
 
-            task = self.get_task(job.task_id)
-            if not task or task.status == "canceled":
-                self._q.task_done()
+    def _start_claiming(self) -> None:
+        for target, name in ((self._claim_loop, "claim"), (self._heartbeat, "heartbeat")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+    def _claim_loop(self) -> None:
+        assert self._work_queue
+        while not self._claiming_stopped.is_set():
+            # Claim only what idle workers can start now; the rest stays
+            # available to other worker processes.
+            room = self._worker_count - self._active - self._q.qsize()
+            rows: list[dict[str, Any]] = []
+            if room > 0:
+                try:
+                    rows = self._work_queue.claim(self._worker_id, room)
+                except sqlite3.Error:
+                    pass
+            if rows:
+                self._adopt(rows)
+            else:
+                self._claiming_stopped.wait(_CLAIM_IDLE_S if room > 0 else 0.05)
+
+    def _heartbeat(self) -> None:
+        # Keeps this worker's leases alive and picks up stopped tasks.
+        assert self._work_queue
+        renew_s = self._work_queue.lease_s / 3
+        last_renew = time.monotonic()
+        while not self._claiming_stopped.wait(1.0):
+            try:
+                if time.monotonic() - last_renew >= renew_s:
+                    self._work_queue.renew(self._worker_id)
+                    last_renew = time.monotonic()
+                with self._lock:
+                    held = list(self._held)
+                canceled = self._work_queue.canceled(held)
+            except sqlite3.Error:
                 continue
+            for task_id in canceled:
+                with self._lock:
+                    task = self._tasks.get(task_id)
+                if task:
+                    with task.lock:
+                        if task.status != "canceled":
+                            self._mark_canceled(task)
 
+    def _adopt(self, rows: list[dict[str, Any]]) -> None:
+        """Start on items claimed from the work queue."""
+        for row in rows:
+            job = _job_from_payload(row["payload"])
             with self._lock:
-                task.status = "running"
-                item = next((x for x in task.items if x.item_id == job.item_id), None)
+                if job.item_id in self._claims:
+                    continue
+                self._claims[job.item_id] = row["payload"]
+                self._held[job.task_id] = self._held.get(job.task_id, 0) + 1
+                task = self._tasks.get(job.task_id)
+                if task is None:
+                    # Local stand-in holding only the items claimed here.
+                    task = self._tasks[job.task_id] = Task(
+                        task_id=job.task_id, created_at=time.time()
+                    )
+            item = TaskItem(
+                item_id=job.item_id,
+                filename=job.filename,
+                relpath=job.relpath,
+                size=job.size,
+                output_dir=str(self._output_root / job.task_id),
+                local_path=job.local_path,
+            )
+            with task.lock:
+                task.add_item(item)
+                if row["canceled"] and task.status != "canceled":
+                    self._mark_canceled(task)
+            if task.status == "canceled":
+                self._land_flight(job, "canceled")
+            elif row["job_id"]:
+                # Submitted by a worker that went away: resume polling.
+                self._mark_running(task, job)
+                self._track_remote(
+                    job, row["job_id"].split(","), row["job_submitted_at"]
+                )
+            else:
+                self._dispatch(job)
+
+    def _report(
+        self, task: Task, item: TaskItem, *, landed: str = "", error: str = ""
+    ) -> None:
+        # Caller holds task.lock. Staged for the web process.
+        payload = self._claims.get(item.item_id)
+        if payload is None or not self._work_queue:
+            return
+        row: dict[str, Any] = {
+            "status": item.status,
+            "error": error or item.error,
+            "md_files": list(item.md_files),
+            "assets": list(item.assets),
+            "download_s": item.download_s,
+            "job_id": item.job_id,
+            "job_submitted_at": item.job_submitted_at,
+            "timings": dict(item.timings),
+            "upload_bytes": item.upload_bytes,
+            "job": payload,
+        }
+        if landed:
+            row["landed"] = landed
+        self._work_queue.report(task.task_id, item.item_id, row)
+
+    def _release_claim(self, job: EnqueuedItem, status: str, error: str) -> None:
+        # The claimed item is settled or dropped: report its final state and
+        # take it off the work queue.
+        assert self._work_queue
+        with self._lock:
+            task = self._tasks.get(job.task_id)
+        if task:
+            with task.lock:
+                item = task.find_item(job.item_id)
                 if item:
-                    item.status = "running"
+                    self._report(task, item, landed=status, error=error)
+        with self._lock:
+            if self._claims.pop(job.item_id, None) is None:
+                return
+            left = self._held.get(job.task_id, 0) - 1
+            if left > 0:
+                self._held[job.task_id] = left
+            else:
+                self._held.pop(job.task_id, None)
+                self._tasks.pop(job.task_id, None)
+        self._work_queue.finish(job.item_id)
+
+    def stop_claiming(self) -> None:
+        """Worker role: stop claiming and hand unfinished items back to the
+        work queue for other workers."""
+        if self._role != "worker" or not self._work_queue:
+            return
+        self._claiming_stopped.set()
+        self._work_queue.release(self._worker_id)
 
+    def _worker(self) -> None:
+        while not self._stop.is_set():
             try:
-                md_files, assets = self._process_one(job)
-                with self._lock:
-                    task.done += 1
-                    if item:
-                        item.status = "done"
-                        item.md_files = md_files
-                        item.assets = assets
-            except TaskCanceled:
-                with self._lock:
-                    # cancel_task() counts queued->canceled; running item gets counted here.
-                    if item and item.status != "canceled":
-                        item.status = "canceled"
-                        task.canceled += 1
-            except Exception as e:  # noqa: BLE001
-                with self._lock:
-                    task.failed += 1
-                    if item:
-                        item.status = "failed"
-                        item.error = str(e)
+                work = self._q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            with self._active_lock:
+                self._active += 1
+            try:
+                self._run_item(work)
             finally:
-                with self._lock:
-                    if (
-                        task.done + task.failed + task.canceled >= task.total
-                        and task.status != "canceled"
-                    ):
-                        task.status = "done" if task.failed == 0 else "failed"
-                self._q.task_done()
-
-    def _process_one(self, job: EnqueuedItem) -> tuple[list[str], list[str]]:
+                with self._active_lock:
+                    self._active -= 1
+
+    def _run_item(self, job: EnqueuedItem) -> None:
         task = self.get_task(job.task_id)
         if not task or task.status == "canceled":
-            raise TaskCanceled()
+            self._land_flight(job, "canceled")
+            return
+        self._wait_for_upstream(job)
+        if self._is_canceled(job.task_id):
+            self._land_flight(job, "canceled")
+            return
+        self._mark_running(task, job)
+        self._run_stage(job, lambda: self._process_one(job))
+
+    def _mark_running(self, task: Task, job: EnqueuedItem) -> None:
+        with task.lock:
+            task.status = "running"
+            item = task.find_item(job.item_id)
+            if item:
+                task.set_item_status(item, "running")
+                if job.enqueued_at:
+                    item.timings["queue_wait"] = max(0.0, time.time() - job.enqueued_at)
+            self._changed(task, item)
+
+    def _add_timings(self, job: EnqueuedItem, **seconds: float) -> None:
+        task = self.get_task(job.task_id)
+        if not task:
+            return
+        with task.lock:
+            item = task.find_item(job.item_id)
+            if item:
+                for stage, s in seconds.items():
+                    item.timings[stage] = item.timings.get(stage, 0.0) + max(0.0, s)
+
+    @contextmanager
+    def _timed(self, job: EnqueuedItem, stage: str) -> Iterator[None]:
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._add_timings(job, **{stage: time.monotonic() - t0})
+
+    def _add_materialize_timings(
+        self, job: EnqueuedItem, m: MaterializedItem, elapsed_s: float
+    ) -> None:
+        # Everything but the image downloads is markdown writing/merging.
+        self._add_timings(
+            job, asset_download=m.download_s, merge=elapsed_s - m.download_s
+        )
+
+    def _wait_for_upstream(self, job: EnqueuedItem) -> None:
+        # While the endpoint's circuit breaker is open the item stays queued
+        # (and this worker idle) instead of failing instantly.
+        endpoint = "job" if self._uses_async(job) else "sync"
+        while not self._stop.is_set() and not self._is_canceled(job.task_id):
+            wait_s = self._client.circuit_wait_s(endpoint)
+            if wait_s <= 0:
+                return
+            time.sleep(min(wait_s, 1.0))
+
+    @staticmethod
+    def _uses_async(job: EnqueuedItem) -> bool:
+        return job.force_async or guess_file_type(job.filename) == 0
+
+    def _run_stage(
+        self, job: EnqueuedItem, fn: Callable[[], Optional[MaterializedItem]]
+    ) -> None:
+        # fn() returns None when the item was handed off to the next stage.
+        try:
+            m = fn()
+        except TaskCanceled:
+            self._settle_item(job, status="canceled")
+        except Exception as e:  # noqa: BLE001
+            self._settle_item(job, status="failed", error=str(e))
+        else:
+            if m is not None:
+                self._settle_item(job, status="done", result=m)
+
+    def _settle_item(
+        self,
+        job: EnqueuedItem,
+        *,
+        status: str,
+        error: str = "",
+        result: Optional[MaterializedItem] = None,
+    ) -> None:
+        task = self.get_task(job.task_id)
+        if not task:
+            self._land_flight(job, status, error, result)
+            return
+        timings: dict[str, float] = {}
+        with task.lock:
+            item = task.find_item(job.item_id)
+            if item:
+                timings = dict(item.timings)
+                if status == "done" and result:
+                    item.md_files = result.md_files
+                    item.assets = result.assets
+                    item.download_s = result.download_s
+                elif status == "failed":
+                    item.error = error
+                task.set_item_status(item, status)
+            if (
+                task.done + task.failed + task.canceled >= task.total
+                and task.status != "canceled"
+            ):
+                task.status = "done" if task.failed == 0 else "failed"
+            self._changed(task, item)
+        metrics.ITEMS.inc(status=status)
+        if job.enqueued_at:
+            metrics.ITEM_SECONDS.observe(time.time() - job.enqueued_at, status=status)
+        for stage, seconds in timings.items():
+            metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+        self._land_flight(job, status, error, result)
+
+    def _is_canceled(self, task_id: str) -> bool:
+        return (self.get_task(task_id) or Task("", 0)).status == "canceled"
 
+    def _item_paths(self, job: EnqueuedItem) -> tuple[Path, Path, Path]:
         task_dir = ensure_dir(self._output_root / job.task_id)
+        item_dir = task_dir / safe_path_segment(job.item_id)
+        raw_path = task_dir / "raw" / f"{safe_path_segment(job.item_id)}.jsonl"
+        return task_dir, item_dir, raw_path
+
+    def _process_one(self, job: EnqueuedItem) -> Optional[MaterializedItem]:
+        if self._is_canceled(job.task_id):
+            raise TaskCanceled()
+
         # Input file is already written to output/{task_id}/inputs/... by server.
         src = Path(job.local_path)
         if not src.exists():
             raise RuntimeError(f"Input file missing: {src}")
 
-        dest_path = src
-
         file_type = guess_file_type(job.filename)
-        use_async = job.force_async or file_type == 0
-        md_files: list[str] = []
-        assets: list[str] = []
-        if use_async:
-            job_id = self._client.submit_job(
-                file_path=str(dest_path), options=job.options
+        use_async = self._uses_async(job)
+        _, item_dir, raw_path = self._item_paths(job)
+
+        cache_key = self._cache_key(job, "async" if use_async else "sync")
+        if self._cache:
+            hit = self._cache.get(cache_key, item_dir=item_dir, raw_path=raw_path)
+            if hit:
+                return MaterializedItem(md_files=hit.md_files, assets=hit.assets)
+
+        if use_async and file_type == 0 and self._shard_pages > 0:
+            shard_dir = self._item_paths(job)[0] / ".shards" / safe_path_segment(
+                job.item_id
             )
-            try:
-                job_data = self._client.poll_job(
-                    job_id=job_id,
-                    should_cancel=lambda: (
-                        self.get_task(job.task_id) or Task("", 0)
-                    ).status
-                    == "canceled",
+            shards = split_pdf(src, shard_dir, self._shard_pages)
+            if shards:
+                return self._process_sharded(job, shards, shard_dir, cache_key)
+
+        dest_path = self._prepare_upload(job, src)
+        try:
+            if use_async:
+                with self._timed(job, "upload"):
+                    job_id = self._client.submit_job(
+                        file_path=str(dest_path), options=job.options
+                    )
+                self._track_remote(job, [job_id], time.time(), cache_key)
+                return None
+
+            with self._timed(job, "remote"):
+                result = self._client.submit_sync_base64(
+                    file_path=str(dest_path), file_type=file_type, options=job.options
                 )
-            except RuntimeError as e:
-                if str(e) == "canceled":
-                    raise TaskCanceled() from e
-                raise
-            if (self.get_task(job.task_id) or Task("", 0)).status == "canceled":
-                raise TaskCanceled()
-            json_url = (job_data.get("resultUrl") or {}).get("jsonUrl")
-            if not json_url:
-                raise RuntimeError("Job completed but missing resultUrl.jsonUrl")
-            raw_dir = ensure_dir(task_dir / "raw")
-            jsonl_text = self._client.download_jsonl(jsonl_url=json_url)
-            (raw_dir / f"{safe_path_segment(job.item_id)}.jsonl").write_text(
-                jsonl_text, encoding="utf-8"
+        finally:
+            if dest_path != src:
+                shutil.rmtree(dest_path.parent, ignore_errors=True)
+        self._materialize_stage.put(
+            FetchedResult(job=job, pages=(result,), cache_key=cache_key, flat=True)
+        )
+        return None
+
+    def _process_sharded(
+        self,
+        job: EnqueuedItem,
+        shards: list[PdfShard],
+        shard_dir: Path,
+        cache_key: str,
+    ) -> Optional[MaterializedItem]:
+        """OCR the page-range shards of a long PDF concurrently.
+
+        In job mode the shards are handed to the poller, in sync mode the
+        results go straight to the materialize stage.
+        """
+        stage = "remote" if self._shard_mode == "sync" else "upload"
+        try:
+            workers = max(1, min(self._shard_concurrency, len(shards)))
+            with self._timed(job, stage), ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="shard"
+            ) as ex:
+                if self._shard_mode == "sync":
+                    results = list(
+                        ex.map(
+                            lambda sh: self._client.submit_sync_base64(
+                                file_path=str(sh.path),
+                                file_type=0,
+                                options=job.options,
+                            ),
+                            shards,
+                        )
+                    )
+                else:
+                    job_ids = list(
+                        ex.map(
+                            lambda sh: self._client.submit_job(
+                                file_path=str(sh.path), options=job.options
+                            ),
+                            shards,
+                        )
+                    )
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            try:
+                shard_dir.parent.rmdir()
+            except OSError:
+                pass  # other items are still sharding
+
+        if self._shard_mode != "sync":
+            self._track_remote(job, job_ids, time.time(), cache_key)
+            return None
+
+        self._materialize_stage.put(
+            FetchedResult(
+                job=job,
+                pages=tuple(self._split_sync_pages(results)),
+                cache_key=cache_key,
             )
-            pages = parse_jsonl_results(jsonl_text)
-            # Merge pages into a single materialization dir; keep page order.
-            for page_idx, page_result in enumerate(pages):
-                if (self.get_task(job.task_id) or Task("", 0)).status == "canceled":
-                    raise TaskCanceled()
-                out_dir = ensure_dir(
-                    task_dir / safe_path_segment(job.item_id) / f"page_{page_idx}"
-                )
-                m = materialize_result_to_dir(page_result, out_dir)
-                md_files.extend(m.md_files)
-                assets.extend(m.assets)
+        )
+        return None
+
+    @staticmethod
+    def _split_sync_pages(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        # Each sync result holds one layoutParsingResults entry per page;
+        # split them so the output matches the async page_{idx} layout.
+        return [
+            {"layoutParsingResults": [res]}
+            for r in results
+            for res in (r.get("layoutParsingResults") or [])
+        ]
+
+    def _cache_key(self, job: EnqueuedItem, mode: str) -> str:
+        if not self._cache:
+            return ""
+        return ResultCache.make_key(
+            file_sha256=job.sha256 or sha256_file(job.local_path),
+            options=job.options,
+            model=self._client.model,
+            mode=mode,
+            variant=self._prep_variant(job),
+        )
+
+    def _prep_dir(self, job: EnqueuedItem) -> Optional[Path]:
+        # Where the pre-processed copy of an image goes; None if it isn't done.
+        if not self._prep_pool or guess_file_type(job.filename) != 1:
+            return None
+        task_dir = self._item_paths(job)[0]
+        return task_dir / ".prep" / safe_path_segment(job.item_id)
 
-            merged_md = self._write_merged_markdown(
-                task_dir / safe_path_segment(job.item_id), md_files
+    def _prep_variant(self, job: EnqueuedItem) -> str:
+        return self.prep_variant(job.filename)
+
+    def prep_variant(self, filename: str) -> str:
+        """How an upload named ``filename`` is pre-processed; "" if it isn't."""
+        if not self._prep_pool or guess_file_type(filename) != 1:
+            return ""
+        o = self._prep_options
+        return f"prep:{o['max_side']}:{o['jpeg_quality']}"
+
+    def _prepare_upload(self, job: EnqueuedItem, src: Path) -> Path:
+        """Return the file to upload for ``job``: a downscaled, re-encoded
+        copy of an image when pre-processing is on, else ``src``."""
+        prep_dir = self._prep_dir(job)
+        out: Optional[str] = None
+        if prep_dir is not None:
+            assert self._prep_pool
+            with self._timed(job, "prep"):
+                try:
+                    out = self._prep_pool.submit(
+                        prepare_image, str(src), str(prep_dir), **self._prep_options
+                    ).result()
+                except Exception:  # noqa: BLE001
+                    # Pillow can't read it (or the pool died): send it as is.
+                    log.warning(
+                        "image pre-processing failed, uploading %s as is",
+                        src,
+                        exc_info=True,
+                    )
+                    out = None
+        return self._prepared(job, src, out)
+
+    def _prepared(self, job: EnqueuedItem, src: Path, out: Optional[str]) -> Path:
+        path = Path(out) if out else src
+        upload_bytes = path.stat().st_size
+        if self._prep_dir(job) is not None:
+            metrics.PREP_BYTES.inc(job.size, stage="before")
+            metrics.PREP_BYTES.inc(upload_bytes, stage="after")
+        task = self.get_task(job.task_id)
+        if task:
+            with task.lock:
+                item = task.find_item(job.item_id)
+                if item:
+                    item.upload_bytes = upload_bytes
+        return path
+
+    def _track_remote(
+        self,
+        job: EnqueuedItem,
+        job_ids: list[str],
+        submitted_at: float,
+        cache_key: str = "",
+    ) -> None:
+        """Hand submitted jobs (one per PDF shard) to the poller.
+
+        The item is materialized once every job is done, in ``job_ids``
+        order; the first failure fails the item and stops the others.
+        """
+        assert self._poller
+        self._record_remote(job, job_ids, submitted_at)
+        results: list[Optional[dict[str, Any]]] = [None] * len(job_ids)
+        state = {"remaining": len(job_ids), "failed": False}
+        group_lock = threading.Lock()
+
+        def on_done(idx: int, data: dict[str, Any]) -> None:
+            with group_lock:
+                if state["failed"]:
+                    return
+                results[idx] = data
+                state["remaining"] -= 1
+                if state["remaining"]:
+                    return
+            self._add_timings(job, remote=time.time() - submitted_at)
+            # Never block the poller thread: it serves every in-flight job.
+            self._fetch_stage.put(
+                RemoteJobDone(
+                    job=job,
+                    results=tuple(r for r in results if r is not None),
+                    cache_key=cache_key,
+                ),
+                block=False,
+            )
+
+        def on_error(exc: Exception) -> None:
+            with group_lock:
+                if state["failed"]:
+                    return
+                state["failed"] = True
+            self._on_remote_error(job, exc)
+
+        for idx, job_id in enumerate(job_ids):
+            self._poller.track(
+                job_id,
+                on_done=lambda data, idx=idx: on_done(idx, data),
+                on_error=on_error,
+                should_cancel=lambda: bool(state["failed"])
+                or self._is_canceled(job.task_id),
+                submitted_at=submitted_at,
             )
-            if merged_md:
-                md_files = [merged_md, *md_files]
+
+    def _record_remote(
+        self, job: EnqueuedItem, job_ids: list[str], submitted_at: float
+    ) -> None:
+        task = self.get_task(job.task_id)
+        if not task:
+            return
+        with task.lock:
+            item = task.find_item(job.item_id)
+            if item:
+                # Comma-separated for sharded PDFs.
+                item.job_id = ",".join(job_ids)
+                item.job_submitted_at = submitted_at
+                self._changed(task, item)
+
+    def _on_remote_error(self, job: EnqueuedItem, exc: Exception) -> None:
+        if isinstance(exc, RuntimeError) and str(exc) == "canceled":
+            self._settle_item(job, status="canceled")
         else:
-            if (self.get_task(job.task_id) or Task("", 0)).status == "canceled":
-                raise TaskCanceled()
-            file_bytes = dest_path.read_bytes()
-            result = self._client.submit_sync_base64(
-                file_bytes=file_bytes, file_type=file_type, options=job.options
+            self._settle_item(job, status="failed", error=str(exc))
+
+    def _fetch_remote(self, work: RemoteJobDone) -> MaterializedItem:
+        """Stream the JSONL result(s), teeing them to ``raw/`` and
+        materializing each page as soon as its line arrives, so memory
+        stays at about one page and early pages show up before the last
+        one has downloaded."""
+        job = work.job
+        if self._is_canceled(job.task_id):
+            raise TaskCanceled()
+        _, item_dir, raw_path = self._item_paths(job)
+        ensure_dir(raw_path.parent)
+        t0 = time.monotonic()
+        pages = _PageSink()
+        # Sharded PDFs have one result per shard; concatenate in page order.
+        with open(raw_path, "w", encoding="utf-8") as raw:
+            for job_data in work.results:
+                lines = self._client.stream_jsonl(jsonl_url=self._json_url(job_data))
+                with closing(lines):
+                    while True:
+                        t = time.monotonic()
+                        line = next(lines, None)
+                        pages.fetch_s += time.monotonic() - t
+                        if line is None:
+                            break
+                        raw.write(line + "\n")
+                        if self._is_canceled(job.task_id):
+                            raise TaskCanceled()
+                        pages.add(
+                            materialize_result_to_dir(
+                                parse_jsonl_line(line),
+                                ensure_dir(item_dir / f"page_{pages.count}"),
+                                http=self._client.http,
+                                max_workers=self._asset_concurrency,
+                            )
+                        )
+                        self._publish_pages(job, pages)
+
+        m = self._finish_pages(job, item_dir, pages, time.monotonic() - t0)
+        cache_key = work.cache_key or self._cache_key(job, "async")
+        self._cache_result(cache_key, item_dir, m, raw_path=raw_path)
+        return m
+
+    @staticmethod
+    def _json_url(job_data: dict[str, Any]) -> str:
+        json_url = (job_data.get("resultUrl") or {}).get("jsonUrl")
+        if not json_url:
+            raise RuntimeError("Job completed but missing resultUrl.jsonUrl")
+        return json_url
+
+    def _publish_pages(self, job: EnqueuedItem, pages: "_PageSink") -> None:
+        # Expose the pages written so far; the item is still running.
+        task = self.get_task(job.task_id)
+        if not task:
+            return
+        with task.lock:
+            item = task.find_item(job.item_id)
+            if item:
+                item.md_files = list(pages.md_files)
+                item.assets = list(pages.assets)
+                self._changed(task, item)
+
+    def _finish_pages(
+        self, job: EnqueuedItem, item_dir: Path, pages: "_PageSink", elapsed_s: float
+    ) -> MaterializedItem:
+        merged_md = self._write_merged_markdown(item_dir, pages.md_files)
+        md_files = [merged_md, *pages.md_files] if merged_md else pages.md_files
+        timings = {
+            "asset_download": pages.download_s,
+            "merge": elapsed_s - pages.fetch_s - pages.download_s,
+        }
+        if pages.fetch_s:
+            timings["result_download"] = pages.fetch_s
+        self._add_timings(job, **timings)
+        return MaterializedItem(
+            md_files=md_files, assets=pages.assets, download_s=pages.download_s
+        )
+
+    def _materialize(self, work: FetchedResult) -> MaterializedItem:
+        job = work.job
+        if self._is_canceled(job.task_id):
+            raise TaskCanceled()
+        _, item_dir, _ = self._item_paths(job)
+        if work.flat:
+            t0 = time.monotonic()
+            m = materialize_result_to_dir(
+                work.pages[0],
+                ensure_dir(item_dir),
+                http=self._client.http,
+                max_workers=self._asset_concurrency,
             )
-            out_dir = ensure_dir(task_dir / safe_path_segment(job.item_id))
-            m = materialize_result_to_dir(result, out_dir)
-            md_files.extend(m.md_files)
-            assets.extend(m.assets)
+            self._add_materialize_timings(job, m, time.monotonic() - t0)
+        else:
+            m = self._materialize_pages(job, list(work.pages))
+        self._cache_result(
+            work.cache_key, item_dir, m, result=work.pages[0] if work.flat else None
+        )
+        return m
 
-        return md_files, assets
+    def _cache_result(
+        self,
+        cache_key: str,
+        item_dir: Path,
+        m: MaterializedItem,
+        *,
+        raw_path: Optional[Path] = None,
+        result: Optional[dict[str, Any]] = None,
+    ) -> None:
+        if not self._cache or not cache_key:
+            return
+        self._cache.put(
+            cache_key,
+            item_dir=item_dir,
+            md_files=m.md_files,
+            assets=m.assets,
+            raw_path=raw_path,
+            result=result,
+        )
+
+    def _materialize_pages(
+        self, job: EnqueuedItem, pages: list[dict[str, Any]]
+    ) -> MaterializedItem:
+        _, item_dir, _ = self._item_paths(job)
+        t0 = time.monotonic()
+        sink = _PageSink()
+        # Merge pages into a single materialization dir; keep page order.
+        for page_result in pages:
+            if self._is_canceled(job.task_id):
+                raise TaskCanceled()
+            sink.add(
+                materialize_result_to_dir(
+                    page_result,
+                    ensure_dir(item_dir / f"page_{sink.count}"),
+                    http=self._client.http,
+                    max_workers=self._asset_concurrency,
+                )
+            )
+        return self._finish_pages(job, item_dir, sink, time.monotonic() - t0)
 
     def _write_merged_markdown(self, item_dir: Path, md_files: list[str]) -> str:
         # For multi-page PDFs, we materialize per-page md under item_dir/page_*/doc_*.md.
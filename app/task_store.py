@@ -0,0 +1,272 @@
+import atexit
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any
+
+from .utils import ensure_dir
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS items (
+    item_id TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    relpath TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    output_dir TEXT NOT NULL,
+    local_path TEXT NOT NULL,
+    force_async INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    sha256 TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    error TEXT NOT NULL DEFAULT '',
+    md_files TEXT NOT NULL DEFAULT '[]',
+    assets TEXT NOT NULL DEFAULT '[]',
+    download_s REAL NOT NULL DEFAULT 0,
+    job_id TEXT NOT NULL DEFAULT '',
+    job_submitted_at REAL NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    timings TEXT NOT NULL DEFAULT '{}',
+    upload_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS items_task ON items (task_id, seq);
+"""
+
+# Columns added after the first release; ALTERed into older databases.
+_MIGRATIONS = {
+    "tasks": {
+        "version": "INTEGER NOT NULL DEFAULT 0",
+        "priority": "INTEGER NOT NULL DEFAULT 0",
+        "accessed_at": "REAL NOT NULL DEFAULT 0",
+    },
+    "items": {
+        "version": "INTEGER NOT NULL DEFAULT 0",
+        "timings": "TEXT NOT NULL DEFAULT '{}'",
+        "upload_bytes": "INTEGER NOT NULL DEFAULT 0",
+    },
+}
+
+# Columns written once at enqueue time; later saves only update the rest.
+_ITEM_STATIC = (
+    "task_id",
+    "seq",
+    "filename",
+    "relpath",
+    "size",
+    "output_dir",
+    "local_path",
+    "force_async",
+    "options",
+    "sha256",
+)
+_ITEM_MUTABLE = (
+    "status",
+    "error",
+    "md_files",
+    "assets",
+    "download_s",
+    "job_id",
+    "job_submitted_at",
+    "version",
+    "timings",
+    "upload_bytes",
+)
+
+
+class TaskStore:
+    """SQLite (WAL) persistence for tasks, items and submitted job ids.
+
+    ``save_task``/``save_item`` only stage the latest row in memory; a
+    writer thread flushes staged rows in one transaction every
+    ``flush_interval_s`` so the worker hot path never waits on disk.
+    """
+
+    def __init__(self, path: str | Path, *, flush_interval_s: float = 0.5) -> None:
+        self._path = Path(path)
+        ensure_dir(self._path.parent)
+        self._flush_interval_s = float(flush_interval_s)
+        self._cond = threading.Condition()
+        self._tasks: dict[str, dict[str, Any]] = {}
+        self._items: dict[str, dict[str, Any]] = {}
+        self._deletes: set[str] = set()
+        self._closed = False
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        for table, columns in _MIGRATIONS.items():
+            have = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+            for name, decl in columns.items():
+                if name not in have:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        conn.commit()
+        conn.close()
+
+        self._thread = threading.Thread(
+            target=self._run, name="task-store", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self._path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def save_task(self, row: dict[str, Any]) -> None:
+        with self._cond:
+            self._tasks.setdefault(row["task_id"], {}).update(row)
+
+    def save_item(self, row: dict[str, Any]) -> None:
+        row = dict(row)
+        for key in ("md_files", "assets", "timings"):
+            if key in row and not isinstance(row[key], str):
+                row[key] = json.dumps(row[key], ensure_ascii=False)
+        if "options" in row and not isinstance(row["options"], str):
+            row["options"] = json.dumps(row["options"])
+        with self._cond:
+            self._items.setdefault(row["item_id"], {}).update(row)
+
+    def load(self) -> list[tuple[dict[str, Any], list[dict[str, Any]]]]:
+        conn = self._connect()
+        try:
+            tasks = [
+                dict(r) for r in conn.execute("SELECT * FROM tasks ORDER BY created_at")
+            ]
+            out = []
+            for t in tasks:
+                items = []
+                for r in conn.execute(
+                    "SELECT * FROM items WHERE task_id = ? ORDER BY seq", (t["task_id"],)
+                ):
+                    it = dict(r)
+                    it["md_files"] = json.loads(it["md_files"] or "[]")
+                    it["assets"] = json.loads(it["assets"] or "[]")
+                    it["options"] = json.loads(it["options"] or "{}")
+                    it["timings"] = json.loads(it["timings"] or "{}")
+                    it["force_async"] = bool(it["force_async"])
+                    items.append(it)
+                out.append((t, items))
+            return out
+        finally:
+            conn.close()
+
+    def delete_task(self, task_id: str) -> None:
+        # Applied by the writer after any rows staged before it.
+        with self._cond:
+            self._deletes.add(task_id)
+
+    def _run(self) -> None:
+        conn = self._connect()
+        try:
+            while True:
+                with self._cond:
+                    if not self._closed:
+                        self._cond.wait(timeout=self._flush_interval_s)
+                    tasks, self._tasks = self._tasks, {}
+                    items, self._items = self._items, {}
+                    deletes, self._deletes = self._deletes, set()
+                    closed = self._closed
+                if tasks or items or deletes:
+                    try:
+                        self._write(conn, tasks, items, deletes)
+                    except sqlite3.Error:
+                        # Locked past the timeout or disk full: put the batch
+                        # back under anything staged since and retry next round.
+                        self._requeue(tasks, items, deletes)
+                with self._cond:
+                    self._cond.notify_all()
+                if closed:
+                    return
+        finally:
+            conn.close()
+
+    def _requeue(
+        self,
+        tasks: dict[str, dict[str, Any]],
+        items: dict[str, dict[str, Any]],
+        deletes: set[str],
+    ) -> None:
+        with self._cond:
+            for staged, failed in ((self._tasks, tasks), (self._items, items)):
+                for key, row in failed.items():
+                    staged[key] = {**row, **staged.get(key, {})}
+            self._deletes |= deletes
+
+    @staticmethod
+    def _write(
+        conn: sqlite3.Connection,
+        tasks: dict[str, dict[str, Any]],
+        items: dict[str, dict[str, Any]],
+        deletes: set[str],
+    ) -> None:
+        with conn:
+            for row in tasks.values():
+                conn.execute(
+                    "INSERT INTO tasks "
+                    "(task_id, created_at, status, message, version, priority, "
+                    "accessed_at) "
+                    "VALUES (:task_id, :created_at, :status, :message, :version, "
+                    ":priority, :accessed_at) "
+                    "ON CONFLICT(task_id) DO UPDATE SET "
+                    "status = excluded.status, message = excluded.message, "
+                    "version = excluded.version, priority = excluded.priority, "
+                    "accessed_at = excluded.accessed_at",
+                    {
+                        "created_at": 0.0,
+                        "message": "",
+                        "version": 0,
+                        "priority": 0,
+                        "accessed_at": 0.0,
+                        **row,
+                    },
+                )
+            for item_id, row in items.items():
+                cols = [c for c in _ITEM_MUTABLE if c in row]
+                if all(c in row for c in _ITEM_STATIC):
+                    names = ["item_id", *_ITEM_STATIC, *cols]
+                    sql = (
+                        f"INSERT INTO items ({', '.join(names)}) "
+                        f"VALUES ({', '.join(':' + n for n in names)}) "
+                        "ON CONFLICT(item_id) DO UPDATE SET "
+                        + ", ".join(f"{c} = excluded.{c}" for c in cols or ["status"])
+                    )
+                elif cols:
+                    sql = (
+                        f"UPDATE items SET {', '.join(f'{c} = :{c}' for c in cols)} "
+                        "WHERE item_id = :item_id"
+                    )
+                else:
+                    continue
+                conn.execute(sql, {**row, "item_id": item_id})
+            for task_id in deletes:
+                conn.execute("DELETE FROM items WHERE task_id = ?", (task_id,))
+                conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def flush(self) -> None:
+        with self._cond:
+            if self._closed or not (self._tasks or self._items or self._deletes):
+                return
+            self._cond.notify_all()
+            self._cond.wait(timeout=5)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
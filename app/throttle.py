@@ -0,0 +1,155 @@
+import threading
+import time
+from typing import Any, Optional
+
+
+class TokenBucket:
+    """Client-side request rate limit shared by every OCR API call.
+
+    ``acquire()`` reserves a token and sleeps until it is due, so callers
+    are spaced out in arrival order without busy-waiting. ``rate_per_s <= 0``
+    disables the rate limit; ``pause()`` (e.g. from a Retry-After header)
+    still applies.
+    """
+
+    def __init__(self, *, rate_per_s: float = 0.0, burst: Optional[float] = None) -> None:
+        self._rate = max(0.0, float(rate_per_s))
+        self._burst = max(1.0, float(burst if burst is not None else self._rate or 1.0))
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._waits = 0
+        self._waited_s = 0.0
+
+    def acquire(self) -> float:
+        wait_s = self.reserve()
+        if wait_s > 0:
+            time.sleep(wait_s)
+        return wait_s
+
+    def reserve(self) -> float:
+        """Take a token now and return how long the caller must wait for it
+        (for callers that sleep themselves, e.g. ``asyncio.sleep``)."""
+        with self._lock:
+            now = time.monotonic()
+            wait_s = max(0.0, self._paused_until - now)
+            if self._rate > 0:
+                self._tokens = min(
+                    self._burst, self._tokens + (now - self._updated) * self._rate
+                )
+                self._updated = now
+                self._tokens -= 1.0
+                if self._tokens < 0:
+                    wait_s = max(wait_s, -self._tokens / self._rate)
+            if wait_s > 0:
+                self._waits += 1
+                self._waited_s += wait_s
+        return wait_s
+
+    def pause(self, seconds: float) -> None:
+        # Upstream asked us to back off: hold every caller for ``seconds``.
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "ratePerS": self._rate,
+                "burst": self._burst,
+                "waits": self._waits,
+                "waitedSeconds": round(self._waited_s, 3),
+            }
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent OCR requests.
+
+    The limit grows by ``1/limit`` per successful request made while the
+    limiter was saturated (about +1 per round trip), and is multiplied by
+    ``decrease`` when upstream throttles, errors out or exceeds
+    ``latency_target_s``. Decreases are spaced by ``cooldown_s`` so one burst
+    of 429s only backs off once.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int,
+        decrease: float = 0.5,
+        latency_target_s: float = 0.0,
+        cooldown_s: float = 2.0,
+    ) -> None:
+        self._min = max(1, int(min_limit))
+        self._max = max(self._min, int(max_limit))
+        self._limit = float(min(self._max, max(self._min, int(initial))))
+        self._decrease = min(0.95, max(0.1, float(decrease)))
+        self._latency_target_s = max(0.0, float(latency_target_s))
+        self._cooldown_s = max(0.0, float(cooldown_s))
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._latency_ewma = 0.0
+        self._throttled = 0
+        self._decreases = 0
+
+    def acquire(self) -> tuple[float, bool]:
+        """Block until a slot is free; returns a token for ``release()``."""
+        with self._cond:
+            while (token := self._take()) is None:
+                self._cond.wait()
+        return token
+
+    def try_acquire(self) -> Optional[tuple[float, bool]]:
+        # Non-blocking variant; callers on an event loop wait themselves.
+        with self._cond:
+            return self._take()
+
+    def _take(self) -> Optional[tuple[float, bool]]:
+        # Caller holds self._cond.
+        if self._in_flight >= int(self._limit):
+            return None
+        self._in_flight += 1
+        return time.monotonic(), self._in_flight >= int(self._limit)
+
+    def release(
+        self, token: tuple[float, bool], *, ok: bool = True, overloaded: bool = False
+    ) -> None:
+        """Return a slot. ``overloaded`` marks throttling or upstream errors;
+        ``ok=False`` without it (e.g. a bad request) leaves the limit alone."""
+        started, saturated = token
+        latency_s = time.monotonic() - started
+        with self._cond:
+            self._in_flight -= 1
+            if ok and not overloaded:
+                self._latency_ewma = (
+                    latency_s
+                    if not self._latency_ewma
+                    else 0.8 * self._latency_ewma + 0.2 * latency_s
+                )
+                if self._latency_target_s and latency_s > self._latency_target_s:
+                    overloaded = True
+            if overloaded:
+                self._throttled += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self._cooldown_s:
+                    self._last_decrease = now
+                    self._limit = max(float(self._min), self._limit * self._decrease)
+                    self._decreases += 1
+            elif ok and saturated:
+                self._limit = min(float(self._max), self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "minLimit": self._min,
+                "maxLimit": self._max,
+                "inFlight": self._in_flight,
+                "latencyEwmaS": round(self._latency_ewma, 3),
+                "throttled": self._throttled,
+                "decreases": self._decreases,
+            }
@@ -0,0 +1,179 @@
+import hashlib
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Callable, Optional, Union
+
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from .utils import ensure_dir
+
+
+_MAX_FIELD_BYTES = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class FormField:
+    name: str
+    value: str
+
+
+@dataclass(frozen=True)
+class SpooledFile:
+    name: str
+    filename: str
+    content_type: str
+    path: Path
+    size: int
+    sha256: str
+
+
+class _Part:
+    def __init__(self) -> None:
+        self.headers: dict[bytes, bytes] = {}
+        self.header_field = b""
+        self.header_value = b""
+        self.name = ""
+        self.filename: Optional[str] = None
+        self.content_type = ""
+        self.value = bytearray()
+        self.path: Optional[Path] = None
+        self.fh: Optional[BinaryIO] = None
+        self.size = 0
+        self.hasher = hashlib.sha256()
+
+
+async def iter_multipart(
+    request: Request,
+    *,
+    spool_dir: Path,
+    max_file_bytes: int,
+    max_total_bytes: int,
+    check_file: Optional[Callable[[str, str], Optional[str]]] = None,
+) -> AsyncIterator[Union[FormField, SpooledFile]]:
+    """Parse a multipart body as it arrives, yielding each completed part.
+
+    File parts are written to ``spool_dir`` chunk by chunk while their
+    sha256 is computed, so memory stays bounded regardless of upload size.
+    Size limits are enforced as bytes arrive. ``check_file(filename,
+    content_type)`` may return an error message to reject a file before
+    any of its body is stored. Spool files of yielded parts belong to the
+    caller; everything else is removed on error.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(400, "请求必须是 multipart/form-data")
+
+    ensure_dir(spool_dir)
+    ready: list[Union[FormField, SpooledFile]] = []
+    part = _Part()
+    total = 0
+
+    def on_part_begin() -> None:
+        nonlocal part
+        part = _Part()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        part.header_field += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        part.header_value += data[start:end]
+
+    def on_header_end() -> None:
+        part.headers[part.header_field.lower()] = part.header_value
+        part.header_field = b""
+        part.header_value = b""
+
+    def on_headers_finished() -> None:
+        _, disp = parse_options_header(part.headers.get(b"content-disposition", b""))
+        part.name = disp.get(b"name", b"").decode("utf-8", errors="replace")
+        if b"filename" not in disp:
+            return
+        part.filename = disp[b"filename"].decode("utf-8", errors="replace")
+        part.content_type = part.headers.get(b"content-type", b"").decode(
+            "latin-1"
+        )
+        if check_file:
+            error = check_file(part.filename, part.content_type)
+            if error:
+                raise UploadRejected(400, error)
+        part.path = spool_dir / uuid.uuid4().hex
+        part.fh = open(part.path, "wb")
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        nonlocal total
+        chunk = data[start:end]
+        if part.fh is None:
+            part.value += chunk
+            if len(part.value) > _MAX_FIELD_BYTES:
+                raise UploadRejected(413, f"表单字段过大：{part.name}")
+            return
+        part.size += len(chunk)
+        total += len(chunk)
+        if part.size > max_file_bytes:
+            raise UploadRejected(413, f"单个文件过大：{part.filename}")
+        if total > max_total_bytes:
+            raise UploadRejected(413, "上传总大小超限")
+        part.hasher.update(chunk)
+        # Local-disk writes of one network chunk; cheap enough to do inline.
+        part.fh.write(chunk)
+
+    def on_part_end() -> None:
+        if part.fh is None:
+            ready.append(
+                FormField(
+                    name=part.name,
+                    value=part.value.decode("utf-8", errors="replace"),
+                )
+            )
+            return
+        part.fh.close()
+        part.fh = None
+        assert part.path is not None
+        ready.append(
+            SpooledFile(
+                name=part.name,
+                filename=part.filename or "",
+                content_type=part.content_type,
+                path=part.path,
+                size=part.size,
+                sha256=part.hasher.hexdigest(),
+            )
+        )
+        part.path = None
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            while ready:
+                yield ready.pop(0)
+        parser.finalize()
+        while ready:
+            yield ready.pop(0)
+    finally:
+        # Only an unfinished part can still own a spool file here.
+        if part.fh is not None:
+            part.fh.close()
+        if part.path is not None:
+            part.path.unlink(missing_ok=True)
@@ -1,6 +1,7 @@
 import hashlib
 import os
 import re
+import shutil
 from pathlib import Path
 
 
@@ -24,6 +25,46 @@ def sha256_hex(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 
+def sha256_file(path: str | Path, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def link_or_copy(src: str | Path, dst: str | Path) -> None:
+    # Hardlink when possible (same filesystem); fall back to a real copy.
+    dst = Path(dst)
+    ensure_dir(dst.parent)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def link_or_copy_tree(src: str | Path, dst: str | Path) -> None:
+    src = Path(src)
+    dst = Path(dst)
+    for p in src.rglob("*"):
+        if p.is_dir():
+            continue
+        link_or_copy(p, dst / p.relative_to(src))
+
+
+def dir_size(path: str | Path) -> int:
+    total = 0
+    for p in Path(path).rglob("*"):
+        try:
+            if p.is_file():
+                total += p.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
 def guess_file_type(filename: str) -> int:
     # API uses: PDF=0, image=1
     lower = filename.lower()
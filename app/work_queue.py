@@ -0,0 +1,431 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from .utils import ensure_dir
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS work (
+    item_id TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    rank INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    job_id TEXT NOT NULL DEFAULT '',
+    job_submitted_at REAL NOT NULL DEFAULT 0,
+    worker TEXT NOT NULL DEFAULT '',
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS work_next ON work (worker, priority DESC, rank, seq);
+CREATE INDEX IF NOT EXISTS work_task ON work (task_id);
+CREATE TABLE IF NOT EXISTS task_turns (
+    task_id TEXT PRIMARY KEY,
+    next_rank INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS canceled (
+    task_id TEXT PRIMARY KEY,
+    canceled_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reports (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    row TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class WorkQueue:
+    """Work queue shared by the web process and worker processes (SQLite, WAL).
+
+    The web process ``put()``s items; workers ``claim()`` them under a
+    lease they keep renewing, so items of a worker that died are claimed
+    again once the lease runs out (resuming polling if a job was already
+    submitted). Workers ``report()`` item changes back and ``finish()``
+    items once settled; the web process applies the reports in order.
+
+    Claims follow ``FairScheduler``: higher priority first, tasks of equal
+    priority take turns. Writes are staged and flushed by a writer thread
+    every ``flush_interval_s``, in order, one transaction per flush.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        lease_s: float = 60.0,
+        flush_interval_s: float = 0.1,
+    ) -> None:
+        self._path = Path(path)
+        ensure_dir(self._path.parent)
+        self.lease_s = max(5.0, float(lease_s))
+        self._flush_interval_s = float(flush_interval_s)
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._ops: list[Callable[[sqlite3.Connection], None]] = []
+        # item_id -> (task_id, latest report row), coalesced until flushed.
+        self._reports: dict[str, tuple[str, dict[str, Any]]] = {}
+        # True while the writer holds a batch it took off the staging lists.
+        self._writing = False
+        self._closed = False
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+        self._thread = threading.Thread(
+            target=self._run, name="work-queue", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections aren't shareable.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self._path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _stage(self, op: Callable[[sqlite3.Connection], None]) -> None:
+        with self._cond:
+            self._ops.append(op)
+            self._cond.notify_all()
+
+    # Web process side.
+
+    def put(
+        self,
+        *,
+        item_id: str,
+        task_id: str,
+        payload: dict[str, Any],
+        priority: int = 0,
+        job_id: str = "",
+        job_submitted_at: float = 0.0,
+    ) -> None:
+        """Queue an item; a no-op if it is queued or claimed already."""
+        row = {
+            "item_id": item_id,
+            "task_id": task_id,
+            "priority": int(priority),
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "job_id": job_id,
+            "job_submitted_at": job_submitted_at,
+        }
+
+        def op(conn: sqlite3.Connection) -> None:
+            # Start-time fair queuing: an item's rank is one past its task's
+            # previous item, but never below the rank being served now, so a
+            # new task takes turns with older ones instead of waiting behind
+            # them (or jumping ahead of all their remaining items).
+            served = self._meta(conn, "served")
+            r = conn.execute(
+                "SELECT next_rank FROM task_turns WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            rank = max(r["next_rank"] if r else 0, served)
+            seq = self._meta(conn, "seq") + 1
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO work "
+                "(item_id, task_id, priority, rank, seq, payload, job_id, "
+                "job_submitted_at) VALUES (:item_id, :task_id, :priority, :rank, "
+                ":seq, :payload, :job_id, :job_submitted_at)",
+                {**row, "rank": rank, "seq": seq},
+            )
+            if cur.rowcount:
+                self._set_meta(conn, "seq", seq)
+                conn.execute(
+                    "INSERT INTO task_turns (task_id, next_rank) VALUES (?, ?) "
+                    "ON CONFLICT(task_id) DO UPDATE SET next_rank = excluded.next_rank",
+                    (task_id, rank + 1),
+                )
+
+        self._stage(op)
+
+    def promote(self, item_id: str, *, task_id: str, priority: int) -> None:
+        """Serve a still-queued item no later than a new item of ``task_id``
+        at ``priority`` would be."""
+
+        def op(conn: sqlite3.Connection) -> None:
+            served = self._meta(conn, "served")
+            r = conn.execute(
+                "SELECT next_rank FROM task_turns WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            rank = max(r["next_rank"] if r else 0, served)
+            conn.execute(
+                "UPDATE work SET "
+                "rank = CASE WHEN priority > :priority THEN rank "
+                "WHEN priority < :priority THEN :rank ELSE MIN(rank, :rank) END, "
+                "priority = MAX(priority, :priority) "
+                "WHERE item_id = :item_id AND worker = ''",
+                {"item_id": item_id, "priority": int(priority), "rank": rank},
+            )
+
+        self._stage(op)
+
+    def reprioritize(self, task_id: str, priority: int) -> None:
+        self._stage(
+            lambda conn: conn.execute(
+                "UPDATE work SET priority = ? WHERE task_id = ?",
+                (int(priority), task_id),
+            )
+        )
+
+    def cancel_task(self, task_id: str) -> None:
+        # Queued items stay until a worker claims and drops them, so any
+        # identical items waiting on them are released the usual way.
+        now = time.time()
+        self._stage(
+            lambda conn: conn.execute(
+                "INSERT OR IGNORE INTO canceled (task_id, canceled_at) VALUES (?, ?)",
+                (task_id, now),
+            )
+        )
+
+    def forget_task(self, task_id: str) -> None:
+        def op(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM canceled WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM task_turns WHERE task_id = ?", (task_id,))
+
+        self._stage(op)
+
+    def read_reports(
+        self, after: int, limit: int = 500
+    ) -> list[tuple[int, str, str, dict[str, Any]]]:
+        """(seq, task_id, item_id, row) of reports after ``after``, in order."""
+        rows = self._conn().execute(
+            "SELECT seq, task_id, item_id, row FROM reports WHERE seq > ? "
+            "ORDER BY seq LIMIT ?",
+            (after, limit),
+        )
+        return [(r["seq"], r["task_id"], r["item_id"], json.loads(r["row"])) for r in rows]
+
+    def ack_reports(self, upto: int) -> None:
+        self._stage(
+            lambda conn: conn.execute("DELETE FROM reports WHERE seq <= ?", (upto,))
+        )
+
+    def depth(self) -> int:
+        r = self._conn().execute(
+            "SELECT COUNT(*) AS n FROM work WHERE worker = ''"
+        ).fetchone()
+        return int(r["n"])
+
+    def stats(self) -> dict[str, Any]:
+        now = time.time()
+        conn = self._conn()
+        queued = running = 0
+        workers = set()
+        for r in conn.execute(
+            "SELECT worker, lease_until >= ? AS live, COUNT(*) AS n FROM work "
+            "GROUP BY worker, live",
+            (now,),
+        ):
+            if r["worker"] and r["live"]:
+                running += r["n"]
+                workers.add(r["worker"])
+            else:
+                queued += r["n"]
+        return {
+            "queued": queued,
+            "claimed": running,
+            "workers": len(workers),
+            "leaseSeconds": self.lease_s,
+        }
+
+    # Worker process side.
+
+    def claim(self, worker: str, limit: int) -> list[dict[str, Any]]:
+        """Lease up to ``limit`` items to ``worker``, best first.
+
+        Returns rows with ``payload``, ``job_id``, ``job_submitted_at``
+        and ``canceled`` (its task was stopped; the item is to be dropped).
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT w.item_id, w.task_id, w.rank, w.payload, w.job_id, "
+                "w.job_submitted_at, c.task_id IS NOT NULL AS canceled "
+                "FROM work w LEFT JOIN canceled c ON c.task_id = w.task_id "
+                "WHERE w.worker = '' OR w.lease_until < ? "
+                "ORDER BY canceled DESC, w.priority DESC, w.rank, w.seq LIMIT ?",
+                (now, int(limit)),
+            ).fetchall()
+            for r in rows:
+                conn.execute(
+                    "UPDATE work SET worker = ?, lease_until = ? WHERE item_id = ?",
+                    (worker, now + self.lease_s, r["item_id"]),
+                )
+            if rows:
+                served = max(r["rank"] for r in rows)
+                if served > self._meta(conn, "served"):
+                    self._set_meta(conn, "served", served)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [
+            {
+                "item_id": r["item_id"],
+                "task_id": r["task_id"],
+                "payload": json.loads(r["payload"]),
+                "job_id": r["job_id"],
+                "job_submitted_at": r["job_submitted_at"],
+                "canceled": bool(r["canceled"]),
+            }
+            for r in rows
+        ]
+
+    def renew(self, worker: str) -> None:
+        self._conn().execute(
+            "UPDATE work SET lease_until = ? WHERE worker = ?",
+            (time.time() + self.lease_s, worker),
+        )
+
+    def canceled(self, task_ids: list[str]) -> list[str]:
+        if not task_ids:
+            return []
+        marks = ",".join("?" * len(task_ids))
+        rows = self._conn().execute(
+            f"SELECT task_id FROM canceled WHERE task_id IN ({marks})", task_ids
+        )
+        return [r["task_id"] for r in rows]
+
+    def report(self, task_id: str, item_id: str, row: dict[str, Any]) -> None:
+        # Runs under the task lock on the worker hot path: staged only.
+        with self._cond:
+            prev = self._reports.get(item_id)
+            self._reports[item_id] = (task_id, {**prev[1], **row} if prev else row)
+            self._cond.notify_all()
+
+    def finish(self, item_id: str) -> None:
+        """Drop a settled item; flushed after its last report."""
+
+        def op(conn: sqlite3.Connection) -> None:
+            r = conn.execute(
+                "SELECT task_id FROM work WHERE item_id = ?", (item_id,)
+            ).fetchone()
+            conn.execute("DELETE FROM work WHERE item_id = ?", (item_id,))
+            if r and not conn.execute(
+                "SELECT 1 FROM work WHERE task_id = ? LIMIT 1", (r["task_id"],)
+            ).fetchone():
+                conn.execute("DELETE FROM task_turns WHERE task_id = ?", (r["task_id"],))
+
+        self._stage(op)
+
+    def release(self, worker: str) -> None:
+        """Hand everything ``worker`` still holds back to the queue."""
+        self.flush()
+        self._conn().execute(
+            "UPDATE work SET worker = '', lease_until = 0 WHERE worker = ?", (worker,)
+        )
+
+    # Writer.
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, key: str) -> int:
+        r = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(r["value"]) if r else 0
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, key: str, value: int) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, int(value)),
+        )
+
+    def _run(self) -> None:
+        conn = self._conn()
+        while True:
+            with self._cond:
+                if not self._closed and not (self._ops or self._reports):
+                    self._cond.wait()
+                closed = self._closed
+            if not closed:
+                # Let a burst of changes collect into one transaction.
+                time.sleep(self._flush_interval_s)
+            with self._cond:
+                ops, self._ops = self._ops, []
+                reports, self._reports = self._reports, {}
+                self._writing = True
+            if ops or reports:
+                try:
+                    self._write(conn, ops, reports)
+                except sqlite3.Error:
+                    # Locked for longer than the busy timeout; retry next round.
+                    with self._cond:
+                        self._ops[:0] = ops
+                        for item_id, (task_id, row) in reports.items():
+                            newer = self._reports.get(item_id)
+                            merged = {**row, **newer[1]} if newer else row
+                            self._reports[item_id] = (task_id, merged)
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+            if closed:
+                return
+
+    @staticmethod
+    def _write(
+        conn: sqlite3.Connection,
+        ops: list[Callable[[sqlite3.Connection], None]],
+        reports: dict[str, tuple[str, dict[str, Any]]],
+    ) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Reports go first: an item finished in this batch must not
+            # disappear from the queue before its final state is recorded.
+            for item_id, (task_id, row) in reports.items():
+                conn.execute(
+                    "INSERT INTO reports (task_id, item_id, row) VALUES (?, ?, ?)",
+                    (task_id, item_id, json.dumps(row, ensure_ascii=False)),
+                )
+                if row.get("job_id"):
+                    # A worker taking this item over resumes polling instead
+                    # of submitting it again.
+                    conn.execute(
+                        "UPDATE work SET job_id = ?, job_submitted_at = ? "
+                        "WHERE item_id = ?",
+                        (row["job_id"], row.get("job_submitted_at", 0.0), item_id),
+                    )
+            for op in ops:
+                op(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flush(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            while self._ops or self._reports or self._writing:
+                self._cond.notify_all()
+                if not self._cond.wait(timeout=5):
+                    return
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
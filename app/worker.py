@@ -0,0 +1,97 @@
+"""OCR worker process for the multi-process mode.
+
+Claims items from the shared work queue (``WORK_QUEUE_PATH``) and runs
+them with the configured engine, reporting progress back to the web
+process, which then only accepts uploads and serves status. Started by
+the server with ``WORKER_PROCESSES`` > 0, or on its own (e.g. the compose
+worker service) with ``EXTERNAL_WORKERS=1`` set for the server.
+
+    python -m app.worker
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+from typing import Optional
+
+from .async_task_queue import AsyncTaskQueue
+from .config import settings
+from .engine import make_engine
+from .task_queue import TaskQueue
+
+
+def spawn_workers(count: int) -> list[subprocess.Popen]:
+    # Same interpreter and environment as the server; they exit with it.
+    cmd = [sys.executable, "-m", "app.worker", "--parent-pid", str(os.getpid())]
+    return [subprocess.Popen(cmd) for _ in range(count)]
+
+
+def stop_workers(procs: list[subprocess.Popen], timeout_s: float = 10.0) -> None:
+    for p in procs:
+        if p.poll() is None:
+            p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=timeout_s)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def _watch_parent(pid: int, stop: threading.Event) -> None:
+    # Don't outlive a server that was killed without stopping its workers.
+    while not stop.wait(1.0):
+        if os.getppid() != pid:
+            stop.set()
+
+
+async def _run_async(queue: AsyncTaskQueue, stop: threading.Event) -> None:
+    await queue.start()
+    try:
+        await asyncio.to_thread(stop.wait)
+    finally:
+        queue.stop_claiming()
+        await queue.stop()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="python -m app.worker", description="OCR 工作进程：从共享队列领取文件并识别"
+    )
+    ap.add_argument("--engine", choices=("threads", "asyncio"), help="默认取 ENGINE")
+    ap.add_argument("--parent-pid", type=int, default=0, help="该进程退出时随之退出")
+    args = ap.parse_args(argv)
+    if args.engine:
+        settings.engine = args.engine
+    settings.validate()
+
+    # No task store or result cache: the web process owns both. Results
+    # reach it as reports through the work queue and it caches them there.
+    _, queue = make_engine(cache=None, store=None, role="worker")
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    if args.parent_pid:
+        threading.Thread(
+            target=_watch_parent, args=(args.parent_pid, stop), daemon=True
+        ).start()
+    print(
+        f"OCR worker 已启动：engine={settings.engine} 队列={settings.work_queue_path}",
+        flush=True,
+    )
+
+    if isinstance(queue, AsyncTaskQueue):
+        asyncio.run(_run_async(queue, stop))
+        return 0
+    assert isinstance(queue, TaskQueue)
+    while not stop.wait(1.0):
+        pass
+    queue.stop_claiming()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os
+import uuid
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from .task_queue import Task
+from .utils import ensure_dir, safe_path_segment, sha256_hex
+
+
+ZIP_KINDS = ("all", "markdown", "raw")
+
+_CHUNK_BYTES = 256 * 1024
+# Already-compressed formats: DEFLATE costs CPU and saves nothing.
+_STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".pdf", ".zip"}
+# Per-task directories that never belong in an export.
+_SKIP_DIRS = {".upload", ".shards", ".prep"}
+
+
+class _StreamSink:
+    """Write-only, unseekable file object that zipfile streams into."""
+
+    def __init__(self, tee: Optional[BinaryIO] = None) -> None:
+        self._buf = bytearray()
+        self._tee = tee
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        if self._tee:
+            self._tee.write(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def take(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def select_files(
+    task_dir: Path,
+    task: Optional[Task],
+    *,
+    item_ids: Optional[list[str]] = None,
+    kind: str = "all",
+) -> list[tuple[Path, str]]:
+    """Return ``(path, arcname)`` pairs for an export, sorted by arcname."""
+    wanted = set(item_ids or [])
+    roots: list[Path] = []
+    if wanted:
+        for item_id in sorted(wanted):
+            seg = safe_path_segment(item_id)
+            if kind in ("all", "markdown"):
+                roots.append(task_dir / seg)
+            if kind in ("all", "raw"):
+                roots.append(task_dir / "raw" / f"{seg}.jsonl")
+        if kind == "all" and task:
+            for item_id in wanted:
+                it = task.find_item(item_id)
+                if it and it.local_path:
+                    roots.append(Path(it.local_path))
+    elif kind == "raw":
+        roots.append(task_dir / "raw")
+    else:
+        roots.append(task_dir)
+
+    out: dict[str, Path] = {}
+    for root in roots:
+        paths: Iterable[Path] = [root] if root.is_file() else root.rglob("*")
+        for p in paths:
+            if not p.is_file():
+                continue
+            try:
+                rel = p.relative_to(task_dir)
+            except ValueError:
+                continue
+            if rel.parts and rel.parts[0] in _SKIP_DIRS:
+                continue
+            if kind == "markdown" and p.suffix.lower() != ".md":
+                continue
+            out[rel.as_posix()] = p
+    return [(p, arc) for arc, p in sorted(out.items())]
+
+
+def iter_zip(
+    files: list[tuple[Path, str]], *, cache_path: Optional[Path] = None
+) -> Iterator[bytes]:
+    """Yield a ZIP archive of ``files`` as it is built.
+
+    When ``cache_path`` is given the archive is also written there; the
+    file only appears once the archive is complete.
+    """
+    tmp_path: Optional[Path] = None
+    tee: Optional[BinaryIO] = None
+    if cache_path:
+        ensure_dir(cache_path.parent)
+        tmp_path = cache_path.with_name(f".{uuid.uuid4().hex}.part")
+        tee = open(tmp_path, "wb")
+    sink = _StreamSink(tee)
+    complete = False
+    try:
+        with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:  # type: ignore[arg-type]
+            for path, arcname in files:
+                try:
+                    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+                    src = open(path, "rb")
+                except OSError:
+                    # Removed since listing (e.g. by the janitor); skip it.
+                    continue
+                zinfo.compress_type = (
+                    zipfile.ZIP_STORED
+                    if path.suffix.lower() in _STORED_SUFFIXES
+                    else zipfile.ZIP_DEFLATED
+                )
+                # Sizes can't be patched afterwards on an unseekable stream.
+                zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+                with src, zf.open(zinfo, "w", force_zip64=zip64) as dst:
+                    while chunk := src.read(_CHUNK_BYTES):
+                        dst.write(chunk)
+                        if len(sink) >= _CHUNK_BYTES:
+                            yield sink.take()
+                if len(sink):
+                    yield sink.take()
+        yield sink.take()
+        complete = True
+    finally:
+        if tee:
+            tee.close()
+        if tmp_path:
+            if complete and cache_path:
+                os.replace(tmp_path, cache_path)
+            else:
+                tmp_path.unlink(missing_ok=True)
+
+
+def cache_path_for(
+    cache_root: Path,
+    task_id: str,
+    *,
+    version: int,
+    item_ids: Optional[list[str]] = None,
+    kind: str = "all",
+) -> Path:
+    variant = sha256_hex(f"{kind}|{','.join(sorted(item_ids or []))}".encode())[:16]
+    return cache_root / safe_path_segment(task_id) / f"{variant}-v{version}.zip"
+
+
+def drop_stale(cache_path: Path) -> None:
+    # Remove older versions of the same export variant.
+    variant = cache_path.name.split("-v", 1)[0]
+    for p in cache_path.parent.glob(f"{variant}-v*.zip"):
+        if p != cache_path:
+            p.unlink(missing_ok=True)
@@ -0,0 +1,217 @@
+"""Local stand-in for the PaddleOCR-VL endpoints used by the benchmarks.
+
+Serves the sync endpoint (``POST /sync``), job submit/poll
+(``POST /jobs``, ``GET /jobs/{id}``), JSONL results (``GET /jsonl/{id}``)
+and page images (``GET /img/...``) with configurable latency, page and
+image counts and error rate. Run standalone with
+``python -m bench.mock_api --port 18900`` or start it in-process via
+``MockApi(...).start()``.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+
+@dataclass
+class MockConfig:
+    sync_latency_ms: float = 200.0  # time to answer POST /sync
+    job_ms: float = 2000.0  # time until a submitted job reports "done"
+    api_latency_ms: float = 20.0  # submit/poll/JSONL response time
+    pages: int = 3  # pages per PDF result (images always have 1)
+    images_per_page: int = 2
+    image_bytes: int = 20_000
+    image_latency_ms: float = 10.0
+    error_rate: float = 0.0  # share of API calls answered with 503
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counts: dict[str, int] = {}
+
+    def add(self, key: str) -> None:
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send(self, code: int, body: Any, content_type: str = "application/json") -> None:
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _base(self) -> str:
+        return f"http://{self.headers['Host']}"
+
+    def _page(self, idx: int) -> dict[str, Any]:
+        cfg = self.server.config
+        images = {
+            f"imgs/p{idx}_{k}.jpg": f"{self._base()}/img/{uuid.uuid4().hex}.jpg"
+            for k in range(cfg.images_per_page)
+        }
+        return {
+            "layoutParsingResults": [
+                {
+                    "markdown": {"text": f"# Page {idx}\n\nlorem ipsum\n", "images": images},
+                    "outputImages": {"layout": f"{self._base()}/img/{uuid.uuid4().hex}.jpg"},
+                }
+            ]
+        }
+
+    def _fail(self, kind: str) -> bool:
+        if random.random() < self.server.config.error_rate:
+            self.server.stats.add(f"{kind}:503")
+            self._send(503, {"errorMsg": "mock overload"})
+            return True
+        self.server.stats.add(kind)
+        return False
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self) -> None:  # noqa: N802
+        cfg = self.server.config
+        body = self._read_body()
+        if self.path.startswith("/sync"):
+            time.sleep(cfg.sync_latency_ms / 1000)
+            if self._fail("sync"):
+                return
+            file_type = json.loads(body).get("fileType", 1)
+            pages = cfg.pages if file_type == 0 else 1
+            result = {
+                "layoutParsingResults": [
+                    self._page(i)["layoutParsingResults"][0] for i in range(pages)
+                ]
+            }
+            self._send(200, {"result": result})
+        elif self.path.startswith("/jobs"):
+            time.sleep(cfg.api_latency_ms / 1000)
+            if self._fail("submit"):
+                return
+            job_id = uuid.uuid4().hex
+            is_pdf = b"%PDF" in body[:4096] or b".pdf" in body[:4096].lower()
+            with self.server.lock:
+                self.server.jobs[job_id] = (time.time(), cfg.pages if is_pdf else 1)
+            self._send(200, {"data": {"jobId": job_id}})
+        else:
+            self._send(404, {})
+
+    def do_GET(self) -> None:  # noqa: N802
+        cfg = self.server.config
+        if self.path.startswith("/img/"):
+            time.sleep(cfg.image_latency_ms / 1000)
+            self.server.stats.add("image")
+            self._send(200, b"\xff\xd8" + b"\0" * max(0, cfg.image_bytes - 2), "image/jpeg")
+            return
+        time.sleep(cfg.api_latency_ms / 1000)
+        job_id = self.path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            job = self.server.jobs.get(job_id)
+        if job is None:
+            self._send(404, {"errorMsg": "no such job"})
+            return
+        if self.path.startswith("/jobs/"):
+            if self._fail("poll"):
+                return
+            if (time.time() - job[0]) * 1000 < cfg.job_ms:
+                self._send(200, {"data": {"state": "running"}})
+            else:
+                url = f"{self._base()}/jsonl/{job_id}"
+                self._send(200, {"data": {"state": "done", "resultUrl": {"jsonUrl": url}}})
+        elif self.path.startswith("/jsonl/"):
+            if self._fail("jsonl"):
+                return
+            lines = [json.dumps({"result": self._page(i)}) for i in range(job[1])]
+            self._send(200, "\n".join(lines).encode(), "text/plain")
+        else:
+            self._send(404, {})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr: tuple[str, int], config: MockConfig) -> None:
+        super().__init__(addr, _Handler)
+        self.config = config
+        self.stats = _Stats()
+        self.lock = threading.Lock()
+        self.jobs: dict[str, tuple[float, int]] = {}
+
+
+class MockApi:
+    def __init__(self, config: Optional[MockConfig] = None, *, port: int = 0) -> None:
+        self._server = _Server(("127.0.0.1", port), config or MockConfig())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "MockApi":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-api", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict[str, int]:
+        with self._server.stats.lock:
+            return dict(self._server.stats.counts)
+
+
+def add_config_args(parser: argparse.ArgumentParser) -> None:
+    for name, value in asdict(MockConfig()).items():
+        parser.add_argument(
+            "--" + name.replace("_", "-"), type=type(value), default=value
+        )
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(**{k: getattr(args, k) for k in asdict(MockConfig())})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=18900)
+    add_config_args(parser)
+    args = parser.parse_args()
+    api = MockApi(config_from_args(args), port=args.port)
+    print(f"mock API on {api.base_url}", flush=True)
+    try:
+        api._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""End-to-end benchmark: mock upstream + real server + synthetic uploads.
+
+Starts ``bench.mock_api`` in-process, launches the FastAPI app under
+uvicorn in a subprocess pointed at the mock, uploads a batch of
+synthetic images/PDFs and follows the task through the HTTP API.
+Reports files/min, pages/min, item latency percentiles and the server's
+peak RSS / thread count, and writes them to ``bench/results/*.json``.
+
+    python -m bench.run --files 40 --pdf-ratio 0.5 --engine asyncio
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+
+from .mock_api import MockApi, add_config_args, config_from_args
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return round(values[idx], 3)
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        return out.stdout.strip()
+    except Exception:  # noqa: BLE001
+        return ""
+
+
+def _proc_sample(pid: int) -> tuple[float, int]:
+    """(RSS in MB, thread count) of ``pid``; psutil if installed, else /proc."""
+    try:
+        import psutil  # type: ignore[import-not-found]
+
+        p = psutil.Process(pid)
+        return p.memory_info().rss / 1024 / 1024, p.num_threads()
+    except ImportError:
+        pass
+    except Exception:  # noqa: BLE001
+        return 0.0, 0
+    rss_kb, threads = 0, 0
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+            elif line.startswith("Threads:"):
+                threads = int(line.split()[1])
+    except OSError:
+        pass
+    return rss_kb / 1024, threads
+
+
+class _Sampler:
+    def __init__(self, pid: int, interval_s: float = 0.2) -> None:
+        self._pid = pid
+        self._interval_s = interval_s
+        self._stop = threading.Event()
+        self.peak_rss_mb = 0.0
+        self.peak_threads = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            rss, threads = _proc_sample(self._pid)
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            self.peak_threads = max(self.peak_threads, threads)
+            self._stop.wait(self._interval_s)
+
+    def __enter__(self) -> "_Sampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _synthetic_files(n: int, pdf_ratio: float, size: int) -> list[tuple[str, bytes, str]]:
+    # Random payloads so the result cache never short-circuits a run.
+    files = []
+    for i in range(n):
+        body = os.urandom(max(16, size))
+        if random.random() < pdf_ratio:
+            files.append((f"doc_{i:04d}.pdf", b"%PDF-1.4\n" + body, "application/pdf"))
+        else:
+            files.append((f"img_{i:04d}.png", b"\x89PNG\r\n\x1a\n" + body, "image/png"))
+    return files
+
+
+def _wait_ready(base: str, proc: subprocess.Popen, timeout_s: float = 30.0) -> None:
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            if requests.get(f"{base}/api/stats", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    mock_cfg = config_from_args(args)
+    mock = MockApi(mock_cfg).start()
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    out_dir = tempfile.mkdtemp(prefix="ocr-bench-")
+    env = {
+        **os.environ,
+        "BAIDU_AI_STUDIO_API_KEY": "bench",
+        "BAIDU_PADDLE_OCR_API_URL": f"{mock.base_url}/sync",
+        "BAIDU_PADDLE_OCR_JOB_URL": f"{mock.base_url}/jobs",
+        "OUTPUT_ROOT": out_dir,
+        "ENGINE": args.engine,
+        "DEFAULT_CONCURRENCY": str(args.concurrency),
+        "RESULT_CACHE_MAX_BYTES": "0",
+        "JOB_POLL_MIN_INTERVAL_S": str(args.poll_min_s),
+    }
+    for kv in args.env:
+        key, _, value = kv.partition("=")
+        env[key] = value
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.server:app", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        _wait_ready(base, proc)
+        files = _synthetic_files(args.files, args.pdf_ratio, args.file_bytes)
+        with _Sampler(proc.pid) as sampler:
+            t0 = time.monotonic()
+            resp = requests.post(
+                f"{base}/api/tasks",
+                data={"force_async": "1" if args.force_async else ""},
+                files=[("files", f) for f in files],
+                timeout=300,
+            )
+            resp.raise_for_status()
+            task_id = resp.json()["taskId"]
+
+            done_at: dict[str, float] = {}
+            status: dict[str, str] = {}
+            names: dict[str, str] = {}
+            since = 0
+            while True:
+                # Task status first, so the item pages read after it are final.
+                task = requests.get(f"{base}/api/tasks/{task_id}", timeout=30).json()
+                finished = task["status"] in ("done", "failed", "canceled")
+                page = {"hasMore": True}
+                while page["hasMore"]:
+                    page = requests.get(
+                        f"{base}/api/tasks/{task_id}/items",
+                        params={"since": since},
+                        timeout=30,
+                    ).json()
+                    now = time.monotonic() - t0
+                    for it in page["items"]:
+                        status[it["itemId"]] = it["status"]
+                        names[it["itemId"]] = it["filename"]
+                        if it["status"] in ("done", "failed", "canceled"):
+                            done_at.setdefault(it["itemId"], now)
+                    since = page["nextSince"]
+                if finished:
+                    break
+                if now > args.timeout_s:
+                    raise RuntimeError(f"timed out after {args.timeout_s}s: {task}")
+                time.sleep(args.poll_s)
+            wall_s = time.monotonic() - t0
+        server_stats = requests.get(f"{base}/api/stats", timeout=30).json()
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        mock.stop()
+
+    done = [names[i] for i, s in status.items() if s == "done"]
+    n_done = len(done)
+    pages = sum(mock_cfg.pages if n.endswith(".pdf") else 1 for n in done)
+    latencies = list(done_at.values())
+    return {
+        "startedAt": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "config": {
+            "engine": args.engine,
+            "concurrency": args.concurrency,
+            "files": args.files,
+            "pdfRatio": args.pdf_ratio,
+            "fileBytes": args.file_bytes,
+            "forceAsync": args.force_async,
+            "env": args.env,
+            "mock": vars(mock_cfg),
+        },
+        "results": {
+            "taskStatus": task.get("status"),
+            "files": len(files),
+            "done": n_done,
+            "failed": len(files) - n_done,
+            "pages": pages,
+            "wallSeconds": round(wall_s, 3),
+            "filesPerMin": round(n_done / wall_s * 60, 2),
+            "pagesPerMin": round(pages / wall_s * 60, 2),
+            "latencyS": {
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+            },
+            "peakRssMb": round(sampler.peak_rss_mb, 1),
+            "peakThreads": sampler.peak_threads,
+            "upstreamCalls": mock.stats(),
+            "server": server_stats,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end OCR benchmark")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--pdf-ratio", type=float, default=0.5)
+    parser.add_argument("--file-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--force-async", action="store_true", help="images via job API too")
+    parser.add_argument("--poll-s", type=float, default=0.1)
+    parser.add_argument("--poll-min-s", type=float, default=0.5)
+    parser.add_argument("--timeout-s", type=float, default=600.0)
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE",
+        help="extra server environment, repeatable",
+    )
+    parser.add_argument("--out", default="", help="result file (default bench/results/<time>.json)")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    report = run(args)
+    out = Path(args.out) if args.out else (
+        RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{args.engine}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    summary = {k: v for k, v in report["results"].items() if k not in ("server", "upstreamCalls")}
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print(f"-> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,12 @@ if [ ! -d "/app/output" ]; then
     chmod 755 /app/output
 fi
 
+# 工作进程：从共享队列领取文件识别，不监听端口
+if [ "$1" = "worker" ]; then
+    echo "Starting PaddleOCR-VL worker"
+    exec gosu appuser uv run python -m app.worker
+fi
+
 echo "Starting PaddleOCR-VL on ${HOST}:${PORT}"
 
 # 使用 gosu 以非 root 用户启动应用